@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+AI代理核心模块初始化文件
+"""
+
+from .command import Command
+from .executor import Executor
+from .module_loader import ModuleLoader
+from .execution_log import ExecutionLog, execution_log
+from .resource_usage import ProcessUsageTracker
+from .template_registry import TemplateRegistry, get_template_registry
+from .template_index import TemplateIndex, get_template_index
+from .tool_schema import build_tools, resolve_tool_call
+from .intent_matcher import IntentMatcher, get_intent_matcher
+from .command_cache import CommandCache, command_cache
+from .safety_screen import SafetyScreen, get_safety_screen
+from .chat_session import ChatSession
+from .worker_pool import ChatWorkerPool, RemoteChatSession, get_chat_worker_pool
+
+__all__ = ['Command', 'Executor', 'ModuleLoader', 'ExecutionLog', 'execution_log',
+           'ProcessUsageTracker', 'TemplateRegistry', 'get_template_registry',
+           'TemplateIndex', 'get_template_index', 'build_tools', 'resolve_tool_call',
+           'IntentMatcher', 'get_intent_matcher', 'CommandCache', 'command_cache',
+           'SafetyScreen', 'get_safety_screen', 'ChatSession', 'ChatWorkerPool',
+           'RemoteChatSession', 'get_chat_worker_pool']
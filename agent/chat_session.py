@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+对话流程核心模块 - 与界面无关的一轮对话处理：本地意图匹配、命令缓存、代理循环、命令提取和安全检查，以事件的形式交给前端显示
+"""
+
+import re
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import app_config
+from agent.template_engine import PLATFORM_KEY
+from agent.template_index import get_template_index
+from agent.intent_matcher import get_intent_matcher
+from agent.command_cache import command_cache
+from agent.safety_screen import SafetyVerdict, get_safety_screen
+from agent.tool_schema import build_tools, tool_name
+from agent import tracing
+
+
+SYSTEM_PROMPT = """你是一个AI助手，具有PowerShell命令执行能力。请遵循以下规则：
+
+1. 当用户询问与电脑操作、文件管理、系统信息、网络配置等相关的问题时，请判断是否需要生成PowerShell命令
+2. 如果需要生成PowerShell命令，请按照以下格式回复：
+
+[POWERSHELL_COMMAND]
+# 这里是PowerShell命令
+Get-Process
+[END_COMMAND]
+
+3. 在命令前后提供必要的解释和说明
+4. 确保生成的命令安全可靠，避免执行危险操作
+5. 对于简单的查询，直接回答即可，不需要生成命令
+6. 如果提供了能完成任务的工具（函数），优先直接调用工具，不需要再输出命令块
+7. 工具的执行结果会返回给你，可以根据结果继续调用工具（相互独立的调用可以在同一步中一起发出），完成后再用文字总结
+
+请根据用户的问题内容判断是否需要生成PowerShell命令。"""
+
+_COMMAND_BLOCK = re.compile(r'\[POWERSHELL_COMMAND\](.*?)\[END_COMMAND\]', re.DOTALL)
+
+
+def timestamp() -> str:
+    """当前时间，格式与聊天记录中的时间戳一致"""
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def extract_powershell_command(text: str) -> Optional[str]:
+    """
+    从回复文本中提取PowerShell命令块，去掉注释行
+
+    Args:
+        text: 回复文本
+
+    Returns:
+        命令文本，没有命令块时返回None
+    """
+    match = _COMMAND_BLOCK.search(text)
+    if not match:
+        return None
+    lines = [line.strip() for line in match.group(1).strip().split('\n')]
+    return '\n'.join(line for line in lines if not line.startswith('#'))
+
+
+def describe_tool_calls(tool_calls: List[Dict[str, Any]]) -> str:
+    """生成工具调用的文字描述，保存到聊天记录中"""
+    return "\n".join(f"[调用工具 {call['name']}] {call['arguments']}" for call in tool_calls)
+
+
+class ChatSession:
+    """
+    与界面无关的对话流程
+
+    respond() 处理一条用户消息，以事件字典的形式产生回复文本、工具调用和需要执行的命令，
+    图形界面和终端界面只负责显示事件和执行命令。聊天记录是普通的消息字典列表，由调用方保存，
+    AI回复和工具调用产生的命令消息由本类追加到其中。
+    """
+
+    def __init__(self, api_manager=None,
+                 approve: Optional[Callable[[str, str], Optional[str]]] = None,
+                 system_prompt: str = SYSTEM_PROMPT):
+        """
+        初始化对话流程
+
+        Args:
+            api_manager: DeepSeekAPIManager 实例，可以稍后再设置
+            approve: 代理循环执行命令前的检查回调，参数为 (命令, 执行器)，返回拒绝原因或None
+            system_prompt: 系统提示
+        """
+        self.api_manager = api_manager
+        self.approve = approve
+        self.system_prompt = system_prompt
+        # 工具名到模板的映射，每次请求前按模板注册表刷新
+        self.tool_loaders = {}
+        # 最近一次从命令缓存中提示的命令 (命令, 执行器, 请求)，输入 !! 执行
+        self.suggested_command: Optional[Tuple[str, str, str]] = None
+
+    def check_command(self, command: str) -> Optional[SafetyVerdict]:
+        """
+        按安全规则检查命令
+
+        Args:
+            command: 命令文本
+
+        Returns:
+            检查结果，安全检查关闭时返回None
+        """
+        if not app_config.get("safety.enabled", True):
+            return None
+        return get_safety_screen().check(command)
+
+    def record_result(self, request: Optional[str], command: str, executor: str, result: Optional[Dict[str, Any]]):
+        """
+        命令执行结束后写入命令缓存，取消的结果不记录
+
+        Args:
+            request: 产生该命令的用户请求
+            command: 命令文本
+            executor: 执行器名称
+            result: 命令的最终事件
+        """
+        if not request or result is None or result.get("is_cancelled"):
+            return
+        command_cache.record(request, command, executor, success=bool(result.get("success")),
+                             runtime=(result.get("usage") or {}).get("wall_time"))
+
+    def cache_request(self, user_message: str, messages: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        本轮对话的命令可以按请求写入命令缓存时返回请求，否则返回None
+
+        聊天中已有此前的用户消息时，模型的回复可能依赖上下文（“再执行一次”“那个文件”），
+        只按请求记录会在以后完全相同的请求中重放错误的命令，这样的轮次不写入缓存
+
+        Args:
+            user_message: 用户消息
+            messages: 当前聊天的消息列表
+
+        Returns:
+            写入缓存时使用的请求，或None
+        """
+        requests = [message.get("content") for message in messages if message.get("sender") == "user"]
+        # 前端在调用 respond 之前已把当前消息追加到聊天中
+        if requests and requests[-1] == user_message:
+            requests.pop()
+        return None if requests else user_message
+
+    def record_turn(self, request: Optional[str], tool_results: List[Dict[str, Any]]):
+        """
+        代理循环结束后写入命令缓存，只记录一轮中只执行了一条命令的情况
+
+        Args:
+            request: cache_request 返回的请求
+            tool_results: 本轮的 tool_result 事件
+        """
+        # 多步完成的请求，任何一条命令单独重放都不等于原来的回复
+        if len(tool_results) != 1:
+            return
+        event = tool_results[0]
+        # 代理循环中超时的命令只回传了摘要，不计入缓存
+        if not event["result"].get("is_timeout"):
+            self.record_result(request, event["command"], event["executor"], event["result"])
+
+    def take_suggested_command(self) -> Optional[Tuple[str, str, str]]:
+        """取出最近一次提示的缓存命令 (命令, 执行器, 请求)，没有提示时返回None"""
+        suggested, self.suggested_command = self.suggested_command, None
+        return suggested
+
+    def build_tools(self, query: str):
+        """检索与本次请求最相关的模板，转换为工具定义"""
+        if not app_config.get("agent.use_tools", True):
+            self.tool_loaders = {}
+            return None
+        results = get_template_index().search(query, app_config.get("agent.max_tools", 8), PLATFORM_KEY)
+        loaders = [loader for loader, _ in results]
+        self.tool_loaders = {tool_name(loader.name): loader for loader in loaders}
+        return build_tools(loaders) or None
+
+    def match_local_intent(self, user_message: str, messages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """用本地意图匹配器处理请求，命中时记录到聊天中并返回事件"""
+        if not app_config.get("intent.enabled", True):
+            return None
+        matcher = get_intent_matcher()
+        matcher.min_confidence = app_config.get("intent.min_confidence", 0.8)
+        match = matcher.match(user_message)
+        if match is None:
+            return None
+        messages.append({
+            "sender": "ai",
+            "content": f"[本地匹配模板 {match.loader.name}] {match.command}",
+            "timestamp": timestamp()
+        })
+        return {"type": "local_intent", "template": match.loader.name,
+                "command": match.command, "executor": match.executor}
+
+    def lookup_cached_command(self, user_message: str, messages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """在命令缓存中查找相似请求，找到时返回事件；配置为execute且请求与缓存完全相同时记录到聊天中，否则留作 !! 的建议命令"""
+        mode = app_config.get("command_cache.mode", "suggest")
+        self.suggested_command = None
+        if mode not in ("suggest", "execute"):
+            return None
+        entry = command_cache.lookup(user_message, app_config.get("command_cache.min_similarity", 0.75))
+        if entry is None:
+            return None
+
+        summary = (f"相似度 {entry['similarity']:.0%}，成功 {entry['successes']} 次，"
+                   f"平均耗时 {entry['runtime']:.1f} 秒")
+        if not entry["exact"]:
+            # 只是相似的请求不自动执行，留作建议
+            mode = "suggest"
+        if mode == "execute":
+            messages.append({
+                "sender": "ai",
+                "content": f"[缓存命令] {entry['command']}",
+                "timestamp": timestamp()
+            })
+        else:
+            self.suggested_command = (entry["command"], entry["executor"], user_message)
+        return {"type": "cached_command", "mode": mode, "command": entry["command"],
+                "executor": entry["executor"], "summary": summary}
+
+    def tool_result_message(self, event: Dict[str, Any], request: str) -> Dict[str, Any]:
+        """把代理循环中一次工具调用的结果转换为聊天中的命令消息"""
+        result = event["result"]
+        if result["type"] == "result":
+            output = [[stream, text.splitlines()] for stream, text in
+                      (("stdout", result.get("output") or ""), ("stderr", result.get("error") or "")) if text]
+        else:
+            # 超时或取消时没有完整输出，保存摘要
+            output = [["stdout", event["digest"].splitlines()]]
+        return {
+            "sender": "command",
+            "content": event["command"],
+            "timestamp": timestamp(),
+            "job_id": None,
+            "executor": event["executor"],
+            "request": request,
+            "output": output,
+            "result": result,
+            "status": "finished"
+        }
+
+    def respond(self, user_message: str, messages: List[Dict[str, Any]],
+                cancel_event: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+        """
+        处理一条用户消息
+
+        Args:
+            user_message: 用户消息
+            messages: 当前聊天的消息列表，应已包含这条用户消息；AI回复和命令消息会追加到其中
+            cancel_event: 取消事件，被设置后结束代理循环中正在执行的命令并停止回复
+
+        Yields:
+            事件字典：
+            - {"type": "local_intent", "template", "command", "executor"} 本地匹配到模板，随后产生command事件
+            - {"type": "cached_command", "mode", "command", "executor", "summary"} 命令缓存中有相似请求，
+              mode为execute时随后产生command事件，为suggest时该命令留作建议
+            - {"type": "thinking"} 开始调用API
+            - run_agent_loop 产生的 step/content/tool_call/tool_error/tool_wait 事件
+            - {"type": "tool_result", ..., "message"} 同 run_agent_loop，附带已追加到聊天中的命令消息
+            - {"type": "stream_warning", "reasons"} 回复文本中出现被安全策略禁止的操作，每步最多一次
+            - {"type": "limit", "reason", "steps", "tokens"} 代理循环因步数或token预算停止
+            - {"type": "command", "command", "executor", "request"} 需要前端执行的命令，结束后调用 record_result；request 为None时不写入缓存
+            - {"type": "error", "error"} API调用失败
+            - {"type": "done", "content"} 本轮结束，content为保存到聊天中的回复
+        """
+        # 常见请求先在本地匹配模板，命中时不调用API
+        with tracing.span("intent.local", "chat"):
+            local = self.match_local_intent(user_message, messages)
+        if local is not None:
+            yield local
+            yield {"type": "command", "command": local["command"], "executor": local["executor"], "request": None}
+            yield {"type": "done", "content": messages[-1]["content"]}
+            return
+
+        # 相似请求曾成功执行过时给出缓存的命令，配置为execute时直接执行不再调用API
+        with tracing.span("command_cache.lookup", "chat"):
+            cached = self.lookup_cached_command(user_message, messages)
+        if cached is not None:
+            yield cached
+            if cached["mode"] == "execute":
+                yield {"type": "command", "command": cached["command"], "executor": cached["executor"],
+                       "request": self.cache_request(user_message, messages)}
+                yield {"type": "done", "content": messages[-1]["content"]}
+                return
+
+        yield from self.generate_reply(user_message, messages, cancel_event)
+
+    def generate_reply(self, user_message: str, messages: List[Dict[str, Any]],
+                       cancel_event: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+        """
+        调用模型生成回复：代理循环、流式安全扫描和命令提取，是 respond 中不能在本地完成的部分
+
+        Args:
+            user_message: 用户消息
+            messages: 当前聊天的消息列表，AI回复和命令消息会追加到其中
+            cancel_event: 取消事件，同 respond
+
+        Yields:
+            从 thinking 开始的事件，同 respond
+        """
+        yield {"type": "thinking"}
+        try:
+            if not self.api_manager:
+                raise Exception("API管理器未初始化")
+
+            request = self.cache_request(user_message, messages)
+            tool_results = []
+
+            # 从聊天记录中提取历史消息
+            user_messages = [msg["content"] for msg in messages if msg["sender"] == "user"]
+            assistant_messages = [msg["content"] for msg in messages if msg["sender"] == "ai"]
+            api_messages = self.api_manager.format_messages(
+                self.system_prompt, user_messages, assistant_messages, user_message)
+
+            # 模板以function calling工具的形式提供给模型，工具结果回传后模型继续下一步
+            with tracing.span("tools.build", "chat"):
+                tools = self.build_tools(user_message)
+            full_response = ""
+            done = None
+            # 回复文本边生成边扫描，命令块还没写完就能提示危险操作
+            scanner = None
+            stream_warned = False
+
+            for event in self.api_manager.run_agent_loop(
+                    api_messages, tools, self.tool_loaders,
+                    max_steps=app_config.get("agent.max_steps", 6),
+                    max_tokens=app_config.get("agent.max_total_tokens", 32000),
+                    max_parallel=app_config.get("agent.max_parallel_tools", 4),
+                    command_timeout=app_config.get("execution.timeout", 300),
+                    output_tokens=app_config.get("agent.tool_output_tokens", 800),
+                    approve=self.approve, cancel_event=cancel_event,
+                    kill_grace=app_config.get("execution.kill_grace_seconds", 3)):
+                event_type = event["type"]
+                if event_type == "done":
+                    done = event
+                    continue
+                if event_type == "step":
+                    scanner = get_safety_screen().stream() if app_config.get("safety.enabled", True) else None
+                    stream_warned = False
+                elif event_type == "tool_result":
+                    event["message"] = self.tool_result_message(event, user_message)
+                    messages.append(event["message"])
+                    tool_results.append(event)
+                yield event
+                if event_type == "content":
+                    full_response += event["text"]
+                    if scanner is not None and not stream_warned:
+                        verdict = scanner.feed(event["text"])
+                        if verdict.denied:
+                            stream_warned = True
+                            yield {"type": "stream_warning", "reasons": verdict.reasons}
+        except Exception as e:
+            print(f"API调用异常: {str(e)}")
+            yield {"type": "error", "error": str(e)}
+            return
+
+        self.record_turn(request, tool_results)
+        if done["reason"] == "max_steps" and done["tool_calls"] or done["reason"] == "token_budget":
+            yield {"type": "limit", "reason": done["reason"], "steps": done["steps"], "tokens": done["tokens"]}
+
+        # 保存到聊天记录，只有工具调用时记录调用内容作为上下文
+        content = done["content"] or describe_tool_calls(done["tool_calls"])
+        messages.append({"sender": "ai", "content": content, "timestamp": timestamp()})
+
+        # 模型没有调用工具时，从文本中提取PowerShell命令
+        if not done["tool_calls"]:
+            with tracing.span("command.extract", "chat", chars=len(full_response)):
+                command = extract_powershell_command(full_response)
+            if command:
+                yield {"type": "command", "command": command, "executor": "powershell", "request": request}
+        yield {"type": "done", "content": content}
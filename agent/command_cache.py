@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+命令缓存 - 记录成功执行过的“用户请求 → 命令”映射，按n-gram片段模糊查找相似请求
+"""
+
+import os
+import re
+import json
+import threading
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+
+# 归一化时保留的字符：字母数字、汉字和路径/主机名中常见的符号
+_NORMALIZE_DROP = re.compile(r"[^\w\s./\\:@-]")
+_WHITESPACE = re.compile(r"\s+")
+# 含数字或路径符号的词视为字面量，例如主机名、IP、路径，相似请求中这些词必须完全一致
+_LITERAL_TOKEN = re.compile(r"[\w./\\:@-]*[0-9./\\:@][\w./\\:@-]*", re.ASCII)
+_ASCII_WORD = re.compile(r"[a-z']+")
+
+# 动作词分组，相似请求中出现的动作组必须相同，避免“停止服务”命中“启动服务”的命令；
+# 中文按子串匹配，英文按单词匹配
+_ACTIONS = {
+    "start": ("启动", "开启", "打开", "运行", "start", "run", "open", "launch", "enable"),
+    "stop": ("停止", "关闭", "关掉", "结束", "终止", "杀掉", "禁用", "stop", "close", "kill", "end", "disable"),
+    "restart": ("重启", "重新启动", "restart", "reboot"),
+    "delete": ("删除", "删掉", "移除", "清除", "清空", "delete", "remove", "erase", "clear", "purge"),
+    "create": ("创建", "新建", "添加", "增加", "create", "new", "add", "make"),
+    "install": ("安装", "install"),
+    "uninstall": ("卸载", "uninstall"),
+    "copy": ("复制", "拷贝", "备份", "copy", "backup"),
+    "move": ("移动", "重命名", "move", "rename"),
+    "write": ("修改", "写入", "设置", "更改", "change", "set", "write", "modify"),
+}
+# 否定词：含否定的请求只接受完全相同的缓存请求
+_NEGATIONS = ("不", "别", "勿", "莫", "禁止", "not", "no", "don't", "dont", "never", "without")
+
+
+def normalize_request(text: str) -> str:
+    """
+    归一化用户请求：全半角统一、转小写、去掉标点、合并空白
+
+    Args:
+        text: 用户请求
+
+    Returns:
+        归一化后的文本
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _NORMALIZE_DROP.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def actions(normalized: str) -> Set[str]:
+    """
+    找出请求中的动作词分组
+
+    Args:
+        normalized: 归一化后的文本
+
+    Returns:
+        动作组名称集合
+    """
+    words = set(_ASCII_WORD.findall(normalized))
+    found = set()
+    for name, verbs in _ACTIONS.items():
+        for verb in verbs:
+            if (verb in words) if verb.isascii() else (verb in normalized):
+                found.add(name)
+                break
+    # “重新启动”同时含“启动”，以重启为准
+    if "restart" in found:
+        found.discard("start")
+    return found
+
+
+def negated(normalized: str) -> bool:
+    """请求中是否含有否定词"""
+    words = set(_ASCII_WORD.findall(normalized))
+    return any((word in words) if word.isascii() else (word in normalized) for word in _NEGATIONS)
+
+
+def shingles(normalized: str, size: int = 2) -> Set[str]:
+    """
+    切分字符n-gram片段，空白不参与切分
+
+    Args:
+        normalized: 归一化后的文本
+        size: 片段长度
+
+    Returns:
+        片段集合
+    """
+    compact = normalized.replace(" ", "")
+    if len(compact) <= size:
+        return {compact} if compact else set()
+    return {compact[i:i + size] for i in range(len(compact) - size + 1)}
+
+
+class CommandCache:
+    """
+    命令缓存类
+
+    每次执行结果以JSON Lines格式追加写入，加载时按（归一化请求, 命令, 执行器）聚合成功/失败次数和平均耗时；
+    查找时用片段倒排表只计算有共同片段的请求的Jaccard相似度；相似请求还必须动作词相同、
+    不含否定词，字面上相近但意思相反的请求（启动/停止、删除/不要删除）不会命中。
+    """
+
+    def __init__(self, cache_dir: str = "logs", cache_file: str = "command_cache.jsonl",
+                 shingle_size: int = 2):
+        """
+        初始化命令缓存
+
+        Args:
+            cache_dir: 缓存文件夹名称
+            cache_file: 缓存文件名
+            shingle_size: n-gram片段长度
+        """
+        # 获取项目根目录
+        self.project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.cache_dir = os.path.join(self.project_root, cache_dir)
+        self.cache_file = os.path.join(self.cache_dir, cache_file)
+        self.shingle_size = shingle_size
+        self._lock = threading.Lock()
+        self._loaded = False
+        # 归一化请求 -> {(命令, 执行器): 条目}
+        self._entries: Dict[str, Dict[tuple, Dict[str, Any]]] = {}
+        # 片段 -> 归一化请求集合
+        self._postings: Dict[str, Set[str]] = {}
+        self._shingles: Dict[str, Set[str]] = {}
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.cache_file):
+            return
+
+        line_count = 0
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line_count += 1
+                    try:
+                        self._apply(json.loads(line))
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        continue
+        except OSError as e:
+            print(f"读取命令缓存失败: {e}")
+            return
+
+        # 逐次追加的记录远多于聚合后的条目时，改写为每个条目一行
+        entry_count = sum(len(commands) for commands in self._entries.values())
+        if line_count > 2 * entry_count + 100:
+            self._compact()
+
+    def _apply(self, record: Dict[str, Any]):
+        normalized = record.get("normalized") or normalize_request(record["request"])
+        if not normalized:
+            return
+        commands = self._entries.get(normalized)
+        if commands is None:
+            commands = self._entries[normalized] = {}
+            grams = shingles(normalized, self.shingle_size)
+            self._shingles[normalized] = grams
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(normalized)
+
+        key = (record["command"], record.get("executor", "powershell"))
+        entry = commands.get(key)
+        if entry is None:
+            entry = commands[key] = {
+                "request": record["request"],
+                "normalized": normalized,
+                "command": key[0],
+                "executor": key[1],
+                "successes": 0,
+                "failures": 0,
+                "runtime": 0.0,
+                "last_used": None,
+            }
+
+        # 单次记录带 success，压缩后的记录直接带计数
+        successes = record.get("successes", 1 if record.get("success") else 0)
+        failures = record.get("failures", 0 if record.get("success") else 1)
+        runs = entry["successes"] + entry["failures"]
+        added = successes + failures
+        if added:
+            runtime = record.get("runtime") or 0.0
+            entry["runtime"] = (entry["runtime"] * runs + runtime * added) / (runs + added)
+        entry["successes"] += successes
+        entry["failures"] += failures
+        entry["request"] = record["request"]
+        entry["last_used"] = record.get("timestamp") or entry["last_used"]
+
+    def _compact(self):
+        tmp_file = self.cache_file + ".tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                for commands in self._entries.values():
+                    for entry in commands.values():
+                        record = dict(entry)
+                        record["timestamp"] = record.pop("last_used")
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            print(f"压缩命令缓存失败: {e}")
+
+    def record(self, request: str, command: str, executor: str = "powershell",
+               success: bool = True, runtime: Optional[float] = None) -> bool:
+        """
+        记录一次由请求产生的命令执行结果
+
+        Args:
+            request: 用户请求原文
+            command: 执行的命令
+            executor: 执行器名称
+            success: 是否执行成功
+            runtime: 执行耗时（秒）
+
+        Returns:
+            写入是否成功
+        """
+        record = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "request": request,
+            "normalized": normalize_request(request),
+            "command": command,
+            "executor": executor,
+            "success": bool(success),
+            "runtime": runtime,
+        }
+        if not record["normalized"]:
+            return False
+
+        try:
+            with self._lock:
+                self._ensure_loaded()
+                self._apply(record)
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(self.cache_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return True
+        except Exception as e:
+            print(f"写入命令缓存失败: {e}")
+            return False
+
+    def lookup(self, request: str, min_similarity: float = 0.75) -> Optional[Dict[str, Any]]:
+        """
+        查找与请求最相似、且成功次数多于失败次数的命令
+
+        Args:
+            request: 用户请求
+            min_similarity: 最低Jaccard相似度
+
+        Returns:
+            缓存条目（附带 similarity 字段，以及归一化后除空白外与请求完全相同时为真的 exact 字段）的副本，
+            没有足够相似的成功记录时返回None
+        """
+        normalized = normalize_request(request)
+        grams = shingles(normalized, self.shingle_size)
+        if not grams:
+            return None
+        literals = set(_LITERAL_TOKEN.findall(normalized))
+        request_actions = actions(normalized)
+        request_negated = negated(normalized)
+
+        with self._lock:
+            self._ensure_loaded()
+            overlaps: Dict[str, int] = {}
+            for gram in grams:
+                for candidate in self._postings.get(gram, ()):
+                    overlaps[candidate] = overlaps.get(candidate, 0) + 1
+
+            ranked = []
+            for candidate, overlap in overlaps.items():
+                similarity = overlap / (len(grams) + len(self._shingles[candidate]) - overlap)
+                if similarity >= min_similarity:
+                    ranked.append((similarity, candidate))
+            ranked.sort(reverse=True)
+
+            for similarity, candidate in ranked:
+                # 片段不含空白，空白不同的请求也视为相同
+                exact = candidate.replace(" ", "") == normalized.replace(" ", "")
+                if not exact:
+                    if set(_LITERAL_TOKEN.findall(candidate)) != literals:
+                        continue
+                    if request_negated or negated(candidate) or actions(candidate) != request_actions:
+                        continue
+                proven = [entry for entry in self._entries[candidate].values()
+                          if entry["successes"] > entry["failures"]]
+                if not proven:
+                    continue
+                best = max(proven, key=lambda entry: (entry["successes"] - entry["failures"],
+                                                      entry["last_used"] or ""))
+                result = dict(best)
+                result["similarity"] = similarity
+                result["exact"] = exact
+                return result
+        return None
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """
+        获取全部缓存条目
+
+        Returns:
+            缓存条目副本列表
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return [dict(entry) for commands in self._entries.values() for entry in commands.values()]
+
+
+# 全局命令缓存实例，缓存文件在首次查找或写入时读取
+command_cache = CommandCache()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+执行日志 - 持久化记录每条命令的执行结果和资源消耗
+"""
+
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+class ExecutionLog:
+    """
+    执行日志类，以JSON Lines格式追加写入命令执行记录
+    """
+
+    def __init__(self, log_dir: str = "logs", log_file: str = "executions.jsonl"):
+        """
+        初始化执行日志
+
+        Args:
+            log_dir: 日志文件夹名称
+            log_file: 日志文件名
+        """
+        # 获取项目根目录
+        self.project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.log_dir = os.path.join(self.project_root, log_dir)
+        self.log_file = os.path.join(self.log_dir, log_file)
+        self._lock = threading.Lock()
+
+    def record(self, command: str, result: Dict[str, Any], source: str = "powershell") -> bool:
+        """
+        记录一次命令执行
+
+        Args:
+            command: 执行的命令
+            result: 执行结果事件，需包含 usage 字段
+            source: 执行来源，如 powershell、executor
+
+        Returns:
+            写入是否成功
+        """
+        entry = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "source": source,
+            "command": command,
+            "success": result.get("success"),
+            "returncode": result.get("returncode"),
+            "is_timeout": result.get("is_timeout", False),
+            "usage": result.get("usage"),
+        }
+
+        try:
+            with self._lock:
+                os.makedirs(self.log_dir, exist_ok=True)
+                with open(self.log_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            return True
+        except Exception as e:
+            print(f"写入执行日志失败: {e}")
+            return False
+
+    def read_recent(self, limit: Optional[int] = 100) -> List[Dict[str, Any]]:
+        """
+        读取最近的执行记录
+
+        Args:
+            limit: 最多返回的记录数，None表示全部
+
+        Returns:
+            执行记录列表，按时间从旧到新
+        """
+        if not os.path.exists(self.log_file):
+            return []
+
+        entries = []
+        with self._lock:
+            with open(self.log_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        return entries if limit is None else entries[-limit:]
+
+    def top_consumers(self, key: str = "user_time", limit: int = 10,
+                      entries: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        找出资源消耗最高的命令
+
+        Args:
+            key: 排序依据的usage字段，如 user_time、max_rss_kb、wall_time
+            limit: 返回的记录数
+            entries: 参与排序的记录，默认读取全部日志
+
+        Returns:
+            按消耗从高到低排序的执行记录
+        """
+        if entries is None:
+            entries = self.read_recent(limit=None)
+        ranked = [e for e in entries if (e.get("usage") or {}).get(key) is not None]
+        ranked.sort(key=lambda e: e["usage"][key], reverse=True)
+        return ranked[:limit]
+
+
+# 全局执行日志实例，日志目录在首次写入时创建
+execution_log = ExecutionLog()
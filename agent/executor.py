@@ -1,7 +1,104 @@
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from agent.resource_usage import ProcessUsageTracker
+from agent.execution_log import execution_log
+from agent.process_control import new_process_group_kwargs, terminate_process_tree, shell_command_args
+from agent.output_decoder import detect_shell_encoding
+from agent import tracing
+
 
 class Executor:
-    def run(self, command_str):
-        result = subprocess.run(command_str, shell=True,
-                                capture_output=True, text=True)
-        return result.stdout, result.stderr
\ No newline at end of file
+    def __init__(self, kill_grace=3.0):
+        self.kill_grace = kill_grace
+        self.last_usage = None
+
+    def run(self, command_str, timeout=None):
+        result = self._execute(command_str, timeout)
+        self.last_usage = result["usage"]
+        if result["is_timeout"]:
+            raise subprocess.TimeoutExpired(command_str, timeout)
+        return result["stdout"], result["stderr"]
+
+    def run_many(self, commands, max_workers=4, timeout=None):
+        # 并发执行一批命令（如 ModuleLoader.build_many 的输出），按完成顺序产生结果；
+        # commands 可以是迭代器，元素为命令字符串或 (命令, 执行器) 元组，同时在途的命令不超过 max_workers 的两倍；
+        # 无法启动的命令产生带 error 的失败结果，不影响同一批的其他命令
+        commands = enumerate(commands)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = {}
+
+            def submit_next():
+                item = next(commands, None)
+                if item is None:
+                    return False
+                index, command = item
+                shell = None
+                if isinstance(command, tuple):
+                    command, shell = command
+                pending[pool.submit(self._execute, command, timeout, shell)] = (index, command)
+                return True
+
+            while len(pending) < max_workers * 2 and submit_next():
+                pass
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, command = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # 不支持的执行器、启动进程失败等只影响这一条命令，其余命令继续执行
+                        result = {
+                            "success": False,
+                            "returncode": None,
+                            "is_timeout": False,
+                            "stdout": "",
+                            "stderr": "",
+                            "usage": None,
+                            "error": str(e)
+                        }
+                    result["index"] = index
+                    result["command"] = command
+                    submit_next()
+                    yield result
+
+    def _execute(self, command_str, timeout, shell=None):
+        spawn_span = tracing.span("process.spawn", "process", executor=shell or "shell")
+        if shell is None:
+            process = subprocess.Popen(command_str, shell=True,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       text=True, **new_process_group_kwargs())
+        else:
+            # 指定执行器时按执行器启动，并用执行器的输出编码解码
+            process = subprocess.Popen(shell_command_args(shell, command_str),
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       encoding=detect_shell_encoding(shell), errors="replace",
+                                       **new_process_group_kwargs())
+        spawn_span.end()
+        tracker = ProcessUsageTracker(process)
+        try:
+            with tracing.span("process.wait", "process"):
+                stdout, stderr = tracker.communicate(timeout)
+        except subprocess.TimeoutExpired:
+            # 超时后结束整棵进程树，不留下孤儿进程
+            terminate_process_tree(process, tracker.wait, self.kill_grace)
+            result = {
+                "success": False,
+                "returncode": process.returncode,
+                "is_timeout": True,
+                "stdout": "",
+                "stderr": "",
+                "usage": tracker.usage()
+            }
+        else:
+            result = {
+                "success": process.returncode == 0,
+                "returncode": process.returncode,
+                "is_timeout": False,
+                "stdout": stdout,
+                "stderr": stderr,
+                "usage": tracker.usage()
+            }
+        execution_log.record(command_str, result, source=shell or "executor")
+        return result
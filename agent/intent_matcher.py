@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+意图匹配模块 - 用模板声明的正则语法和关键词得分在本地匹配常见请求，命中时跳过大模型直接渲染命令
+"""
+
+import re
+import time
+import threading
+from typing import Any, Dict, Optional
+
+from agent.module_loader import ModuleLoader
+from agent.template_engine import PLATFORM_KEY
+from agent.template_index import TemplateIndex, tokenize
+
+
+# 用户输入末尾常见的标点，匹配前去掉
+_TRAILING_PUNCTUATION = " \t\r\n。．.？?！!；;"
+
+# 关键词打分至少要命中的词数（英文单词或中文二字组），单独一个泛泛的名词（如“文件”）不足以确定意图
+_MIN_KEYWORD_WORDS = 2
+
+_GROUP_DEFINITION = re.compile(r"\(\?P<([A-Za-z_][A-Za-z0-9_]*)>")
+_GROUP_REFERENCE = re.compile(r"\(\?P=([A-Za-z_][A-Za-z0-9_]*)\)")
+
+
+class IntentMatch:
+    """
+    一次本地意图匹配的结果
+    """
+
+    __slots__ = ("loader", "params", "command", "executor", "confidence", "method")
+
+    def __init__(self, loader: ModuleLoader, params: Dict[str, str], command: str,
+                 executor: str, confidence: float, method: str):
+        """
+        初始化匹配结果
+
+        Args:
+            loader: 命中的模板
+            params: 从用户输入中提取的参数
+            command: 渲染后的命令
+            executor: 执行器名称
+            confidence: 置信度（0~1）
+            method: 匹配方式，grammar 或 keyword
+        """
+        self.loader = loader
+        self.params = params
+        self.command = command
+        self.executor = executor
+        self.confidence = confidence
+        self.method = method
+
+
+def _prefix_groups(pattern: str, prefix: str) -> str:
+    """给正则中的命名分组加前缀，使多个模板的语法可以合并为一个正则"""
+    pattern = _GROUP_DEFINITION.sub(lambda m: f"(?P<{prefix}{m.group(1)}>", pattern)
+    return _GROUP_REFERENCE.sub(lambda m: f"(?P={prefix}{m.group(1)})", pattern)
+
+
+class IntentMatcher:
+    """
+    本地意图匹配器
+
+    模板可以在 intents 字段中声明若干正则，命名分组即模板参数。
+    同一平台所有模板的正则合并编译为一个正则，一次 fullmatch 即可确定模板并提取参数；
+    语法未命中时，对不需要参数的模板按关键词覆盖率和领先幅度打分，至少要命中两个词。
+    """
+
+    def __init__(self, registry, index: TemplateIndex, min_confidence: float = 0.8):
+        """
+        初始化匹配器
+
+        Args:
+            registry: TemplateRegistry实例
+            index: 模板检索索引，用于关键词打分
+            min_confidence: 最低置信度，低于该值视为未命中；语法匹配的置信度为1
+        """
+        self.registry = registry
+        self.index = index
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        # 平台 -> (合并后的正则, 分组名 -> (模板, 参数名前缀))
+        self._grammars: Dict[str, tuple] = {}
+        self._stats = {"lookups": 0, "grammar_hits": 0, "keyword_hits": 0, "misses": 0, "total_time": 0.0}
+        self._template_hits: Dict[str, int] = {}
+
+        registry.add_listener(lambda changed, removed: self._grammars.clear())
+
+    def _grammar(self, platform_key: str):
+        grammar = self._grammars.get(platform_key)
+        if grammar is not None:
+            return grammar
+
+        alternatives = []
+        owners = {}
+        loaders = self.registry.for_platform(platform_key)
+        for name in sorted(loaders):
+            loader = loaders[name]
+            for pattern in loader.data.get("intents") or ():
+                group = f"i{len(owners)}"
+                prefix = f"{group}_"
+                rewritten = _prefix_groups(pattern, prefix)
+                try:
+                    re.compile(rewritten)
+                except re.error as e:
+                    print(f"模板 {name} 的意图正则无效: {e}")
+                    continue
+                alternatives.append(f"(?P<{group}>{rewritten})")
+                owners[group] = (loader, prefix)
+
+        regex = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+        grammar = (regex, owners)
+        self._grammars[platform_key] = grammar
+        return grammar
+
+    def _match_grammar(self, text: str, platform_key: str) -> Optional[IntentMatch]:
+        regex, owners = self._grammar(platform_key)
+        if regex is None:
+            return None
+        match = regex.fullmatch(text)
+        if match is None:
+            return None
+        loader, prefix = owners[match.lastgroup]
+        params = {
+            key[len(prefix):]: value.strip()
+            for key, value in match.groupdict().items()
+            if value is not None and key.startswith(prefix)
+        }
+        return self._render(loader, params, 1.0, "grammar", platform_key)
+
+    def _match_keywords(self, text: str, platform_key: str) -> Optional[IntentMatch]:
+        query_terms = set(tokenize(text))
+        if not query_terms:
+            return None
+        results = self.index.search(text, 2, platform_key)
+        if not results:
+            return None
+        loader, best = results[0]
+        # 只有不需要用户提供参数的模板才能仅凭关键词执行
+        if any(spec["required"] for spec in loader.compiled(platform_key).params.values()):
+            return None
+        matched = query_terms & self.index.terms(loader.name)
+        if sum(1 for term in matched if len(term) > 1) < _MIN_KEYWORD_WORDS:
+            return None
+        runner_up = results[1][1] if len(results) > 1 else 0.0
+        coverage = len(matched) / len(query_terms)
+        confidence = coverage * (1 - 0.5 * runner_up / best)
+        return self._render(loader, {}, confidence, "keyword", platform_key)
+
+    def _render(self, loader: ModuleLoader, params: Dict[str, str], confidence: float,
+                method: str, platform_key: str) -> Optional[IntentMatch]:
+        try:
+            template = loader.compiled(platform_key)
+            command = template.render(params)
+        except (KeyError, ValueError):
+            return None
+        return IntentMatch(loader, params, command, template.executor, confidence, method)
+
+    def match(self, text: str, platform_key: str = PLATFORM_KEY) -> Optional[IntentMatch]:
+        """
+        匹配用户输入
+
+        Args:
+            text: 用户输入
+            platform_key: 平台名称
+
+        Returns:
+            命中时返回匹配结果，否则返回None
+        """
+        start = time.perf_counter()
+        text = text.strip().rstrip(_TRAILING_PUNCTUATION)
+        self.registry.refresh_if_due()
+        result = self._match_grammar(text, platform_key) if text else None
+        if result is None and text:
+            result = self._match_keywords(text, platform_key)
+        if result is not None and result.confidence < self.min_confidence:
+            result = None
+
+        with self._lock:
+            stats = self._stats
+            stats["lookups"] += 1
+            stats["total_time"] += time.perf_counter() - start
+            if result is None:
+                stats["misses"] += 1
+            else:
+                stats[f"{result.method}_hits"] += 1
+                name = result.loader.name
+                self._template_hits[name] = self._template_hits.get(name, 0) + 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取命中统计
+
+        Returns:
+            包含查询次数、语法命中、关键词命中、未命中、命中率、平均耗时（毫秒）和各模板命中次数的字典
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            template_hits = dict(self._template_hits)
+        lookups = stats["lookups"]
+        hits = stats["grammar_hits"] + stats["keyword_hits"]
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        stats["avg_ms"] = stats.pop("total_time") * 1000 / lookups if lookups else 0.0
+        stats["templates"] = template_hits
+        return stats
+
+    def format_stats(self) -> str:
+        """生成一行统计摘要"""
+        stats = self.stats()
+        return (f"本地意图匹配: 查询 {stats['lookups']} 次，语法命中 {stats['grammar_hits']}，"
+                f"关键词命中 {stats['keyword_hits']}，未命中 {stats['misses']}，"
+                f"命中率 {stats['hit_rate']:.0%}，平均 {stats['avg_ms']:.2f} ms")
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_intent_matcher(min_confidence: float = 0.8) -> IntentMatcher:
+    """
+    获取全局意图匹配器，基于全局模板注册表和检索索引
+
+    Args:
+        min_confidence: 首次创建时使用的关键词置信度阈值
+
+    Returns:
+        全局意图匹配器实例
+    """
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                from agent.template_registry import get_template_registry
+                from agent.template_index import get_template_index
+                _matcher = IntentMatcher(get_template_registry(), get_template_index(), min_confidence)
+    return _matcher
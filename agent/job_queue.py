@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+后台任务队列 - 以优先级和并发上限调度长时间运行的命令
+"""
+
+import time
+import queue
+import itertools
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_FINISHED = "finished"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_TIMEOUT = "timeout"
+
+JOB_STATE_LABELS = {
+    JOB_QUEUED: "排队中",
+    JOB_RUNNING: "运行中",
+    JOB_FINISHED: "已完成",
+    JOB_FAILED: "失败",
+    JOB_CANCELLED: "已取消",
+    JOB_TIMEOUT: "超时",
+}
+
+_FINAL_STATES = (JOB_FINISHED, JOB_FAILED, JOB_CANCELLED, JOB_TIMEOUT)
+
+
+class Job:
+    """
+    后台任务，记录一条命令的状态、进度和输出去向
+    """
+
+    def __init__(self, job_id: int, command: str, priority: int = 0,
+                 chat_index: Optional[int] = None, timeout: int = 300,
+                 executor: str = "powershell"):
+        """
+        初始化任务
+
+        Args:
+            job_id: 任务编号
+            command: 要执行的命令
+            priority: 优先级，数值越大越先执行
+            chat_index: 发起该任务的聊天索引，输出会回流到该聊天
+            timeout: 超时时间（秒）
+            executor: 执行器名称
+        """
+        self.id = job_id
+        self.command = command
+        self.executor = executor
+        self.priority = priority
+        self.chat_index = chat_index
+        self.timeout = timeout
+        self.state = JOB_QUEUED
+        self.foreground = True
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.line_count = 0
+        self.result = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def is_done(self) -> bool:
+        """任务是否已结束"""
+        return self.state in _FINAL_STATES
+
+    def cancel(self):
+        """请求取消任务，排队中的任务不会再启动，运行中的任务会结束整棵进程树"""
+        self.cancel_event.set()
+
+    def send_to_background(self):
+        """转入后台，输出不再实时显示在聊天中，只在结束时汇总"""
+        self.foreground = False
+
+    def elapsed(self) -> float:
+        """已运行的时间（秒）"""
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return end - self.started_at
+
+    def progress_text(self) -> str:
+        """生成任务列表中显示的进度文本"""
+        command = self.command.replace("\n", " ")
+        if len(command) > 30:
+            command = command[:30] + "..."
+        text = f"#{self.id} {JOB_STATE_LABELS[self.state]}"
+        if self.started_at is not None:
+            text += f" {self.elapsed():.0f}s · {self.line_count}行"
+        if not self.foreground and not self.is_done:
+            text += " · 后台"
+        return f"{text}\n{command}"
+
+
+class JobQueue:
+    """
+    任务队列类，固定数量的工作线程按优先级取出任务执行
+
+    执行产生的事件以 (job, event) 形式放入事件队列，由界面线程定时取出显示，
+    工作线程从不直接操作界面。
+    """
+
+    def __init__(self, runner: Callable[..., Iterator[Dict[str, Any]]], max_concurrent: int = 2):
+        """
+        初始化任务队列
+
+        Args:
+            runner: 命令执行函数，签名为 runner(command, timeout, cancel_event, executor)，返回执行事件迭代器
+            max_concurrent: 同时运行的最大任务数
+        """
+        self.runner = runner
+        self.max_concurrent = max(1, int(max_concurrent))
+        self._pending = queue.PriorityQueue()
+        self._events = queue.Queue()
+        self._jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._stopped = False
+
+        for i in range(self.max_concurrent):
+            worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, command: str, priority: int = 0,
+               chat_index: Optional[int] = None, timeout: int = 300,
+               executor: str = "powershell") -> Job:
+        """
+        提交任务
+
+        Args:
+            command: 要执行的命令
+            priority: 优先级，数值越大越先执行
+            chat_index: 发起该任务的聊天索引
+            timeout: 超时时间（秒）
+            executor: 执行器名称
+
+        Returns:
+            新建的任务
+        """
+        if self._stopped:
+            raise RuntimeError("任务队列已关闭")
+
+        with self._lock:
+            job = Job(next(self._ids), command, priority, chat_index, timeout, executor)
+            self._jobs[job.id] = job
+        self._pending.put((-priority, next(self._order), job))
+        self._events.put((job, {"type": "job_state", "state": job.state}))
+        return job
+
+    def get(self, job_id: int) -> Optional[Job]:
+        """按编号获取任务"""
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        """获取全部任务，按编号排序"""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.id)
+
+    def active_jobs(self) -> List[Job]:
+        """获取排队中和运行中的任务"""
+        return [job for job in self.jobs() if not job.is_done]
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        取消任务
+
+        Args:
+            job_id: 任务编号
+
+        Returns:
+            任务是否存在且尚未结束
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.is_done:
+            return False
+        job.cancel()
+        return True
+
+    def drain_events(self, max_events: int = 1000) -> List[Tuple[Job, Dict[str, Any]]]:
+        """
+        取出待处理的执行事件，供界面线程调用
+
+        Args:
+            max_events: 单次最多取出的事件数
+
+        Returns:
+            (job, event) 列表
+        """
+        events = []
+        try:
+            while len(events) < max_events:
+                events.append(self._events.get_nowait())
+        except queue.Empty:
+            pass
+        return events
+
+    def shutdown(self):
+        """取消全部任务并停止工作线程"""
+        self._stopped = True
+        for job in self.jobs():
+            job.cancel()
+        for _ in self._workers:
+            self._pending.put((float("inf"), next(self._order), None))
+
+    def _set_state(self, job: Job, state: str):
+        job.state = state
+        if state == JOB_RUNNING:
+            job.started_at = time.time()
+        elif state in _FINAL_STATES:
+            job.finished_at = time.time()
+        self._events.put((job, {"type": "job_state", "state": state}))
+
+    def _worker_loop(self):
+        while True:
+            _, _, job = self._pending.get()
+            if job is None:
+                return
+            if job.cancel_event.is_set():
+                self._set_state(job, JOB_CANCELLED)
+                continue
+            self._run_job(job)
+
+    def _run_job(self, job: Job):
+        self._set_state(job, JOB_RUNNING)
+        final_state = JOB_FAILED
+        events = None
+        try:
+            events = self.runner(job.command, timeout=job.timeout, cancel_event=job.cancel_event,
+                                 executor=job.executor)
+            for event in events:
+                if event["type"] in ("stdout", "stderr"):
+                    job.line_count += len(event["lines"])
+                elif event["type"] in ("result", "error"):
+                    job.result = event
+                    if event.get("is_timeout"):
+                        final_state = JOB_TIMEOUT
+                    elif event.get("is_cancelled"):
+                        final_state = JOB_CANCELLED
+                    elif event.get("success"):
+                        final_state = JOB_FINISHED
+                self._events.put((job, event))
+
+                if job.cancel_event.is_set():
+                    final_state = JOB_CANCELLED
+                    break
+        except Exception as e:
+            job.result = {"type": "error", "success": False, "error": f"任务执行异常: {str(e)}"}
+            self._events.put((job, job.result))
+        finally:
+            # 关闭生成器，由执行函数负责结束仍在运行的进程
+            if events is not None and hasattr(events, "close"):
+                events.close()
+            self._set_state(job, final_state)
@@ -1,29 +1,41 @@
 import json
-import platform
 import os
 
+from agent.template_engine import PLATFORM_KEY, compile_template
+
 
 class ModuleLoader:
-    def __init__(self, path):
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"模板文件未找到: {path}")
-        
-        with open(path, "r", encoding="utf-8") as f:
-            self.data = json.load(f)
-
-    def build_command(self, params):
-        system = platform.system().lower()
-        if system == "windows":
-            key = "windows"
-        elif system == "darwin":
-            key = "mac"
-        else:
-            key = "linux"
-
-        if key not in self.data["platforms"]:
-            raise KeyError(f"不支持的平台: {key}")
-            
-        template = self.data["platforms"][key]["command"]
-        for k, v in params.items():
-            template = template.replace("{" + k + "}", v)
-        return template
\ No newline at end of file
+    def __init__(self, path=None, data=None):
+        if data is None:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"模板文件未找到: {path}")
+
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        self.path = path
+        self.data = data
+        self._compiled = {}
+
+    @property
+    def name(self):
+        if "name" in self.data:
+            return self.data["name"]
+        return os.path.splitext(os.path.basename(self.path or ""))[0]
+
+    @property
+    def platforms(self):
+        return list(self.data.get("platforms", {}))
+
+    def compiled(self, platform_key=PLATFORM_KEY):
+        # 每个平台只编译一次
+        template = self._compiled.get(platform_key)
+        if template is None:
+            template = self._compiled[platform_key] = compile_template(self.data, platform_key)
+        return template
+
+    def build_command(self, params, platform_key=PLATFORM_KEY):
+        return self.compiled(platform_key).render(params)
+
+    def build_many(self, rows, platform_key=PLATFORM_KEY):
+        # rows 为列式参数 {参数名: [值, ...]} 或参数字典的迭代器，逐个产生命令
+        return self.compiled(platform_key).render_many(rows)
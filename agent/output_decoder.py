@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+输出解码模块 - 按执行器选择编码，把子进程的原始字节增量解码为行
+"""
+
+import sys
+import codecs
+from typing import List, Optional
+
+
+# 字节顺序标记及其对应编码，utf-16编解码器会根据BOM判断字节序并去掉BOM
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def _windows_console_encoding() -> Optional[str]:
+    """读取Windows控制台输出代码页，GUI进程没有控制台时退回OEM代码页"""
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        code_page = kernel32.GetConsoleOutputCP() or kernel32.GetOEMCP()
+    except (ImportError, AttributeError, OSError):
+        return None
+    if code_page == 65001:
+        return "utf-8"
+    return f"cp{code_page}"
+
+
+def detect_shell_encoding(executor: str = "powershell") -> str:
+    """
+    推断执行器输出使用的编码
+
+    Args:
+        executor: 执行器名称，如 powershell、cmd、bash
+
+    Returns:
+        Python编码名称，Windows下的powershell/cmd为控制台代码页（如cp936），其他情况为utf-8
+    """
+    if sys.platform != "win32" or executor in ("bash", "sh"):
+        return "utf-8"
+
+    encoding = _windows_console_encoding()
+    if encoding is None:
+        return "mbcs"
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return "mbcs"
+    return encoding
+
+
+class LineDecoder:
+    """
+    增量行解码器
+
+    每次喂入一段字节（可以是复用缓冲区的memoryview切片），返回其中完整的行，
+    未结束的半行和被截断的多字节字符留到下一次。首段数据带BOM或呈现UTF-16特征时自动切换编码。
+    """
+
+    def __init__(self, encoding: str = "utf-8", errors: str = "replace"):
+        """
+        初始化解码器
+
+        Args:
+            encoding: 默认编码
+            errors: 解码错误处理方式
+        """
+        self.encoding = encoding
+        self.errors = errors
+        self._decoder = None
+        self._pending = ""
+
+    def _sniff(self, data) -> str:
+        head = bytes(data[:4])
+        for bom, encoding in _BOMS:
+            if head.startswith(bom):
+                return encoding
+        # 没有BOM的UTF-16LE：ASCII字符的高字节全是0
+        sample = bytes(data[:64])
+        if len(sample) >= 4 and sample[1::2].count(0) >= len(sample) // 2 * 0.9:
+            return "utf-16-le"
+        return self.encoding
+
+    def feed(self, data) -> List[str]:
+        """
+        解码一段字节
+
+        Args:
+            data: bytes、bytearray或memoryview
+
+        Returns:
+            本段数据中完整的行（不含换行符）
+        """
+        if not data:
+            return []
+        if self._decoder is None:
+            self.encoding = self._sniff(data)
+            self._decoder = codecs.getincrementaldecoder(self.encoding)(self.errors)
+
+        text = self._decoder.decode(data)
+        if "\n" not in text:
+            self._pending += text
+            return []
+
+        lines = (self._pending + text).split("\n")
+        self._pending = lines.pop()
+        return [line[:-1] if line.endswith("\r") else line for line in lines]
+
+    def flush(self) -> List[str]:
+        """
+        结束解码，返回剩余的最后一行
+
+        Returns:
+            剩余行列表，没有剩余内容时为空
+        """
+        if self._decoder is not None:
+            self._pending += self._decoder.decode(b"", final=True)
+        tail, self._pending = self._pending, ""
+        if tail.endswith("\r"):
+            tail = tail[:-1]
+        return [tail] if tail else []
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+输出摘要模块 - 在命令产生输出的同时增量归纳，生成长度受限、可回传给模型的摘要
+"""
+
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+
+# 单行最多保留的字符数
+_MAX_LINE_CHARS = 300
+# 表格检测使用的样本行数
+_TABLE_SAMPLE_LINES = 12
+# 每列最多统计的不同取值数
+_MAX_DISTINCT_VALUES = 50
+
+_MULTI_SPACE = re.compile(r"\s{2,}")
+# PowerShell Format-Table、Markdown表格等的分隔行
+_SEPARATOR_LINE = re.compile(r"^[\s\-=+|:]+$")
+_NUMBER = re.compile(r"^[-+]?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?$")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：ASCII字符约4个一个token，其他字符约一个字符一个token"""
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+
+def _clip(line: str, limit: int = _MAX_LINE_CHARS) -> str:
+    return line if len(line) <= limit else line[:limit] + "…"
+
+
+def _split_tab(line: str) -> List[str]:
+    return line.split("\t")
+
+
+def _split_pipe(line: str) -> List[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def _split_comma(line: str) -> List[str]:
+    return [cell.strip() for cell in line.split(",")]
+
+
+def _split_multi_space(line: str) -> List[str]:
+    return _MULTI_SPACE.split(line.strip())
+
+
+def _split_space(line: str) -> List[str]:
+    return line.split()
+
+
+# 按可信度从高到低尝试的分隔方式
+_SPLITTERS = (
+    ("制表符", _split_tab),
+    ("竖线", _split_pipe),
+    ("多个空格", _split_multi_space),
+    ("逗号", _split_comma),
+    ("空白", _split_space),
+)
+
+
+class _ColumnStats:
+    """单列的增量统计：数值列记录范围和均值，文本列记录取值分布"""
+
+    __slots__ = ("name", "numeric", "minimum", "maximum", "total", "empty", "values", "overflow")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.numeric = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+        self.empty = 0
+        self.values: Dict[str, int] = {}
+        self.overflow = False
+
+    def add(self, value: str):
+        if not value:
+            self.empty += 1
+            return
+        if _NUMBER.match(value):
+            number = float(value)
+            self.numeric += 1
+            self.total += number
+            if self.minimum is None or number < self.minimum:
+                self.minimum = number
+            if self.maximum is None or number > self.maximum:
+                self.maximum = number
+        if value in self.values:
+            self.values[value] += 1
+        elif len(self.values) < _MAX_DISTINCT_VALUES:
+            self.values[value] = 1
+        else:
+            self.overflow = True
+
+    def describe(self, rows: int) -> str:
+        filled = rows - self.empty
+        if filled and self.numeric >= filled * 0.9:
+            return (f"{self.name}: 数值 {self.minimum:g} ~ {self.maximum:g}，"
+                    f"平均 {self.total / self.numeric:g}")
+        distinct = f"超过 {_MAX_DISTINCT_VALUES}" if self.overflow else str(len(self.values))
+        top = sorted(self.values.items(), key=lambda item: item[1], reverse=True)[:3]
+        if top and top[0][1] == 1:
+            return f"{self.name}: {distinct} 种取值，互不重复，如 {_clip(top[0][0], 40)}"
+        top_text = "、".join(f"{_clip(value, 40)}×{count}" for value, count in top)
+        return f"{self.name}: {distinct} 种取值，最多 {top_text}" if top else f"{self.name}: 全部为空"
+
+
+class _TableDetector:
+    """根据开头的样本行判断输出是否为表格，确定后逐行统计各列"""
+
+    def __init__(self):
+        self.sample: List[str] = []
+        self.decided = False
+        self.kind: Optional[str] = None
+        self.splitter = None
+        self.columns: List[_ColumnStats] = []
+        self.rows = 0
+        self.other_lines = 0
+
+    def add(self, line: str):
+        if not line.strip() or _SEPARATOR_LINE.match(line):
+            return
+        if self.decided:
+            if self.splitter is not None:
+                self._add_row(line)
+            return
+        self.sample.append(line)
+        if len(self.sample) >= _TABLE_SAMPLE_LINES:
+            self.finish_sampling()
+
+    def finish_sampling(self):
+        """根据已有样本确定表格结构，输出不足样本行数时在生成摘要前调用"""
+        if self.decided:
+            return
+        self.decided = True
+        sample, self.sample = self.sample, []
+        if len(sample) < 3:
+            return
+
+        for kind, splitter in _SPLITTERS:
+            counts = [len(splitter(line)) for line in sample]
+            width = counts[0]
+            rest = counts[1:]
+            if kind == "空白":
+                # 按空白切分时最后一列可能含空格（如命令行），只要求不少于表头列数
+                if width < 3 or sum(count >= width for count in rest) < len(rest) * 0.9 \
+                        or sum(count == width for count in rest) < len(rest) * 0.5:
+                    continue
+            elif width < 2 or sum(count == width for count in rest) < len(rest) * 0.8:
+                continue
+
+            self.kind = kind
+            self.splitter = splitter
+            header = splitter(sample[0])
+            if all(_NUMBER.match(cell) for cell in header if cell):
+                # 第一行全是数值时没有表头，作为数据行处理
+                self.columns = [_ColumnStats(f"第{i + 1}列") for i in range(width)]
+                rows = sample
+            else:
+                self.columns = [_ColumnStats(_clip(cell, 30) or f"第{i + 1}列") for i, cell in enumerate(header)]
+                rows = sample[1:]
+            for line in rows:
+                self._add_row(line)
+            return
+
+    def _add_row(self, line: str):
+        if self.kind == "空白":
+            cells = line.split(None, len(self.columns) - 1)
+        else:
+            cells = self.splitter(line)
+        if len(cells) != len(self.columns):
+            self.other_lines += 1
+            return
+        self.rows += 1
+        for column, cell in zip(self.columns, cells):
+            column.add(cell.strip())
+
+    def describe(self) -> List[str]:
+        if self.splitter is None or self.rows < 2:
+            return []
+        lines = [f"表格: {self.rows} 行 × {len(self.columns)} 列（按{self.kind}分隔）"]
+        if self.other_lines:
+            lines[0] += f"，另有 {self.other_lines} 行不符合表格格式"
+        lines.extend("  - " + column.describe(self.rows) for column in self.columns)
+        return lines
+
+
+class _StreamDigest:
+    """单个输出流的开头/结尾行（连续重复行合并计数）和重复行统计"""
+
+    def __init__(self, head_lines: int, tail_lines: int, max_distinct: int):
+        self.head_lines = head_lines
+        self.head: List[List] = []
+        self.tail = deque(maxlen=tail_lines)
+        self.line_count = 0
+        self.max_distinct = max_distinct
+        self.counts: Dict[str, int] = {}
+
+    def add(self, line: str):
+        line = _clip(line)
+        self.line_count += 1
+        if line in self.counts:
+            self.counts[line] += 1
+        elif len(self.counts) < self.max_distinct:
+            self.counts[line] = 1
+
+        # 连续重复的行合并为一条并计数
+        if self.tail:
+            if self.tail[-1][0] == line:
+                self.tail[-1][1] += 1
+                return
+        elif self.head and self.head[-1][0] == line:
+            self.head[-1][1] += 1
+            return
+
+        if len(self.head) < self.head_lines:
+            self.head.append([line, 1])
+            return
+        self.tail.append([line, 1])
+
+    def repeated(self, limit: int = 5) -> List[tuple]:
+        """出现次数最多的重复行"""
+        repeated = [(line, count) for line, count in self.counts.items() if count > 1 and line.strip()]
+        repeated.sort(key=lambda item: item[1], reverse=True)
+        return repeated[:limit]
+
+
+def _format_runs(runs: Iterable[List]) -> List[str]:
+    return [line if count == 1 else f"{line}  （重复 {count} 次）" for line, count in runs]
+
+
+class OutputSummarizer:
+    """
+    命令输出的流式摘要器
+
+    输出行到达时立即处理：保留开头和结尾的行、合并连续重复行、统计重复最多的行，
+    并对表格形式的输出统计行数和每列的取值范围或分布。内存占用与输出总量无关，
+    digest() 生成的摘要不超过指定的token数。
+    """
+
+    def __init__(self, max_tokens: int = 800, head_lines: int = 20, tail_lines: int = 20,
+                 max_distinct: int = 5000):
+        """
+        初始化摘要器
+
+        Args:
+            max_tokens: 摘要的最大token数（估算值）
+            head_lines: 每个输出流保留的开头行数
+            tail_lines: 每个输出流保留的结尾行数
+            max_distinct: 重复行统计最多跟踪的不同行数
+        """
+        self.max_tokens = max_tokens
+        self.streams = {
+            "stdout": _StreamDigest(head_lines, tail_lines, max_distinct),
+            "stderr": _StreamDigest(max(head_lines // 2, 1), max(tail_lines // 2, 1), max_distinct),
+        }
+        self.table = _TableDetector()
+
+    def feed(self, lines: Iterable[str], stream: str = "stdout"):
+        """
+        处理一批输出行
+
+        Args:
+            lines: 输出行（不含换行符）
+            stream: 输出流名称，stdout 或 stderr
+        """
+        digest = self.streams[stream]
+        if stream == "stdout":
+            table = self.table
+            for line in lines:
+                digest.add(line)
+                table.add(line)
+        else:
+            for line in lines:
+                digest.add(line)
+
+    @property
+    def line_count(self) -> int:
+        """已处理的总行数"""
+        return sum(digest.line_count for digest in self.streams.values())
+
+    def _render(self, shown_lines: int, line_limit: int) -> str:
+        parts = [line for line, _ in self._render_lines(shown_lines, line_limit)]
+        return "\n".join(parts) if parts else "（没有输出）"
+
+    def _render_lines(self, shown_lines: int, line_limit: int) -> List[tuple]:
+        # [(行, 是否为输出流的标题行)]，标题行在截断时保留
+        parts = []
+        self.table.finish_sampling()
+        for name, digest in self.streams.items():
+            if not digest.line_count:
+                continue
+            head = digest.head[:shown_lines]
+            tail = list(digest.tail)[-shown_lines:] if shown_lines else []
+            kept = sum(count for _, count in head) + sum(count for _, count in tail)
+            hidden = digest.line_count - kept
+
+            header = f"[{name}] 共 {digest.line_count} 行"
+            if hidden:
+                header += f"，中间 {hidden} 行已省略"
+            parts.append((header, True))
+            if name == "stdout":
+                parts.extend((line, False) for line in self.table.describe())
+            repeated = digest.repeated()
+            if repeated and hidden:
+                parts.append(("重复最多的行:", False))
+                parts.extend((f"  ×{count} {_clip(line, line_limit)}", False) for line, count in repeated)
+            if head:
+                parts.extend((_clip(line, line_limit), False) for line in _format_runs(head))
+            if hidden and tail:
+                parts.append(("...", False))
+            if tail:
+                parts.extend((_clip(line, line_limit), False) for line in _format_runs(tail))
+        return parts
+
+    def _fit_lines(self, line_limit: int, budget: int) -> str:
+        # 只保留预算内的整行（标题行总是保留），不从表格或列说明的中间截断
+        lines = self._render_lines(0, line_limit)
+        note = "…（超出长度，省略 {} 行）"
+        available = budget - estimate_tokens(note.format(len(lines))) - sum(
+            estimate_tokens(line) + 1 for line, essential in lines if essential)
+        kept, omitted, full = [], 0, False
+        for line, essential in lines:
+            if essential:
+                kept.append(line)
+                full = False
+                continue
+            # 同一个输出流中放不下一行后，后面的行也不再保留，避免留下没有内容的小标题
+            cost = estimate_tokens(line) + 1
+            if not full and cost <= available:
+                kept.append(line)
+                available -= cost
+            else:
+                full = True
+                omitted += 1
+        if omitted:
+            kept.append(note.format(omitted))
+        return "\n".join(kept) if kept else "（没有输出）"
+
+    def digest(self, max_tokens: Optional[int] = None) -> str:
+        """
+        生成摘要
+
+        Args:
+            max_tokens: 摘要的最大token数，默认使用初始化时的设置
+
+        Returns:
+            摘要文本，只按整行截断；预算连各输出流的标题行都放不下时仍保留标题行
+        """
+        budget = max_tokens or self.max_tokens
+        shown_lines = max(len(digest.head) for digest in self.streams.values())
+        line_limit = _MAX_LINE_CHARS
+        text = self._render(shown_lines, line_limit)
+        # 超出预算时逐步减少展示的行数和每行长度
+        while estimate_tokens(text) > budget and (shown_lines > 0 or line_limit > 80):
+            if shown_lines > 2:
+                shown_lines //= 2
+            elif line_limit > 80:
+                line_limit //= 2
+            else:
+                shown_lines = 0
+            text = self._render(shown_lines, line_limit)
+        if estimate_tokens(text) > budget:
+            text = self._fit_lines(line_limit, budget)
+        return text
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+进程控制模块 - 以独立进程组启动命令，并按"先温和后强制"的顺序结束整棵进程树
+"""
+
+import os
+import sys
+import time
+import signal
+import threading
+import subprocess
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from agent.output_decoder import LineDecoder
+
+
+_IS_WINDOWS = sys.platform == "win32"
+
+
+def new_process_group_kwargs() -> Dict[str, Any]:
+    """
+    生成让子进程成为新进程组（会话）组长的Popen参数
+
+    Returns:
+        传给 subprocess.Popen 的关键字参数
+    """
+    if _IS_WINDOWS:
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def shell_command_args(executor: str, command: str) -> Union[str, List[str]]:
+    """
+    生成用指定执行器运行命令的参数列表
+
+    Args:
+        executor: 执行器名称，powershell、cmd、bash 或 sh
+        command: 命令文本
+
+    Returns:
+        传给 subprocess.Popen 的参数列表；Windows下的cmd为完整的命令行字符串
+
+    Raises:
+        ValueError: 不支持的执行器
+    """
+    if executor == "powershell":
+        return ["powershell", "-Command", command]
+    if executor == "cmd":
+        if _IS_WINDOWS:
+            # list2cmdline 会把 " 转义为 \"，cmd 不认识；/s /c "..." 去掉最外层的引号后原样执行命令
+            return f'cmd /s /c "{command}"'
+        return ["cmd", "/c", command]
+    if executor in ("bash", "sh"):
+        return [executor, "-c", command]
+    raise ValueError(f"不支持的执行器: {executor}")
+
+
+def _group_alive(pgid: int) -> bool:
+    try:
+        os.killpg(pgid, 0)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+def _signal_group(pgid: int, sig: int):
+    try:
+        os.killpg(pgid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def terminate_process_tree(process: subprocess.Popen,
+                           wait: Optional[Callable[[float], Any]] = None,
+                           grace: float = 3.0) -> str:
+    """
+    结束进程及其所有子孙进程
+
+    先发送温和的终止信号（POSIX为进程组SIGTERM，Windows为CTRL_BREAK），
+    在宽限期内仍未退出的进程再强制结束（SIGKILL / taskkill /T /F）。
+    进程必须由 new_process_group_kwargs() 启动。
+
+    Args:
+        process: 要结束的进程
+        wait: 等待进程退出的函数，签名为 wait(timeout)，超时抛出 subprocess.TimeoutExpired，
+              默认使用 process.wait；使用 ProcessUsageTracker.wait 可保留资源统计
+        grace: 温和终止的宽限时间（秒）
+
+    Returns:
+        结束方式: "exited"（已自行退出）、"terminated"（温和结束）或 "killed"（强制结束）
+    """
+    wait = wait or process.wait
+    deadline = time.monotonic() + grace
+
+    if _IS_WINDOWS:
+        if process.poll() is not None:
+            return "exited"
+        try:
+            process.send_signal(signal.CTRL_BREAK_EVENT)
+            wait(grace)
+            return "terminated"
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        subprocess.run(["taskkill", "/T", "/F", "/PID", str(process.pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        process.kill()
+        wait(None)
+        return "killed"
+
+    # 子进程是会话组长，进程组号即其pid；组长被回收后只要组内还有进程，该号就不会被复用
+    pgid = process.pid
+    if process.returncode is not None and not _group_alive(pgid):
+        return "exited"
+
+    _signal_group(pgid, signal.SIGTERM)
+    outcome = "terminated"
+    try:
+        wait(max(0.0, deadline - time.monotonic()))
+    except subprocess.TimeoutExpired:
+        outcome = "killed"
+
+    # 组长已退出时，继续给组内其余进程留出宽限时间
+    while _group_alive(pgid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if _group_alive(pgid):
+        outcome = "killed"
+        _signal_group(pgid, signal.SIGKILL)
+    if process.returncode is None:
+        wait(None)
+    return outcome
+
+
+class PipeReader(threading.Thread):
+    """
+    管道读取线程，按块读取子进程的原始字节并增量解码
+
+    读取复用同一个bytearray缓冲区，通过memoryview切片交给解码器，不产生中间bytes对象；
+    一次读取中得到的所有完整行作为一批放入队列，避免逐行产生事件。
+    """
+
+    def __init__(self, stream, name: str, sink, encoding: str = "utf-8",
+                 buffer_size: int = 64 * 1024):
+        """
+        初始化读取线程
+
+        Args:
+            stream: 子进程的stdout或stderr，需以二进制无缓冲方式打开（bufsize=0）
+            name: 输出流名称，随每批行一起放入队列
+            sink: 接收 (name, lines) 的队列
+            encoding: 输出编码
+            buffer_size: 读取缓冲区大小（字节）
+        """
+        super().__init__(name=f"pipe-{name}", daemon=True)
+        self.stream = stream
+        self.stream_name = name
+        self.sink = sink
+        self.decoder = LineDecoder(encoding)
+        self.buffer = bytearray(buffer_size)
+        self.start()
+
+    def run(self):
+        view = memoryview(self.buffer)
+        try:
+            while True:
+                size = self.stream.readinto(self.buffer)
+                if not size:
+                    break
+                lines = self.decoder.feed(view[:size])
+                if lines:
+                    self.sink.put((self.stream_name, lines))
+        except (OSError, ValueError):
+            # 管道被关闭
+            pass
+        lines = self.decoder.flush()
+        if lines:
+            self.sink.put((self.stream_name, lines))
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+资源统计模块 - 采集命令执行的耗时、CPU时间、内存峰值和磁盘I/O
+"""
+
+import os
+import sys
+import time
+import threading
+import subprocess
+from typing import Any, Dict, Optional, Tuple
+
+
+# os.wait4 仅在POSIX系统可用，Windows下只统计耗时
+_HAS_WAIT4 = hasattr(os, "wait4")
+
+# /proc/<pid>/io 中需要采集的字段
+_IO_FIELDS = ("rchar", "wchar", "read_bytes", "write_bytes")
+
+# 进程已被其他调用回收、拿不到退出状态时使用的退出码
+UNKNOWN_RETURNCODE = -1
+
+
+def _exit_code(status: int) -> int:
+    # os.waitstatus_to_exitcode 从Python 3.9开始才有，与 Popen.returncode 一致：被信号结束时为负的信号编号
+    if hasattr(os, "waitstatus_to_exitcode"):
+        return os.waitstatus_to_exitcode(status)
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    return UNKNOWN_RETURNCODE
+
+
+class ProcessUsageTracker:
+    """
+    子进程资源统计类
+
+    由本类负责回收子进程（os.wait4），从而拿到该进程及其已回收子进程的rusage。
+    回收前读取 /proc/<pid>/io，僵尸进程的I/O计数仍然可读。
+    """
+
+    def __init__(self, process: subprocess.Popen):
+        """
+        初始化资源统计
+
+        Args:
+            process: 已启动的子进程
+        """
+        self.process = process
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.rusage = None
+        self.io_counters: Dict[str, int] = {}
+        # 退出状态是否未知（进程被其他调用回收）
+        self.exit_unknown = False
+
+    def sample_io(self):
+        """读取 /proc/<pid>/io，仅Linux可用，其他平台静默跳过"""
+        try:
+            with open(f"/proc/{self.process.pid}/io", "r") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key in _IO_FIELDS:
+                        self.io_counters[key] = int(value)
+        except (OSError, ValueError):
+            pass
+
+    def poll(self) -> Optional[int]:
+        """
+        非阻塞检查进程是否结束
+
+        Returns:
+            进程退出码，进程仍在运行时返回None，退出状态未知时返回 UNKNOWN_RETURNCODE
+        """
+        if self.process.returncode is not None:
+            return self.process.returncode
+
+        if not _HAS_WAIT4:
+            returncode = self.process.poll()
+            if returncode is not None:
+                self.end_time = time.perf_counter()
+            return returncode
+
+        self.sample_io()
+        try:
+            pid, status, rusage = os.wait4(self.process.pid, os.WNOHANG)
+        except ChildProcessError:
+            # 进程已被其他调用回收，拿不到rusage和退出状态，不能当作执行成功
+            self.end_time = time.perf_counter()
+            if self.process.returncode is None:
+                self.process.returncode = UNKNOWN_RETURNCODE
+                self.exit_unknown = True
+            return self.process.returncode
+
+        if pid == 0:
+            return None
+
+        self.end_time = time.perf_counter()
+        self.rusage = rusage
+        self.process.returncode = _exit_code(status)
+        return self.process.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        """
+        等待进程结束
+
+        Args:
+            timeout: 超时时间（秒），None表示一直等待
+
+        Returns:
+            进程退出码
+
+        Raises:
+            subprocess.TimeoutExpired: 等待超时
+        """
+        if not _HAS_WAIT4:
+            returncode = self.process.wait(timeout)
+            if self.end_time is None:
+                self.end_time = time.perf_counter()
+            return returncode
+
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        delay = 0.0005
+        while True:
+            returncode = self.poll()
+            if returncode is not None:
+                return returncode
+            if deadline is not None and time.perf_counter() >= deadline:
+                raise subprocess.TimeoutExpired(self.process.args, timeout)
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    def communicate(self, timeout: Optional[float] = None) -> Tuple[Any, Any]:
+        """
+        读取全部输出并回收进程，替代 Popen.communicate 以保留rusage
+
+        Args:
+            timeout: 超时时间（秒）
+
+        Returns:
+            (stdout, stderr) 元组
+
+        Raises:
+            subprocess.TimeoutExpired: 超时仍未读完输出或进程未退出，此时进程不会被结束
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        outputs = {}
+        readers = []
+        for name, stream in (("stdout", self.process.stdout), ("stderr", self.process.stderr)):
+            if stream is None:
+                continue
+            reader = threading.Thread(
+                target=lambda name=name, stream=stream: outputs.__setitem__(name, stream.read()),
+                daemon=True
+            )
+            reader.start()
+            readers.append(reader)
+
+        for reader in readers:
+            reader.join(None if deadline is None else max(0.0, deadline - time.perf_counter()))
+            if reader.is_alive():
+                raise subprocess.TimeoutExpired(self.process.args, timeout)
+        self.wait(None if deadline is None else max(0.0, deadline - time.perf_counter()))
+
+        for stream in (self.process.stdout, self.process.stderr):
+            if stream is not None:
+                stream.close()
+        return outputs.get("stdout"), outputs.get("stderr")
+
+    def usage(self) -> Dict[str, Any]:
+        """
+        汇总资源使用情况
+
+        Returns:
+            包含 wall_time、user_time、system_time、max_rss_kb、read_bytes、write_bytes 的字典，
+            当前平台无法获取的字段为None；退出状态未知时 exit_unknown 为True
+        """
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        usage = {
+            "pid": self.process.pid,
+            "wall_time": round(end_time - self.start_time, 6),
+            "user_time": None,
+            "system_time": None,
+            "max_rss_kb": None,
+            "read_bytes": self.io_counters.get("read_bytes"),
+            "write_bytes": self.io_counters.get("write_bytes"),
+            "exit_unknown": self.exit_unknown,
+        }
+
+        if self.rusage is not None:
+            usage["user_time"] = self.rusage.ru_utime
+            usage["system_time"] = self.rusage.ru_stime
+            # macOS的ru_maxrss单位是字节，Linux是KB
+            max_rss = self.rusage.ru_maxrss
+            usage["max_rss_kb"] = max_rss // 1024 if sys.platform == "darwin" else max_rss
+            # 没有/proc时退回到块I/O计数（512字节块）
+            if usage["read_bytes"] is None:
+                usage["read_bytes"] = self.rusage.ru_inblock * 512
+            if usage["write_bytes"] is None:
+                usage["write_bytes"] = self.rusage.ru_oublock * 512
+
+        return usage
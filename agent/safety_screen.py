@@ -0,0 +1,575 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+命令安全检查 - 把拒绝/确认模式编译为Aho–Corasick自动机，并按拆分后的命令和参数检查命令规则，执行前对命令分级，并可对流式输出增量扫描
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from collections import deque
+from fnmatch import fnmatchcase
+from typing import Any, Dict, List, Optional, Tuple
+
+
+LEVEL_ALLOW = "allow"
+LEVEL_CONFIRM = "confirm"
+LEVEL_DENY = "deny"
+
+_LEVEL_RANK = {LEVEL_ALLOW: 0, LEVEL_CONFIRM: 1, LEVEL_DENY: 2}
+
+_WHITESPACE = re.compile(r"\s+")
+
+# 右边界：不检查 / 下一个字符不是单词字符 / 下一个字符结束当前参数
+_RIGHT_NONE, _RIGHT_WORD, _RIGHT_TOKEN = 0, 1, 2
+# 以路径字符结尾的模式（如 rm -rf /）只在参数到此结束时命中，rm -rf /tmp/build 不算
+_PATH_END_CHARS = "/\\~*"
+_TOKEN_END_CHARS = " ;|&)"
+
+# 按管道和命令分隔符切分命令（保留分隔符，用于判断管道），以及切分参数（引号内的空白不切分）
+_SEGMENT_SPLIT = re.compile(r"(\|\||&&|(?<![>&])&(?![>&])|[|;\n])")
+_ARGUMENT = re.compile(r'"[^"]*"|\'[^\']*\'|[^\s"\']+')
+_REDIRECT = re.compile(r"^\d?>>?")
+_COMMAND_PREFIXES = ("sudo", "doas", "&", "nohup", "exec", "time", "command")
+# cmd 风格的单字母开关（/s、/q）
+_SLASH_FLAG = re.compile(r"^/[a-z?]$")
+# 把后面的参数当作命令执行的 shell 及其开关
+_SHELLS = ("sh", "bash", "zsh", "dash", "powershell", "pwsh", "cmd")
+_SHELL_COMMAND_FLAGS = ("-c", "-command", "/c", "/k")
+_MAX_NESTING = 3
+# 短开关合并写法（-rf、-fr）的最大长度，更长的单横线参数按 PowerShell 参数名处理
+_MAX_FLAG_CLUSTER = 4
+
+
+def _is_word_char(ch: str) -> bool:
+    # PowerShell cmdlet 名称中的连字符也视为单词的一部分
+    return ch.isalnum() or ch in "_-"
+
+
+def _right_check(pattern: str) -> int:
+    if not pattern:
+        return _RIGHT_NONE
+    if _is_word_char(pattern[-1]):
+        return _RIGHT_WORD
+    return _RIGHT_TOKEN if pattern[-1] in _PATH_END_CHARS else _RIGHT_NONE
+
+
+def _right_boundary(kind: int, ch: str) -> bool:
+    return not _is_word_char(ch) if kind == _RIGHT_WORD else ch in _TOKEN_END_CHARS
+
+
+def _normalize_path(path: str) -> str:
+    return path.strip("\"'").lower().replace("\\", "/").rstrip("/")
+
+
+def _command_name(token: str) -> str:
+    # /bin/rm、C:\Windows\System32\cmd.exe 都按命令本身的名称检查
+    name = token.strip("\"'").replace("\\", "/").rsplit("/", 1)[-1]
+    return name[:-4] if name.endswith(".exe") else name
+
+
+class _Segment:
+    """
+    管道或分隔符之间的一条简单命令，文本已转为小写
+    """
+
+    __slots__ = ("name", "prefixes", "arguments", "targets", "pipeline")
+
+    def __init__(self, name: str, prefixes: List[str], arguments: List[str], targets: List[str],
+                 pipeline: List[str]):
+        self.name = name
+        self.prefixes = prefixes
+        self.arguments = arguments
+        self.targets = targets
+        self.pipeline = pipeline
+
+    def flags(self) -> List[Tuple[str, bool]]:
+        """
+        Returns:
+            [(开关名, 是否为 -- 长参数)]，去掉前导的 -、-- 或 /，以及 PowerShell 的 :值
+        """
+        flags = []
+        for argument in self.arguments:
+            if argument.startswith("--"):
+                flags.append((argument[2:].split("=", 1)[0], True))
+            elif argument.startswith("-") and len(argument) > 1:
+                flags.append((argument[1:].split(":", 1)[0], False))
+            elif _SLASH_FLAG.match(argument):
+                flags.append((argument[1:], False))
+        return [(word, long_form) for word, long_form in flags if word]
+
+    def positional(self) -> List[str]:
+        """不是开关的参数"""
+        return [argument for argument in self.arguments
+                if argument and not argument.startswith("-") and not _SLASH_FLAG.match(argument)]
+
+
+def _command_segments(command: str, depth: int = 0):
+    """
+    把命令按管道和分隔符拆成简单命令，sh -c、cmd /c 等执行的命令也一并拆出
+
+    Yields:
+        _Segment，参数已去掉引号
+    """
+    pipeline: List[str] = []
+    for segment in _SEGMENT_SPLIT.split(command.lower()):
+        if segment in ("|", "||", "&&", "&", ";", "\n"):
+            if segment != "|":
+                pipeline = []
+            continue
+        tokens = _ARGUMENT.findall(segment)
+        prefixes = []
+        while tokens and _command_name(tokens[0]) in _COMMAND_PREFIXES:
+            prefixes.append(_command_name(tokens[0]))
+            tokens = tokens[1:]
+        if not tokens:
+            continue
+        arguments, targets = [], []
+        index = 1
+        while index < len(tokens):
+            token = tokens[index]
+            redirect = _REDIRECT.match(token)
+            if redirect:
+                # > file 与 >file 两种写法
+                target = token[redirect.end():]
+                if not target and index + 1 < len(tokens):
+                    index += 1
+                    target = tokens[index]
+                if target:
+                    targets.append(target.strip("\"'"))
+            else:
+                arguments.append(token.strip("\"'"))
+            index += 1
+        name = _command_name(tokens[0])
+        yield _Segment(name, prefixes, arguments, targets, list(pipeline))
+        pipeline.append(name)
+
+        if name in _SHELLS and depth < _MAX_NESTING:
+            for index, argument in enumerate(arguments):
+                if argument in _SHELL_COMMAND_FLAGS:
+                    yield from _command_segments(" ".join(arguments[index + 1:]), depth + 1)
+                    break
+
+
+def _name_matches(patterns: Tuple[str, ...], names: List[str]) -> bool:
+    return any(fnmatchcase(name, pattern) for name in names for pattern in patterns)
+
+
+def _flag_matches(group: frozenset, flags: List[Tuple[str, bool]]) -> bool:
+    # -r、-recurse 精确匹配；-fo、-rec 是 PowerShell 参数名的前缀；-rf、-fr 是合并的短开关
+    for word, long_form in flags:
+        if word in group:
+            return True
+        if long_form:
+            continue
+        if len(word) >= 2 and any(len(alias) > 1 and alias.startswith(word) for alias in group):
+            return True
+        if word.isalpha() and len(word) <= _MAX_FLAG_CLUSTER and any(
+                len(alias) == 1 and alias in word for alias in group):
+            return True
+    return False
+
+
+def _path_matches(argument: str, paths: List[str]) -> bool:
+    # 含 * 的路径按通配符匹配（/dev/sd*），其余匹配路径本身及其下的文件
+    for path in paths:
+        if "*" in path:
+            if fnmatchcase(argument, path):
+                return True
+        elif argument == path or argument.startswith(path + "/"):
+            return True
+    return False
+
+
+def _destination(arguments: List[str]) -> List[str]:
+    # 复制命令只写入目标：-destination 的值，否则是最后一个位置参数
+    for index, argument in enumerate(arguments[:-1]):
+        if argument in ("-destination", "-dest"):
+            return [arguments[index + 1]]
+    positional = [argument for argument in arguments if not argument.startswith("-")]
+    return positional[-1:] if len(positional) > 1 else []
+
+
+class SafetyVerdict:
+    """
+    一条命令的检查结果
+    """
+
+    __slots__ = ("level", "reasons")
+
+    def __init__(self, level: str = LEVEL_ALLOW, reasons: Optional[List[str]] = None):
+        self.level = level
+        self.reasons = reasons or []
+
+    @property
+    def allowed(self) -> bool:
+        return self.level == LEVEL_ALLOW
+
+    @property
+    def denied(self) -> bool:
+        return self.level == LEVEL_DENY
+
+    def __repr__(self):
+        return f"SafetyVerdict({self.level!r}, {self.reasons!r})"
+
+
+class _Automaton:
+    """
+    多模式匹配自动机
+
+    构建时把失败链接展开为完整的状态转移表，扫描时每个字符只做一次字典查找；
+    模式首尾是单词字符时要求匹配位置在单词边界上。
+    """
+
+    def __init__(self, patterns: List[str]):
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for ch in pattern:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][ch] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(pattern_id)
+
+        # 按广度优先计算失败链接，并把失败状态的转移合并进每个状态
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [None] * (len(goto) - 1)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            transitions = dict(delta[fail[state]])
+            for ch, next_state in goto[state].items():
+                fail[next_state] = delta[fail[state]].get(ch, 0) if state else 0
+                outputs[next_state] = outputs[next_state] + outputs[fail[next_state]]
+                transitions[ch] = next_state
+                queue.append(next_state)
+            delta[state] = transitions
+
+        self.delta = delta
+        self.outputs = outputs
+        self.lengths = [len(pattern) for pattern in patterns]
+        self.check_left = [bool(pattern) and _is_word_char(pattern[0]) for pattern in patterns]
+        self.check_right = [_right_check(pattern) for pattern in patterns]
+
+
+class StreamScanner:
+    """
+    流式扫描器，保存自动机状态，每次只扫描新到达的文本；命令规则和受保护路径在每行结束时按行检查
+    """
+
+    def __init__(self, screen: "SafetyScreen"):
+        self._screen = screen
+        self._compiled = screen._compiled
+        self._state = 0
+        self._text_tail = ""
+        # 在文本末尾结束、等待下一个字符确认右边界的匹配
+        self._pending: List[Tuple[int, int]] = []
+        self._line = ""
+        self.hits = set()
+        # 命令规则和受保护路径的命中：原因 -> 级别
+        self.matched: Dict[str, str] = {}
+
+    def feed(self, text: str) -> SafetyVerdict:
+        """
+        扫描一段新文本
+
+        Args:
+            text: 新到达的文本片段
+
+        Returns:
+            截至目前的检查结果
+        """
+        automaton = self._compiled["automaton"]
+        delta = automaton.delta
+        outputs = automaton.outputs
+        check_left = automaton.check_left
+        check_right = automaton.check_right
+        lengths = automaton.lengths
+        hits = self.hits
+        lines = (self._line + text).split("\n")
+        self._line = lines.pop()
+        for line in lines:
+            self._screen._check_commands(self._compiled, line, self.matched)
+        # 大小写和连续空白不影响匹配，跨片段的连续空白也只保留一个
+        text = _WHITESPACE.sub(" ", text.lower())
+        if text.startswith(" ") and self._text_tail.endswith(" "):
+            text = text[1:]
+        # 保留足够长的前文，用于检查匹配起点左侧的单词边界
+        window = self._text_tail + text
+        offset = len(self._text_tail)
+        state = self._state
+
+        for index, ch in enumerate(text):
+            if self._pending:
+                hits.update(pattern_id for pattern_id, kind in self._pending if _right_boundary(kind, ch))
+                self._pending = []
+            state = delta[state].get(ch, 0)
+            for pattern_id in outputs[state]:
+                if pattern_id in hits:
+                    continue
+                if check_left[pattern_id]:
+                    start = offset + index - lengths[pattern_id]
+                    if start >= 0 and _is_word_char(window[start]):
+                        continue
+                if check_right[pattern_id]:
+                    self._pending.append((pattern_id, check_right[pattern_id]))
+                else:
+                    hits.add(pattern_id)
+
+        self._state = state
+        self._text_tail = window[-self._compiled["max_length"]:] if window else ""
+        return self._screen._judge(self._compiled, hits, self.matched)
+
+    def finish(self) -> SafetyVerdict:
+        """文本结束，确认末尾处等待右边界的匹配"""
+        self.hits.update(pattern_id for pattern_id, _ in self._pending)
+        self._pending = []
+        self._screen._check_commands(self._compiled, self._line, self.matched)
+        self._line = ""
+        return self._screen._judge(self._compiled, self.hits, self.matched)
+
+
+class SafetyScreen:
+    """
+    命令安全检查器
+
+    规则文件为JSON，包含：
+    - deny / confirm: 模式或 {"pattern", "reason"}，命中即拒绝/需要确认
+    - combinations: {"all": [模式或模式列表, ...], "level", "reason"}，每组至少命中一个时生效
+    - commands: {"names": [...], "flags": [[...], ...], "targets": [...], "piped", "after", "level", "reason"}，
+      按命令名匹配拆分后的简单命令（支持通配符），flags 的每组都要出现（-rf、-r -f、-Recurse -Force、
+      -fo 等写法等价），targets 要求某个位置参数是其中的路径，piped 要求命令从管道读取输入，
+      after 要求管道前面有其中的命令
+    - path_scopes: {"paths": [...], "verbs": [...], "copy_verbs": [...], "level", "reason"}，
+      受保护的路径（可含通配符，如 /dev/sd*）是 verbs 中命令的参数、copy_verbs 中命令的目标或
+      > 重定向的目标（verbs 含 ">"）时生效
+    deny/confirm/combinations 的模式都编译进同一个自动机，一次扫描得到全部命中；commands 和
+    path_scopes 按行拆分命令和参数后检查，不受参数顺序、引号和空白的影响。规则文件修改后自动重新加载。
+    """
+
+    def __init__(self, rules_file: str = "config/safety_rules.json", refresh_interval: float = 2.0):
+        """
+        初始化安全检查器
+
+        Args:
+            rules_file: 规则文件路径，相对路径相对于项目根目录
+            refresh_interval: 两次检查规则文件变化的最小间隔（秒），负数关闭热加载
+        """
+        # 获取项目根目录
+        self.project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.rules_file = os.path.join(self.project_root, rules_file)
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._last_refresh = 0.0
+        self._compiled = self._compile({})
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        规则文件有变化时重新加载
+
+        Args:
+            force: 忽略检查间隔，立即检查
+
+        Returns:
+            是否重新加载了规则
+        """
+        now = time.monotonic()
+        if not force and (self.refresh_interval < 0 or now - self._last_refresh < self.refresh_interval):
+            return False
+        self._last_refresh = now
+
+        try:
+            stat = os.stat(self.rules_file)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if signature == self._signature:
+            return False
+
+        rules = {}
+        if signature is not None:
+            try:
+                with open(self.rules_file, "r", encoding="utf-8") as f:
+                    rules = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                # 规则文件写到一半或格式错误时保留原有规则
+                print(f"加载安全规则失败: {e}")
+                return False
+
+        compiled = self._compile(rules)
+        with self._lock:
+            self._compiled = compiled
+            self._signature = signature
+        return True
+
+    def _compile(self, rules: Dict[str, Any]) -> Dict[str, Any]:
+        patterns: List[str] = []
+        pattern_ids: Dict[str, int] = {}
+        # 规则：(级别, 原因, [每组的模式ID集合])
+        compiled_rules: List[Tuple[str, str, List[frozenset]]] = []
+
+        def pattern_id(pattern: str) -> int:
+            pattern = " ".join(str(pattern).lower().split())
+            if pattern not in pattern_ids:
+                pattern_ids[pattern] = len(patterns)
+                patterns.append(pattern)
+            return pattern_ids[pattern]
+
+        def add_rule(level, reason, groups):
+            groups = [frozenset(pattern_id(p) for p in ([group] if isinstance(group, str) else group))
+                      for group in groups]
+            if groups and all(groups):
+                compiled_rules.append((level, reason, groups))
+
+        for level in (LEVEL_DENY, LEVEL_CONFIRM):
+            for rule in rules.get(level, []):
+                if isinstance(rule, str):
+                    add_rule(level, rule, [rule])
+                else:
+                    add_rule(level, rule.get("reason", rule["pattern"]), [rule["pattern"]])
+        for rule in rules.get("combinations", []):
+            add_rule(rule.get("level", LEVEL_CONFIRM), rule.get("reason", " + ".join(map(str, rule["all"]))),
+                     rule["all"])
+        commands = [(rule.get("level", LEVEL_CONFIRM), rule.get("reason", " / ".join(rule["names"])),
+                     tuple(name.lower() for name in rule["names"]),
+                     [frozenset(flag.lower().lstrip("-/") for flag in group) for group in rule.get("flags", [])],
+                     frozenset(_normalize_path(target) for target in rule.get("targets", [])),
+                     bool(rule.get("piped")), tuple(name.lower() for name in rule.get("after", [])))
+                    for rule in rules.get("commands", [])]
+        scopes = [(scope.get("level", LEVEL_DENY), scope.get("reason", "操作受保护的路径"),
+                   frozenset(verb.lower() for verb in scope.get("verbs", [])),
+                   frozenset(verb.lower() for verb in scope.get("copy_verbs", [])),
+                   [_normalize_path(path) for path in scope["paths"]])
+                  for scope in rules.get("path_scopes", [])]
+
+        # 模式 -> 使用它的规则，判定时只检查有命中的规则
+        rules_by_pattern: Dict[int, List[int]] = {}
+        for rule_index, (_, _, groups) in enumerate(compiled_rules):
+            for group in groups:
+                for pid in group:
+                    rules_by_pattern.setdefault(pid, []).append(rule_index)
+
+        return {
+            "automaton": _Automaton(patterns),
+            "rules": compiled_rules,
+            "rules_by_pattern": rules_by_pattern,
+            "commands": commands,
+            "scopes": scopes,
+            "max_length": max((len(p) for p in patterns), default=0) + 1,
+        }
+
+    def _judge(self, compiled: Dict[str, Any], hits, matched: Dict[str, str]) -> SafetyVerdict:
+        if not hits and not matched:
+            return SafetyVerdict()
+        rules = compiled["rules"]
+        candidates = set()
+        for pid in hits:
+            candidates.update(compiled["rules_by_pattern"].get(pid, ()))
+
+        level = LEVEL_ALLOW
+        reasons = []
+        for rule_index in sorted(candidates):
+            rule_level, reason, groups = rules[rule_index]
+            if all(not group.isdisjoint(hits) for group in groups):
+                reasons.append(reason)
+                if _LEVEL_RANK[rule_level] > _LEVEL_RANK[level]:
+                    level = rule_level
+        for reason, rule_level in matched.items():
+            if reason not in reasons:
+                reasons.append(reason)
+            if _LEVEL_RANK[rule_level] > _LEVEL_RANK[level]:
+                level = rule_level
+        return SafetyVerdict(level, reasons)
+
+    def _check_commands(self, compiled: Dict[str, Any], text: str, matched: Dict[str, str]):
+        # 拆分一行命令，把命中的命令规则和受保护路径记入 matched（原因 -> 最高级别）
+        if not (compiled["commands"] or compiled["scopes"]) or not text.strip():
+            return
+        segments = list(_command_segments(text))
+
+        def add(level, reason):
+            if _LEVEL_RANK[level] > _LEVEL_RANK.get(matched.get(reason), -1):
+                matched[reason] = level
+
+        for level, reason, names, flag_groups, targets, piped, after in compiled["commands"]:
+            for segment in segments:
+                if not _name_matches(names, [segment.name] + segment.prefixes):
+                    continue
+                if piped and not segment.pipeline:
+                    continue
+                if after and not _name_matches(after, segment.pipeline):
+                    continue
+                if flag_groups:
+                    flags = segment.flags()
+                    if not all(_flag_matches(group, flags) for group in flag_groups):
+                        continue
+                if targets and not any(_normalize_path(argument) in targets for argument in segment.positional()):
+                    continue
+                add(level, reason)
+                break
+
+        for level, reason, verbs, copy_verbs, paths in compiled["scopes"]:
+            written = []
+            for segment in segments:
+                if segment.name in verbs:
+                    written.extend(segment.arguments)
+                elif segment.name in copy_verbs:
+                    written.extend(_destination(segment.arguments))
+                if ">" in verbs:
+                    written.extend(segment.targets)
+            if any(_path_matches(_normalize_path(argument), paths) for argument in written if argument):
+                add(level, reason)
+
+    def stream(self) -> StreamScanner:
+        """
+        创建流式扫描器，用于在命令或回复逐段生成时提前发现危险操作，命令规则和受保护路径在每行结束时检查
+
+        Returns:
+            流式扫描器
+        """
+        self.refresh()
+        return StreamScanner(self)
+
+    def check(self, command: str) -> SafetyVerdict:
+        """
+        检查一条命令
+
+        Args:
+            command: 命令文本
+
+        Returns:
+            检查结果，level 为 allow、confirm 或 deny
+        """
+        self.refresh()
+        scanner = StreamScanner(self)
+        scanner.feed(command)
+        return scanner.finish()
+
+
+_screen = None
+_screen_lock = threading.Lock()
+
+
+def get_safety_screen() -> SafetyScreen:
+    """
+    获取全局安全检查器，首次调用时加载规则文件
+
+    Returns:
+        全局安全检查器实例
+    """
+    global _screen
+    if _screen is None:
+        with _screen_lock:
+            if _screen is None:
+                _screen = SafetyScreen()
+    return _screen
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模板引擎 - 把命令模板预编译为字面量/占位符片段，单次拼接渲染并按执行器转义参数
+"""
+
+import re
+import shlex
+import platform
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Union
+
+
+# 占位符形如 {name}，PowerShell 中的 {$_...} 等脚本块不会被识别
+_PLACEHOLDER = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+# PowerShell 把这些弯引号也当作单引号
+_PS_SINGLE_QUOTES = ("'", "‘", "’", "‚", "‛")
+
+# cmd.exe 在双引号内仍会展开的字符，需要移到引号外用 ^ 转义
+_CMD_EXPANSION = re.compile(r"([%!])")
+# 双引号前的反斜杠，按命令行参数的解析规则需要加倍
+_CMD_BACKSLASH_QUOTE = re.compile(r'(\\*)"')
+_CMD_TRAILING_BACKSLASHES = re.compile(r"(\\+)$")
+
+
+def _detect_platform_key() -> str:
+    system = platform.system().lower()
+    if system == "windows":
+        return "windows"
+    elif system == "darwin":
+        return "mac"
+    return "linux"
+
+
+# 平台在进程生命周期内不会变化，只检测一次
+PLATFORM_KEY = _detect_platform_key()
+
+
+def quote_bash(value: str) -> str:
+    """bash/sh 参数转义，整体放入单引号"""
+    return shlex.quote(value)
+
+
+def quote_powershell(value: str) -> str:
+    """PowerShell 参数转义，放入单引号字符串，内部单引号加倍"""
+    for quote in _PS_SINGLE_QUOTES:
+        value = value.replace(quote, quote * 2)
+    return f"'{value}'"
+
+
+def _cmd_quoted(text: str) -> str:
+    # 内部双引号加倍（cmd 的引号状态不变，程序解析为一个字面双引号），引号前的反斜杠加倍
+    text = _CMD_BACKSLASH_QUOTE.sub(lambda m: m.group(1) * 2 + '""', text)
+    return '"' + _CMD_TRAILING_BACKSLASHES.sub(r"\1\1", text) + '"'
+
+
+def quote_cmd(value: str) -> str:
+    """cmd.exe 参数转义，整体放入双引号，内部双引号加倍；% 和 ! 放在引号外用 ^ 转义"""
+    if "\n" in value or "\r" in value:
+        raise ValueError("cmd参数不能包含换行")
+    if not value:
+        return '""'
+    return "".join(f"^{piece}" if piece in ("%", "!") else _cmd_quoted(piece)
+                   for piece in _CMD_EXPANSION.split(value) if piece)
+
+
+def default_executor(platform_key: str = PLATFORM_KEY) -> str:
+    """未指定执行器时使用的平台默认shell，与 Executor 不指定执行器时一致（Windows为cmd，其他为sh）"""
+    return "cmd" if platform_key == "windows" else "sh"
+
+
+QUOTERS: Dict[str, Callable[[str], str]] = {
+    "bash": quote_bash,
+    "sh": quote_bash,
+    "powershell": quote_powershell,
+    "cmd": quote_cmd,
+}
+
+
+def normalize_param_spec(spec: Any) -> Dict[str, Any]:
+    """把 params 中的描述统一为字典，字符串形式视为必填参数的描述"""
+    if isinstance(spec, dict):
+        normalized = dict(spec)
+        normalized.setdefault("description", "")
+        normalized.setdefault("required", "default" not in spec)
+        return normalized
+    return {"description": str(spec), "required": True}
+
+
+class CompiledTemplate:
+    """
+    预编译的命令模板
+
+    模板被切分为片段列表，字面量原样保留，占位符位置记录参数名；
+    渲染时复制片段列表、填入转义后的参数值并做一次 join。
+    """
+
+    __slots__ = ("source", "executor", "params", "_parts", "_slots", "_quote", "_patterns")
+
+    def __init__(self, source: str, executor: Optional[str] = None,
+                 params: Optional[Mapping[str, Any]] = None):
+        """
+        编译模板
+
+        Args:
+            source: 模板命令文本
+            executor: 执行器名称，决定参数转义方式，默认为当前平台的默认shell
+            params: 参数说明，键为参数名；为None时模板中的所有占位符都视为参数
+
+        Raises:
+            ValueError: 参数说明中的正则表达式无效
+        """
+        self.source = source
+        self.executor = executor or default_executor()
+        self._quote = QUOTERS.get(self.executor, quote_bash)
+
+        if params is None:
+            params = {name: "" for name in _PLACEHOLDER.findall(source)}
+        self.params = {name: normalize_param_spec(spec) for name, spec in params.items()}
+
+        parts: List[str] = []
+        slots = []
+        position = 0
+        for match in _PLACEHOLDER.finditer(source):
+            name = match.group(1)
+            if name not in self.params:
+                # 未声明的 {xxx} 按字面量处理
+                continue
+            parts.append(source[position:match.start()])
+            slots.append((len(parts), name, bool(self.params[name].get("raw"))))
+            parts.append("")
+            position = match.end()
+        parts.append(source[position:])
+
+        self._parts = parts
+        self._slots = tuple(slots)
+        self._patterns = {}
+        for name, spec in self.params.items():
+            if spec.get("pattern"):
+                try:
+                    self._patterns[name] = re.compile(spec["pattern"])
+                except re.error as e:
+                    raise ValueError(f"参数 {name} 的正则表达式无效: {e}")
+
+    @property
+    def slot_names(self) -> List[str]:
+        """模板中实际出现的参数名（按出现顺序，可能重复）"""
+        return [name for _, name, _ in self._slots]
+
+    def validate(self, values: Mapping[str, Any]) -> Dict[str, str]:
+        """
+        按参数说明校验并补全参数
+
+        Args:
+            values: 参数值
+
+        Returns:
+            补全默认值并转为字符串后的参数
+
+        Raises:
+            ValueError: 缺少必填参数、存在未声明的参数或参数不符合格式
+        """
+        unknown = [name for name in values if name not in self.params]
+        if unknown:
+            raise ValueError(f"未知的模板参数: {', '.join(unknown)}")
+
+        resolved = {}
+        missing = []
+        for name, spec in self.params.items():
+            if name in values and values[name] is not None:
+                value = str(values[name])
+            elif "default" in spec:
+                value = str(spec["default"])
+            elif spec["required"]:
+                missing.append(name)
+                continue
+            else:
+                value = ""
+
+            pattern = self._patterns.get(name)
+            if pattern is not None and not pattern.fullmatch(value):
+                raise ValueError(f"参数 {name} 的值不符合格式要求: {value}")
+            resolved[name] = value
+
+        if missing:
+            raise ValueError(f"缺少模板参数: {', '.join(missing)}")
+        return resolved
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        """
+        校验参数并渲染命令
+
+        Args:
+            values: 参数值
+
+        Returns:
+            渲染后的命令
+        """
+        resolved = self.validate(values)
+        out = self._parts[:]
+        quote = self._quote
+        for index, name, raw in self._slots:
+            out[index] = resolved[name] if raw else quote(resolved[name])
+        return "".join(out)
+
+    def render_many(self, rows: Union[Mapping[str, Sequence[Any]], Iterable[Mapping[str, Any]]]) -> Iterator[str]:
+        """
+        批量渲染命令
+
+        Args:
+            rows: 列式参数（参数名 -> 等长的值序列），或逐行的参数字典迭代器
+
+        Returns:
+            按行顺序逐个产生渲染后命令的迭代器
+
+        Raises:
+            ValueError: 参数无效，列式参数在开始渲染前校验列名和列长度
+        """
+        if isinstance(rows, Mapping):
+            return self._render_columns(rows)
+        return map(self.render, rows)
+
+    def _render_columns(self, columns: Mapping[str, Sequence[Any]]) -> Iterator[str]:
+        unknown = [name for name in columns if name not in self.params]
+        if unknown:
+            raise ValueError(f"未知的模板参数: {', '.join(unknown)}")
+        lengths = {len(column) for column in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("参数列的长度不一致")
+
+        # 不在列中的参数取默认值，在开始渲染前一次性校验
+        constant = {}
+        missing = []
+        for name, spec in self.params.items():
+            if name in columns:
+                continue
+            if "default" in spec:
+                constant[name] = str(spec["default"])
+            elif spec["required"]:
+                missing.append(name)
+            else:
+                constant[name] = ""
+        if missing:
+            raise ValueError(f"缺少模板参数: {', '.join(missing)}")
+        for name, value in constant.items():
+            pattern = self._patterns.get(name)
+            if pattern is not None and not pattern.fullmatch(value):
+                raise ValueError(f"参数 {name} 的值不符合格式要求: {value}")
+
+        return self._iter_columns(columns, constant, lengths.pop() if lengths else 1)
+
+    def _iter_columns(self, columns, constant, count) -> Iterator[str]:
+        # 不随行变化的参数只转义一次，写入基础片段
+        quote = self._quote
+        base = self._parts[:]
+        varying = []
+        for index, name, raw in self._slots:
+            if name in columns:
+                varying.append((index, name, columns[name], raw, self._patterns.get(name)))
+            else:
+                base[index] = constant[name] if raw else quote(constant[name])
+
+        for row in range(count):
+            out = base[:]
+            for index, name, column, raw, pattern in varying:
+                value = column[row]
+                if value is None:
+                    spec = self.params[name]
+                    if "default" not in spec:
+                        raise ValueError(f"第 {row} 行缺少模板参数: {name}")
+                    value = spec["default"]
+                value = str(value)
+                if pattern is not None and not pattern.fullmatch(value):
+                    raise ValueError(f"第 {row} 行参数 {name} 的值不符合格式要求: {value}")
+                out[index] = value if raw else quote(value)
+            yield "".join(out)
+
+
+def compile_template(data: Mapping[str, Any], platform_key: str = PLATFORM_KEY) -> CompiledTemplate:
+    """
+    编译模板数据中指定平台的命令
+
+    Args:
+        data: 模板JSON数据
+        platform_key: 平台名称
+
+    Returns:
+        编译后的模板
+
+    Raises:
+        KeyError: 模板不支持该平台
+    """
+    platforms = data.get("platforms", {})
+    if platform_key not in platforms:
+        raise KeyError(f"不支持的平台: {platform_key}")
+    entry = platforms[platform_key]
+    return CompiledTemplate(entry["command"], entry.get("executor") or default_executor(platform_key),
+                            data.get("params"))
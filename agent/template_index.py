@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模板检索索引 - 在模板名称、描述和参数上建立BM25倒排索引，为每次请求挑选最相关的模板
+"""
+
+import re
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from agent.module_loader import ModuleLoader
+from agent.template_engine import normalize_param_spec
+
+
+# 英文单词和数字按字母数字串切分（下划线、连字符视为分隔符）
+_WORD = re.compile(r"[a-z0-9]+")
+# 连续的中日韩字符
+_CJK = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+# 名称字段的词频权重，名称命中比描述命中更可信
+_NAME_WEIGHT = 2
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    切分检索词
+
+    英文按单词切分并转为小写；中文不依赖分词词典，
+    每段连续汉字同时产生单字和相邻二字组，兼顾召回和精度。
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        词列表（可能重复）
+    """
+    text = text.lower()
+    tokens = _WORD.findall(text)
+    for run in _CJK.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _template_terms(loader: ModuleLoader) -> Dict[str, int]:
+    """统计模板各字段的词频"""
+    counts: Dict[str, int] = {}
+
+    def add(text, weight=1):
+        for token in tokenize(str(text)):
+            counts[token] = counts.get(token, 0) + weight
+
+    add(loader.name, _NAME_WEIGHT)
+    add(loader.data.get("description", ""))
+    for name, spec in (loader.data.get("params") or {}).items():
+        spec = normalize_param_spec(spec)
+        add(name)
+        add(spec["description"])
+        for value in spec.get("enum") or ():
+            add(value)
+    return counts
+
+
+class TemplateIndex:
+    """
+    模板BM25倒排索引
+
+    每个模板只在新增或修改时分词一次，删除时从倒排表中摘除；
+    查询只遍历查询词的倒排表，文档长度归一化因子在索引变化后惰性重算。
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        初始化索引
+
+        Args:
+            k1: BM25词频饱和参数
+            b: BM25文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        # 词 -> {模板名称: 词频}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        # 模板名称 -> (加载器, 词频表, 文档长度)
+        self._docs: Dict[str, Tuple[ModuleLoader, Dict[str, int], int]] = {}
+        self._total_length = 0
+        self._norms: Optional[Dict[str, float]] = None
+        self._registry = None
+
+    def add(self, loader: ModuleLoader):
+        """
+        新增或替换一个模板
+
+        Args:
+            loader: 模板加载器
+        """
+        terms = _template_terms(loader)
+        length = sum(terms.values())
+        with self._lock:
+            self.remove(loader.name)
+            self._docs[loader.name] = (loader, terms, length)
+            self._total_length += length
+            for term, freq in terms.items():
+                self._postings.setdefault(term, {})[loader.name] = freq
+            self._norms = None
+
+    def remove(self, name: str):
+        """
+        删除一个模板，模板不存在时忽略
+
+        Args:
+            name: 模板名称
+        """
+        with self._lock:
+            doc = self._docs.pop(name, None)
+            if doc is None:
+                return
+            _, terms, length = doc
+            self._total_length -= length
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is not None:
+                    posting.pop(name, None)
+                    if not posting:
+                        del self._postings[term]
+            self._norms = None
+
+    def attach(self, registry):
+        """
+        从模板注册表建立索引，并订阅其变化做增量更新
+
+        Args:
+            registry: TemplateRegistry实例
+        """
+        def on_change(changed, removed):
+            for name in removed:
+                self.remove(name)
+            for name in changed:
+                loader = registry.get(name, refresh=False)
+                if loader is not None:
+                    self.add(loader)
+
+        self._registry = registry
+        registry.add_listener(on_change)
+        for loader in registry.all():
+            self.add(loader)
+
+    def terms(self, name: str) -> set:
+        """
+        获取模板的检索词集合
+
+        Args:
+            name: 模板名称
+
+        Returns:
+            检索词集合，模板不存在时为空集合
+        """
+        with self._lock:
+            doc = self._docs.get(name)
+            return set(doc[1]) if doc is not None else set()
+
+    def _doc_norms(self) -> Dict[str, float]:
+        if self._norms is None:
+            average = self._total_length / len(self._docs) if self._docs else 1.0
+            k1, b = self.k1, self.b
+            self._norms = {
+                name: k1 * (1 - b + b * length / average)
+                for name, (_, _, length) in self._docs.items()
+            }
+        return self._norms
+
+    def search(self, query: str, limit: int = 8,
+               platform_key: Optional[str] = None) -> List[Tuple[ModuleLoader, float]]:
+        """
+        检索与查询最相关的模板
+
+        Args:
+            query: 查询文本，通常是用户消息
+            limit: 最多返回的模板数
+            platform_key: 只返回支持该平台的模板，为None时不过滤
+
+        Returns:
+            按相关度降序排列的 (加载器, 得分) 列表，不含得分为0的模板
+        """
+        if self._registry is not None:
+            # 检查模板文件变化，变化经监听回调增量写入索引
+            self._registry.refresh_if_due()
+        terms = set(tokenize(query))
+        with self._lock:
+            norms = self._doc_norms()
+            total = len(self._docs)
+            scores: Dict[str, float] = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+                for name, freq in posting.items():
+                    scores[name] = scores.get(name, 0.0) + idf * freq * (self.k1 + 1) / (freq + norms[name])
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            results = []
+            for name, score in ranked:
+                loader = self._docs[name][0]
+                if platform_key is not None and platform_key not in loader.platforms:
+                    continue
+                results.append((loader, score))
+                if len(results) >= limit:
+                    break
+            return results
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_template_index() -> TemplateIndex:
+    """
+    获取全局模板索引，首次调用时基于全局模板注册表建立
+
+    Returns:
+        全局模板索引实例
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from agent.template_registry import get_template_registry
+                index = TemplateIndex()
+                index.attach(get_template_registry())
+                _index = index
+    return _index
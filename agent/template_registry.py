@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模板注册表 - 扫描 templates/ 目录，按名称和平台索引模板并支持热加载
+"""
+
+import os
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+
+from agent.module_loader import ModuleLoader
+
+
+class TemplateRegistry:
+    """
+    模板注册表类
+
+    启动时扫描一次模板目录，之后按文件的修改时间和大小增量重新加载有变化的文件，
+    按名称和平台的查找都是字典查找。
+    """
+
+    def __init__(self, templates_dir: str = "templates", refresh_interval: float = 2.0):
+        """
+        初始化模板注册表
+
+        Args:
+            templates_dir: 模板文件夹名称或绝对路径
+            refresh_interval: 两次自动检查文件变化的最小间隔（秒），0表示每次查找都检查，负数关闭自动检查
+        """
+        # 获取项目根目录
+        self.project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.templates_dir = os.path.join(self.project_root, templates_dir)
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.RLock()
+        self._by_name: Dict[str, ModuleLoader] = {}
+        self._by_platform: Dict[str, Dict[str, ModuleLoader]] = {}
+        # 文件路径 -> (修改时间, 文件大小, 模板名称)
+        self._files: Dict[str, tuple] = {}
+        self._last_refresh = 0.0
+        self._listeners: List[Callable[[List[str], List[str]], None]] = []
+
+        self.refresh(force=True)
+
+    def add_listener(self, callback: Callable[[List[str], List[str]], None]):
+        """
+        注册模板变化回调
+
+        Args:
+            callback: 回调函数，签名为 callback(changed_names, removed_names)
+        """
+        self._listeners.append(callback)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        检查模板目录并重新加载有变化的文件
+
+        Args:
+            force: 忽略检查间隔，立即检查
+
+        Returns:
+            是否有模板被新增、修改或删除
+        """
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return False
+
+        with self._lock:
+            self._last_refresh = now
+            seen = set()
+            changed = []
+            removed = []
+
+            try:
+                entries = list(os.scandir(self.templates_dir))
+            except FileNotFoundError:
+                entries = []
+
+            for entry in entries:
+                if not entry.name.endswith(".json") or not entry.is_file():
+                    continue
+                seen.add(entry.path)
+                stat = entry.stat()
+                known = self._files.get(entry.path)
+                if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+                    continue
+
+                loader = self._load(entry.path)
+                if known is not None:
+                    removed.append(self._unindex(known[2]))
+                if loader is None:
+                    self._files.pop(entry.path, None)
+                    continue
+                self._index(loader)
+                self._files[entry.path] = (stat.st_mtime_ns, stat.st_size, loader.name)
+                changed.append(loader.name)
+
+            for path in list(self._files):
+                if path not in seen:
+                    removed.append(self._unindex(self._files.pop(path)[2]))
+
+            # 被修改的模板只算作变更，不算删除
+            removed = [name for name in removed if name is not None and name not in changed]
+
+        if changed or removed:
+            for callback in self._listeners:
+                callback(changed, removed)
+        return bool(changed or removed)
+
+    def _load(self, path: str) -> Optional[ModuleLoader]:
+        try:
+            return ModuleLoader(path)
+        except (OSError, ValueError) as e:
+            # ValueError 包括 JSON 格式错误和文件不是 UTF-8 编码，只跳过这一个文件
+            print(f"加载模板失败 {path}: {e}")
+            return None
+
+    def _index(self, loader: ModuleLoader):
+        self._by_name[loader.name] = loader
+        for platform_key in loader.platforms:
+            self._by_platform.setdefault(platform_key, {})[loader.name] = loader
+
+    def _unindex(self, name: str) -> Optional[str]:
+        loader = self._by_name.pop(name, None)
+        if loader is None:
+            return None
+        for platform_key in loader.platforms:
+            self._by_platform.get(platform_key, {}).pop(name, None)
+        return name
+
+    def refresh_if_due(self):
+        """按自动检查间隔检查模板变化，自动检查关闭时不做任何事"""
+        if self.refresh_interval >= 0:
+            self.refresh()
+
+    def get(self, name: str, refresh: bool = True) -> Optional[ModuleLoader]:
+        """
+        按名称获取模板
+
+        Args:
+            name: 模板名称
+            refresh: 查找前是否按间隔检查模板变化，在变化回调中应传False
+
+        Returns:
+            模板加载器，不存在时返回None
+        """
+        if refresh:
+            self.refresh_if_due()
+        return self._by_name.get(name)
+
+    def names(self) -> List[str]:
+        """获取全部模板名称"""
+        self.refresh_if_due()
+        return sorted(self._by_name)
+
+    def all(self) -> List[ModuleLoader]:
+        """获取全部模板"""
+        self.refresh_if_due()
+        return list(self._by_name.values())
+
+    def for_platform(self, platform_key: str) -> Dict[str, ModuleLoader]:
+        """
+        获取支持指定平台的模板
+
+        Args:
+            platform_key: 平台名称，如 windows、linux、mac
+
+        Returns:
+            模板名称到加载器的字典
+        """
+        self.refresh_if_due()
+        return dict(self._by_platform.get(platform_key, {}))
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_template_registry() -> TemplateRegistry:
+    """
+    获取全局模板注册表，首次调用时扫描模板目录
+
+    Returns:
+        全局模板注册表实例
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = TemplateRegistry()
+    return _registry
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+工具定义模块 - 把命令模板转换为OpenAI风格的function calling工具
+"""
+
+import re
+import json
+from typing import Any, Dict, Iterable, List, Mapping
+
+from agent.module_loader import ModuleLoader
+from agent.template_engine import PLATFORM_KEY, normalize_param_spec
+
+
+# OpenAI 要求工具名只包含字母、数字、下划线和连字符，最长64个字符
+_INVALID_NAME_CHARS = re.compile(r"[^A-Za-z0-9_-]")
+
+
+def tool_name(template_name: str) -> str:
+    """
+    把模板名称转换为合法的工具名
+
+    Args:
+        template_name: 模板名称
+
+    Returns:
+        工具名
+    """
+    return _INVALID_NAME_CHARS.sub("_", template_name)[:64]
+
+
+def template_to_tool(loader: ModuleLoader) -> Dict[str, Any]:
+    """
+    把模板转换为工具定义
+
+    Args:
+        loader: 模板加载器
+
+    Returns:
+        {"type": "function", "function": {...}} 形式的工具定义
+    """
+    properties = {}
+    required = []
+    for name, spec in (loader.data.get("params") or {}).items():
+        spec = normalize_param_spec(spec)
+        prop = {"type": "string", "description": spec["description"]}
+        if "default" in spec:
+            prop["default"] = str(spec["default"])
+        if spec.get("enum"):
+            prop["enum"] = [str(value) for value in spec["enum"]]
+        properties[name] = prop
+        if spec["required"]:
+            required.append(name)
+
+    return {
+        "type": "function",
+        "function": {
+            "name": tool_name(loader.name),
+            "description": loader.data.get("description", loader.name),
+            "parameters": {
+                "type": "object",
+                "properties": properties,
+                "required": required,
+            },
+        },
+    }
+
+
+def build_tools(loaders: Iterable[ModuleLoader], platform_key: str = PLATFORM_KEY) -> List[Dict[str, Any]]:
+    """
+    把一组模板转换为工具列表，跳过不支持当前平台的模板
+
+    Args:
+        loaders: 模板加载器
+        platform_key: 平台名称
+
+    Returns:
+        工具定义列表
+    """
+    return [template_to_tool(loader) for loader in loaders if platform_key in loader.platforms]
+
+
+def parse_tool_arguments(arguments: str) -> Dict[str, Any]:
+    """
+    解析模型返回的工具参数JSON
+
+    Args:
+        arguments: 参数JSON字符串
+
+    Returns:
+        参数字典
+
+    Raises:
+        ValueError: 参数不是合法的JSON对象
+    """
+    if not arguments or not arguments.strip():
+        return {}
+    try:
+        parsed = json.loads(arguments)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"工具参数不是合法的JSON: {e}")
+    if not isinstance(parsed, dict):
+        raise ValueError("工具参数必须是JSON对象")
+    return parsed
+
+
+def resolve_tool_call(loaders: Mapping[str, ModuleLoader], name: str, arguments: str,
+                      platform_key: str = PLATFORM_KEY):
+    """
+    把一次工具调用渲染为可执行的命令
+
+    Args:
+        loaders: 工具名到模板加载器的映射
+        name: 工具名
+        arguments: 参数JSON字符串
+        platform_key: 平台名称
+
+    Returns:
+        (command, executor) 元组
+
+    Raises:
+        KeyError: 工具不存在或不支持当前平台
+        ValueError: 参数无效
+    """
+    loader = loaders.get(name)
+    if loader is None:
+        raise KeyError(f"未知的工具: {name}")
+    template = loader.compiled(platform_key)
+    return template.render(parse_tool_arguments(arguments)), template.executor
+
+
+
+def format_tool_result(result: Mapping[str, Any], digest: str) -> str:
+    """
+    把命令执行结果整理为回传给模型的工具消息内容
+
+    Args:
+        result: 命令执行的最终事件（result 或 error）
+        digest: 输出摘要，见 OutputSummarizer.digest
+
+    Returns:
+        工具消息文本
+    """
+    if result.get("is_timeout"):
+        status = "执行超时"
+    elif result.get("is_cancelled"):
+        status = "执行已取消"
+    elif result.get("success"):
+        status = "执行成功"
+    elif result.get("type") == "error":
+        status = f"执行出错: {result.get('error')}"
+    else:
+        status = f"执行失败，退出码 {result.get('returncode')}"
+    return f"{status}\n{digest}"
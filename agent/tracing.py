@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+链路追踪模块 - 设置环境变量 SAVVY_TRACE 后记录一次对话各阶段的耗时区间，导出为Chrome/Perfetto可读的trace JSON
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+# 开启追踪的环境变量：值为 1/true 时写入 logs/trace_<时间>.json，以 .json 结尾时写入该路径
+TRACE_ENV = "SAVVY_TRACE"
+# 最多保留的事件数，超出后丢弃新事件并计数
+_MAX_EVENTS = 500000
+
+
+class _NullSpan:
+    """追踪关闭时使用的空区间，所有操作都不做任何事"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+    def end(self):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """
+    一个耗时区间，结束时作为完整事件（ph=X）记录
+
+    既可以用 with 包围一段代码，也可以手动调用 end()，用于跨越生成器 yield 的区间。
+    """
+
+    __slots__ = ("tracer", "name", "category", "args", "start", "tid", "ended")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.tid = threading.get_native_id()
+        self.ended = False
+        self.start = time.perf_counter_ns()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.end()
+        return False
+
+    def set(self, **args):
+        """补充区间的参数，显示在trace查看器的详情中"""
+        self.args.update(args)
+
+    def end(self):
+        """结束区间，重复调用只记录一次"""
+        if self.ended:
+            return
+        self.ended = True
+        end = time.perf_counter_ns()
+        event = {
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": self.tracer._micros(self.start),
+            "dur": (end - self.start) / 1000,
+            "pid": self.tracer.pid,
+            "tid": self.tid,
+        }
+        if self.args:
+            event["args"] = self.args
+        self.tracer._append(event)
+
+
+class Tracer:
+    """
+    追踪记录器
+
+    关闭时 span() 返回共享的空区间，开销只有一次属性判断；开启时事件追加到内存列表，
+    导出时附上线程名称元数据，可直接在 chrome://tracing 或 ui.perfetto.dev 中打开。
+    """
+
+    def __init__(self, enabled: bool = False, output: Optional[str] = None,
+                 max_events: int = _MAX_EVENTS):
+        """
+        初始化追踪记录器
+
+        Args:
+            enabled: 是否记录事件
+            output: 导出文件路径，为None时导出到 logs/trace_<时间>.json
+            max_events: 最多保留的事件数
+        """
+        self.enabled = enabled
+        self.output = output
+        self.max_events = max_events
+        self.pid = os.getpid()
+        self.dropped = 0
+        self._origin = time.perf_counter_ns()
+        self._events: List[Dict[str, Any]] = []
+        self._thread_names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def _micros(self, counter_ns: int) -> float:
+        return (counter_ns - self._origin) / 1000
+
+    def _append(self, event: Dict[str, Any]):
+        tid = event["tid"]
+        with self._lock:
+            if tid not in self._thread_names:
+                self._thread_names[tid] = threading.current_thread().name
+            if len(self._events) >= self.max_events:
+                self.dropped += 1
+                return
+            self._events.append(event)
+
+    def span(self, name: str, category: str = "app", **args):
+        """
+        开始一个耗时区间
+
+        Args:
+            name: 区间名称
+            category: 分类，用于在查看器中筛选
+            **args: 附加参数
+
+        Returns:
+            区间对象，追踪关闭时为空区间
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, category, args)
+
+    def instant(self, name: str, category: str = "app", **args):
+        """
+        记录一个时间点事件，如收到第一个token
+
+        Args:
+            name: 事件名称
+            category: 分类
+            **args: 附加参数
+        """
+        if not self.enabled:
+            return
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "i",
+            "s": "t",
+            "ts": self._micros(time.perf_counter_ns()),
+            "pid": self.pid,
+            "tid": threading.get_native_id(),
+        }
+        if args:
+            event["args"] = args
+        self._append(event)
+
+    def events(self) -> List[Dict[str, Any]]:
+        """已记录事件的副本"""
+        with self._lock:
+            return list(self._events)
+
+    def export(self, path: Optional[str] = None) -> Optional[str]:
+        """
+        导出为Chrome trace JSON
+
+        Args:
+            path: 导出文件路径，默认使用初始化时的设置
+
+        Returns:
+            导出的文件路径，没有事件或写入失败时返回None
+        """
+        with self._lock:
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+            dropped = self.dropped
+        if not events:
+            return None
+
+        path = path or self.output
+        if not path:
+            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            path = os.path.join(project_root, "logs", f"trace_{datetime.now():%Y%m%d_%H%M%S}.json")
+        metadata = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": "Savvy"}}]
+        metadata.extend({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                        for tid, name in thread_names.items())
+        trace = {
+            "traceEvents": metadata + events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": dropped},
+        }
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(trace, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"导出追踪数据失败: {e}")
+            return None
+        return path
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def _export_at_exit():
+    path = _tracer.export()
+    if path:
+        print(f"追踪数据已导出: {path}")
+
+
+def get_tracer() -> Tracer:
+    """
+    获取全局追踪记录器，首次调用时根据环境变量 SAVVY_TRACE 决定是否开启，开启时在退出时自动导出
+
+    Returns:
+        全局追踪记录器实例
+    """
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                value = os.environ.get(TRACE_ENV, "").strip()
+                enabled = value.lower() not in ("", "0", "false", "no", "off")
+                output = value if value.lower().endswith(".json") else None
+                _tracer = Tracer(enabled, output)
+                if enabled:
+                    atexit.register(_export_at_exit)
+    return _tracer
+
+
+def span(name: str, category: str = "app", **args):
+    """在全局追踪记录器上开始一个耗时区间，参数同 Tracer.span"""
+    return get_tracer().span(name, category, **args)
+
+
+def instant(name: str, category: str = "app", **args):
+    """在全局追踪记录器上记录一个时间点事件，参数同 Tracer.instant"""
+    get_tracer().instant(name, category, **args)
@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+对话工作进程模块 - 在多个工作进程中运行对话的模型调用部分（流式API和响应解析、代理循环、工具命令的执行和输出摘要、命令提取），事件经管道送回，繁重的对话不再占用界面和其他对话所在进程的CPU
+"""
+
+import os
+import queue
+import itertools
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config import app_config
+from agent.chat_session import ChatSession, SYSTEM_PROMPT
+
+
+# 等待工作进程的事件时的轮询间隔（秒），期间产生 tool_wait 事件供前端处理界面事件
+_POLL_INTERVAL = 0.05
+# 工作进程退出时等待的时间（秒）
+_STOP_TIMEOUT = 2.0
+# 发给工作进程的聊天记录只需要用户消息和AI回复
+_HISTORY_SENDERS = ("user", "ai")
+
+
+class _WorkerTurn(ChatSession):
+    """工作进程中的一轮对话，事件和确认请求经管道发给前端进程"""
+
+    def __init__(self, worker: "_WorkerProcess", turn_id: int, system_prompt: str):
+        super().__init__(worker.api_manager, approve=self._approve, system_prompt=system_prompt)
+        self.worker = worker
+        self.turn_id = turn_id
+        self.replies = queue.Queue()
+        self.cancelled = threading.Event()
+
+    def record_result(self, request, command, executor, result):
+        # 命令缓存由前端进程写入，各进程的缓存保持一致
+        pass
+
+    def _approve(self, command: str, executor: str) -> Optional[str]:
+        self.worker.send(("approve", self.turn_id, command, executor))
+        while not self.cancelled.is_set():
+            try:
+                return self.replies.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return "已取消"
+
+    def run(self, user_message: str, messages: List[Dict[str, Any]]):
+        """生成回复，每个事件连同此前新追加到聊天中的消息一起发出"""
+        sent = len(messages)
+        # 前端取消或放弃这一轮时结束代理循环中正在执行的命令
+        events = self.generate_reply(user_message, messages, self.cancelled)
+        try:
+            for event in events:
+                if self.cancelled.is_set():
+                    break
+                # 前端等待时自己产生 tool_wait
+                if event["type"] == "tool_wait":
+                    continue
+                # 事件和新消息一起序列化，tool_result 中的 message 在前端仍是聊天中的同一个对象
+                self.worker.send(("event", self.turn_id, event, messages[sent:]))
+                sent = len(messages)
+        except Exception as e:
+            self.worker.send(("event", self.turn_id, {"type": "error", "error": str(e)}, []))
+        finally:
+            events.close()
+            self.worker.send(("end", self.turn_id))
+            self.worker.finish(self.turn_id)
+
+
+class _WorkerProcess:
+    """工作进程一侧：主线程读取管道上的请求，每轮对话在独立线程中运行"""
+
+    def __init__(self, connection, api_key: Optional[str], base_url: Optional[str]):
+        self.connection = connection
+        self.api_manager = None
+        self.turns: Dict[int, _WorkerTurn] = {}
+        self._send_lock = threading.Lock()
+        try:
+            from api_manager import DeepSeekAPIManager
+            self.api_manager = (DeepSeekAPIManager(api_key=api_key, base_url=base_url) if base_url
+                                else DeepSeekAPIManager(api_key=api_key))
+        except Exception as e:
+            print(f"工作进程初始化API管理器失败: {e}")
+
+    def send(self, message):
+        """向前端进程发送一条消息"""
+        with self._send_lock:
+            try:
+                self.connection.send(message)
+            except (OSError, EOFError):
+                pass
+
+    def finish(self, turn_id: int):
+        """一轮对话结束"""
+        self.turns.pop(turn_id, None)
+
+    def serve(self):
+        """处理前端进程的请求，直到收到 stop 或管道关闭"""
+        self.send(("ready", os.getpid()))
+        while True:
+            try:
+                request = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            kind = request[0]
+            if kind == "stop":
+                break
+            if kind == "respond":
+                _, turn_id, user_message, history, system_prompt = request
+                turn = self.turns[turn_id] = _WorkerTurn(self, turn_id, system_prompt)
+                threading.Thread(target=turn.run, args=(user_message, history),
+                                 name=f"turn-{turn_id}", daemon=True).start()
+                continue
+            turn = self.turns.get(request[1])
+            if turn is None:
+                continue
+            if kind == "approved":
+                turn.replies.put(request[2])
+            elif kind == "cancel":
+                turn.cancelled.set()
+        for turn in list(self.turns.values()):
+            turn.cancelled.set()
+
+
+def _worker_main(connection, api_key, base_url):
+    # 工作进程入口，以spawn方式启动，导入路径由multiprocessing从父进程复制
+    _WorkerProcess(connection, api_key, base_url).serve()
+
+
+class _WorkerHandle:
+    """前端进程一侧的工作进程：读取线程按对话编号把消息分发到各轮对话的队列"""
+
+    def __init__(self, pool: "ChatWorkerPool"):
+        parent_end, child_end = pool.context.Pipe()
+        self.pool = pool
+        self.connection = parent_end
+        self.process = pool.context.Process(
+            target=_worker_main, name="chat-worker", daemon=True,
+            args=(child_end, pool.api_key, pool.base_url))
+        self.process.start()
+        child_end.close()
+        self.ready = False
+        self.alive = True
+        # 对话编号 -> 事件队列；已放弃的对话的确认请求直接拒绝，事件丢弃
+        self.turns: Dict[int, queue.Queue] = {}
+        self.abandoned = set()
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, name="chat-worker-reader", daemon=True)
+        self._reader.start()
+
+    @property
+    def load(self) -> int:
+        """正在处理的对话数"""
+        return len(self.turns)
+
+    def send(self, message) -> bool:
+        """向工作进程发送一条消息，进程已退出时返回False"""
+        with self._send_lock:
+            try:
+                self.connection.send(message)
+                return True
+            except (OSError, EOFError, ValueError):
+                return False
+
+    def _read(self):
+        while True:
+            try:
+                message = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            kind = message[0]
+            if kind == "ready":
+                self.ready = True
+                self.pool._worker_ready()
+                continue
+            turn_id = message[1]
+            if turn_id in self.abandoned:
+                if kind == "approve":
+                    self.send(("approved", turn_id, "已取消"))
+                elif kind == "end":
+                    self.abandoned.discard(turn_id)
+                    self.turns.pop(turn_id, None)
+                continue
+            events = self.turns.get(turn_id)
+            if events is not None:
+                events.put(message)
+                if kind == "end":
+                    self.turns.pop(turn_id, None)
+
+        # 工作进程退出，通知还在等待的对话
+        self.alive = False
+        self.process.join(_STOP_TIMEOUT)
+        for events in list(self.turns.values()):
+            events.put(("lost",))
+        self.turns.clear()
+        self.pool._worker_lost(self)
+
+    def abandon(self, turn_id: int):
+        """放弃一轮还没结束的对话，通知工作进程取消"""
+        if turn_id in self.turns:
+            self.abandoned.add(turn_id)
+            self.send(("cancel", turn_id))
+
+    def stop(self):
+        """通知工作进程退出，超时后强制结束"""
+        self.alive = False
+        self.send(("stop",))
+        self.process.join(_STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+
+
+class ChatWorkerPool:
+    """
+    对话工作进程池
+
+    每个工作进程可以同时运行多轮对话（各自在线程中，等待网络时不占CPU），
+    新的一轮分配给正在处理的对话最少的进程；进程意外退出时自动补充。
+    """
+
+    def __init__(self, processes: int = 0, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        """
+        初始化进程池
+
+        Args:
+            processes: 工作进程数，0表示CPU核数
+            api_key: API密钥，为None时工作进程从环境变量读取
+            base_url: API地址，为None时使用默认地址
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.api_key = api_key
+        self.base_url = base_url
+        # spawn在各平台上行为一致，也不会复制父进程中的线程和Qt状态；multiprocessing在用到时才导入
+        import multiprocessing
+        self.context = multiprocessing.get_context("spawn")
+        self.workers: List[_WorkerHandle] = []
+        self._ready = threading.Condition()
+        self._turn_ids = itertools.count(1)
+        self._closed = False
+        # 工作进程在初始化完成前退出时记录原因，不再重新启动
+        self.error: Optional[str] = None
+
+    def start(self):
+        """启动工作进程，进程在后台完成初始化"""
+        with self._ready:
+            while len(self.workers) < self.processes:
+                self.workers.append(_WorkerHandle(self))
+
+    def _worker_ready(self):
+        with self._ready:
+            self._ready.notify_all()
+
+    def _worker_lost(self, worker: _WorkerHandle):
+        with self._ready:
+            if worker in self.workers:
+                self.workers.remove(worker)
+            if self._closed:
+                return
+            if worker.ready:
+                print(f"对话工作进程 {worker.process.pid} 已退出，重新启动")
+                self.workers.append(_WorkerHandle(self))
+            else:
+                self.error = f"对话工作进程启动失败（退出码 {worker.process.exitcode}）"
+                print(self.error)
+            self._ready.notify_all()
+
+    def open_turn(self, timeout: float) -> Optional[tuple]:
+        """
+        在负载最低的工作进程上开始一轮对话
+
+        Args:
+            timeout: 没有就绪的工作进程时最多等待的时间（秒）
+
+        Returns:
+            (工作进程, 对话编号, 事件队列)，超时时返回None
+
+        Raises:
+            RuntimeError: 工作进程无法启动
+        """
+        with self._ready:
+            if not self.workers and self.error is None:
+                self.start()
+            ready = [worker for worker in self.workers if worker.ready and worker.alive]
+            if not ready:
+                self._ready.wait(timeout)
+                ready = [worker for worker in self.workers if worker.ready and worker.alive]
+                if not ready:
+                    if self.error is not None and not self.workers:
+                        raise RuntimeError(self.error)
+                    return None
+            worker = min(ready, key=lambda candidate: candidate.load)
+            turn_id = next(self._turn_ids)
+            events = worker.turns[turn_id] = queue.Queue()
+        return worker, turn_id, events
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """各工作进程的状态"""
+        return [{"pid": worker.process.pid, "ready": worker.ready, "turns": worker.load}
+                for worker in list(self.workers)]
+
+    def shutdown(self):
+        """停止所有工作进程"""
+        with self._ready:
+            self._closed = True
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.stop()
+
+
+class RemoteChatSession(ChatSession):
+    """
+    在工作进程中生成回复的对话流程
+
+    本地意图匹配、命令缓存、安全检查回调和命令缓存的写入仍在当前进程中完成，
+    只有 generate_reply 交给工作进程；等待事件时产生 tool_wait，前端借此处理界面事件。
+    """
+
+    def __init__(self, pool: ChatWorkerPool, api_manager=None,
+                 approve: Optional[Callable[[str, str], Optional[str]]] = None,
+                 system_prompt: str = SYSTEM_PROMPT):
+        """
+        初始化对话流程
+
+        Args:
+            pool: 对话工作进程池
+            api_manager: 当前进程中的 DeepSeekAPIManager 实例，供前端执行命令使用
+            approve: 代理循环执行命令前的检查回调，在当前进程中调用
+            system_prompt: 系统提示
+        """
+        super().__init__(api_manager, approve, system_prompt)
+        self.pool = pool
+
+    def generate_reply(self, user_message: str, messages: List[Dict[str, Any]],
+                       cancel_event: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+        opened = None
+        while opened is None:
+            try:
+                opened = self.pool.open_turn(_POLL_INTERVAL)
+            except RuntimeError as e:
+                yield {"type": "error", "error": str(e)}
+                return
+            if opened is None:
+                yield {"type": "tool_wait"}
+        worker, turn_id, events = opened
+        finished = False
+        request = self.cache_request(user_message, messages)
+        tool_results = []
+        try:
+            history = [message for message in messages if message.get("sender") in _HISTORY_SENDERS]
+            if not worker.send(("respond", turn_id, user_message, history, self.system_prompt)):
+                finished = True
+                yield {"type": "error", "error": "对话工作进程已退出"}
+                return
+            while True:
+                try:
+                    message = events.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    if cancel_event is not None and cancel_event.is_set():
+                        # 放弃这一轮，工作进程随即结束其中的命令
+                        yield {"type": "error", "error": "回复已取消"}
+                        return
+                    yield {"type": "tool_wait"}
+                    continue
+                kind = message[0]
+                if kind == "end":
+                    finished = True
+                    self.record_turn(request, tool_results)
+                    return
+                if kind == "lost":
+                    finished = True
+                    yield {"type": "error", "error": "对话工作进程意外退出"}
+                    return
+                if kind == "approve":
+                    rejection = self.approve(message[2], message[3]) if self.approve else None
+                    worker.send(("approved", turn_id, rejection))
+                    continue
+                _, _, event, new_messages = message
+                messages.extend(new_messages)
+                if event["type"] == "tool_result":
+                    tool_results.append(event)
+                yield event
+        finally:
+            if not finished:
+                worker.abandon(turn_id)
+
+
+# 全局对话工作进程池，第一次使用时创建
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_chat_worker_pool() -> ChatWorkerPool:
+    """
+    获取全局对话工作进程池，进程数取自配置 workers.processes
+
+    Returns:
+        对话工作进程池
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ChatWorkerPool(app_config.get("workers.processes", 0))
+    return _pool
@@ -7,13 +7,25 @@ API管理器 - 封装DeepSeek API调用功能
 import os
 import time
 import sys
-from typing import List, Dict, Optional, Any
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Any, Callable
 from openai import OpenAI
 import subprocess
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from agent.resource_usage import ProcessUsageTracker
+from agent.execution_log import execution_log
+from agent.process_control import (new_process_group_kwargs, terminate_process_tree, PipeReader,
+                                   shell_command_args)
+from agent.output_decoder import detect_shell_encoding
+from agent.output_summarizer import OutputSummarizer
+from agent.tool_schema import resolve_tool_call, format_tool_result
+from agent import tracing
+
 
 class DeepSeekAPIManager:
     """
@@ -96,22 +108,267 @@ class DeepSeekAPIManager:
         Yields:
             每个生成的文本片段
         """
+        for event in self.generate_streaming_events(messages, model=model,
+                                                    temperature=temperature,
+                                                    max_tokens=max_tokens):
+            if event["type"] == "content":
+                yield event["text"]
+    
+    def generate_streaming_events(self, messages: List[Dict[str, Any]],
+                                  tools: Optional[List[Dict[str, Any]]] = None,
+                                  model: str = "deepseek-chat",
+                                  temperature: float = 0.7,
+                                  max_tokens: int = 2048):
+        """
+        生成流式AI回复，支持function calling工具调用
+        
+        Args:
+            messages: 消息列表
+            tools: OpenAI风格的工具定义列表，为空时不启用工具调用
+            model: 使用的模型名称
+            temperature: 生成温度
+            max_tokens: 最大生成token数
+            
+        Yields:
+            事件字典：
+            - {"type": "content", "text": ...} 文本片段
+            - {"type": "tool_call_delta", "index": ..., "name": ..., "arguments": ...} 工具参数增量
+            - {"type": "tool_calls", "tool_calls": [{"id", "name", "arguments"}]} 流结束时的完整工具调用
+            - {"type": "usage", "prompt_tokens": ..., "completion_tokens": ...} 本次调用的token用量
+        """
+        request = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream_options": {"include_usage": True}
+        }
+        if tools:
+            request["tools"] = tools
+        
+        tool_calls = {}
+        # 整个请求为一个区间，连接（到收到响应头）和第一个token分别记录
+        request_span = tracing.span("llm.request", "llm", model=model, messages=len(messages))
+        first_token = True
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                stream=True,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
+            with tracing.span("llm.connect", "llm"):
+                response = self.client.chat.completions.create(**request)
             
             for chunk in response:
-                if chunk.choices and chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+                # 最后一个片段没有choices，只携带用量
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    yield {
+                        "type": "usage",
+                        "prompt_tokens": usage.prompt_tokens,
+                        "completion_tokens": usage.completion_tokens
+                    }
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if first_token and (delta.content or getattr(delta, "tool_calls", None)):
+                    first_token = False
+                    tracing.instant("llm.first_token", "llm")
+                if delta.content is not None:
+                    yield {"type": "content", "text": delta.content}
+                
+                # 工具参数按片段流式返回，按index累积
+                for call in getattr(delta, "tool_calls", None) or []:
+                    entry = tool_calls.setdefault(call.index, {"id": None, "name": "", "arguments": ""})
+                    if call.id:
+                        entry["id"] = call.id
+                    name_delta = ""
+                    arguments_delta = ""
+                    if call.function is not None:
+                        name_delta = call.function.name or ""
+                        arguments_delta = call.function.arguments or ""
+                    entry["name"] += name_delta
+                    entry["arguments"] += arguments_delta
+                    yield {
+                        "type": "tool_call_delta",
+                        "index": call.index,
+                        "name": entry["name"],
+                        "arguments": arguments_delta
+                    }
         
         except Exception as e:
             print(f"流式API调用错误: {str(e)}")
-            yield f"\n\nAPI调用失败: {str(e)}"
+            yield {"type": "content", "text": f"\n\nAPI调用失败: {str(e)}"}
+        finally:
+            request_span.end()
+        
+        if tool_calls:
+            yield {"type": "tool_calls", "tool_calls": [tool_calls[index] for index in sorted(tool_calls)]}
+    
+    def run_agent_loop(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]],
+                       loaders: Dict[str, Any], max_steps: int = 6, max_tokens: int = 32000,
+                       max_parallel: int = 4, command_timeout: int = 300, output_tokens: int = 800,
+                       model: str = "deepseek-chat",
+                       approve: Optional[Callable[[str, str], Optional[str]]] = None,
+                       cancel_event: Optional[threading.Event] = None, kill_grace: float = 3.0):
+        """
+        多步代理循环：模型发出的工具调用并发执行，输出摘要作为tool消息回传，直到模型不再调用工具
+        
+        Args:
+            messages: 消息列表，循环中会追加assistant和tool消息
+            tools: 工具定义列表
+            loaders: 工具名到模板加载器的映射
+            max_steps: 最多调用模型的次数
+            max_tokens: 整个循环累计的token预算（提示+生成）
+            max_parallel: 同一步中并发执行的工具调用数
+            command_timeout: 单条命令的超时时间（秒）
+            output_tokens: 回传给模型的单条命令输出摘要的最大token数
+            model: 使用的模型名称
+            approve: 执行前检查命令的回调，参数为 (命令, 执行器)，返回拒绝原因或None；
+                     被拒绝的调用不执行，原因作为工具结果回传给模型
+            cancel_event: 取消事件，被设置后结束正在执行的命令并停止循环
+            kill_grace: 温和终止后等待进程退出的宽限时间（秒）
+            
+        Yields:
+            事件字典：
+            - {"type": "step", "step": ...} 开始新的一步
+            - {"type": "content", "text": ...} 文本片段
+            - {"type": "tool_call", "id", "name", "command", "executor"} 即将执行的工具调用
+            - {"type": "tool_error", "id", "name", "error"} 工具调用无法渲染为命令或被approve拒绝
+            - {"type": "tool_result", "id", "name", "command", "executor", "result", "digest"} 命令的最终事件和输出摘要
+            - {"type": "tool_wait"} 等待命令执行时定期产生，供调用方处理界面事件
+            - {"type": "done", "reason": finished/max_steps/token_budget/cancelled, "content", "steps", "tokens", "tool_calls"}
+        
+        生成器被提前关闭（界面停止、Ctrl+C、客户端断开）时，本轮启动的命令进程树也会被结束。
+        """
+        used_tokens = 0
+        all_calls = []
+        content = ""
+        reason = "max_steps"
+        step = 0
+        # 本轮所有命令共用的取消事件，调用方取消或关闭生成器时设置
+        turn_cancel = threading.Event()
+        
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+        
+        try:
+            while step < max_steps:
+                step += 1
+                step_span = tracing.span("agent.step", "agent", step=step)
+                yield {"type": "step", "step": step}
+                content = ""
+                tool_calls = []
+                step_usage = None
+                
+                for event in self.generate_streaming_events(messages, tools=tools, model=model):
+                    if cancelled():
+                        break
+                    if event["type"] == "content":
+                        content += event["text"]
+                        yield event
+                    elif event["type"] == "tool_calls":
+                        tool_calls = event["tool_calls"]
+                    elif event["type"] == "usage":
+                        step_usage = event["prompt_tokens"] + event["completion_tokens"]
+                
+                # 服务端没有返回用量时按字符数粗略估算
+                if step_usage is None:
+                    step_usage = (sum(len(str(m.get("content") or "")) for m in messages) + len(content)) // 2
+                used_tokens += step_usage
+                
+                if cancelled():
+                    step_span.end()
+                    reason = "cancelled"
+                    break
+                if not tool_calls:
+                    step_span.end()
+                    reason = "finished"
+                    break
+                all_calls.extend(tool_calls)
+                
+                messages.append({
+                    "role": "assistant",
+                    "content": content or None,
+                    "tool_calls": [
+                        {"id": call["id"], "type": "function",
+                         "function": {"name": call["name"], "arguments": call["arguments"]}}
+                        for call in tool_calls
+                    ]
+                })
+                
+                # 先把所有调用渲染为命令，无法渲染的直接把错误回传给模型
+                tool_messages = {}
+                runnable = []
+                for call in tool_calls:
+                    try:
+                        command, executor = resolve_tool_call(loaders, call["name"], call["arguments"])
+                    except (KeyError, ValueError) as e:
+                        error = str(e.args[0]) if e.args else str(e)
+                        tool_messages[call["id"]] = f"工具调用失败: {error}"
+                        yield {"type": "tool_error", "id": call["id"], "name": call["name"], "error": error}
+                        continue
+                    rejection = approve(command, executor) if approve else None
+                    if rejection:
+                        error = f"命令被安全策略拦截: {rejection}"
+                        tool_messages[call["id"]] = error
+                        yield {"type": "tool_error", "id": call["id"], "name": call["name"], "error": error}
+                        continue
+                    runnable.append((call, command, executor))
+                    yield {"type": "tool_call", "id": call["id"], "name": call["name"],
+                           "command": command, "executor": executor}
+                
+                # 同一步的命令在线程池中并发执行，输出在产生时即送入摘要器，结果经队列取回
+                results = queue.Queue()
+                
+                def run_call(index, command, executor):
+                    summarizer = OutputSummarizer(output_tokens)
+                    final = {"type": "error", "success": False, "error": "命令没有返回结果"}
+                    try:
+                        for event in self.execute_command_realtime(command, executor, command_timeout,
+                                                                   cancel_event=turn_cancel, kill_grace=kill_grace):
+                            if event["type"] in ("stdout", "stderr"):
+                                summarizer.feed(event["lines"], event["type"])
+                            elif event["type"] in ("result", "error"):
+                                final = event
+                    except Exception as e:
+                        final = {"type": "error", "success": False, "error": str(e)}
+                    results.put((index, final, summarizer.digest()))
+                
+                if runnable:
+                    pool = ThreadPoolExecutor(max_workers=max_parallel)
+                    for index, (_, command, executor) in enumerate(runnable):
+                        pool.submit(run_call, index, command, executor)
+                    pool.shutdown(wait=False)
+                    
+                    remaining = len(runnable)
+                    while remaining:
+                        try:
+                            index, final, digest = results.get(timeout=0.1)
+                        except queue.Empty:
+                            if cancelled():
+                                turn_cancel.set()
+                            yield {"type": "tool_wait"}
+                            continue
+                        remaining -= 1
+                        call, command, executor = runnable[index]
+                        tool_messages[call["id"]] = format_tool_result(final, digest)
+                        yield {"type": "tool_result", "id": call["id"], "name": call["name"],
+                               "command": command, "executor": executor, "result": final, "digest": digest}
+                
+                for call in tool_calls:
+                    messages.append({"role": "tool", "tool_call_id": call["id"], "content": tool_messages[call["id"]]})
+                step_span.set(tool_calls=len(tool_calls))
+                step_span.end()
+                
+                if cancelled():
+                    reason = "cancelled"
+                    break
+                if used_tokens >= max_tokens:
+                    reason = "token_budget"
+                    break
+            
+            yield {"type": "done", "reason": reason, "content": content, "steps": step,
+                   "tokens": used_tokens, "tool_calls": all_calls}
+        finally:
+            # 仍在运行的命令看到取消事件后各自结束整棵进程树
+            turn_cancel.set()
     
     def format_messages(self, system_prompt: str, user_messages: List[str], 
                        assistant_messages: List[str] = None, 
@@ -128,6 +385,7 @@ class DeepSeekAPIManager:
         Returns:
             格式化后的消息列表
         """
+        format_span = tracing.span("format_messages", "llm", history=len(user_messages))
         messages = []
         
         # 添加系统提示
@@ -150,85 +408,143 @@ class DeepSeekAPIManager:
         if current_user_message:
             messages.append({"role": "user", "content": current_user_message})
         
+        format_span.end()
         return messages
     
-    def execute_powershell_command_realtime(self, command: str, timeout: int = 300):
+    def execute_powershell_command_realtime(self, command: str, timeout: int = 300,
+                                            cancel_event: Optional[threading.Event] = None,
+                                            kill_grace: float = 3.0):
         """
         实时执行PowerShell命令并显示输出
         
         Args:
             command: PowerShell命令
             timeout: 超时时间（秒），默认5分钟
+            cancel_event: 取消事件，被设置后立即结束命令
+            kill_grace: 温和终止后等待进程退出的宽限时间（秒）
+            
+        Yields:
+            执行结果字典，格式同 execute_command_realtime
+        """
+        yield from self.execute_command_realtime(command, "powershell", timeout,
+                                                 cancel_event=cancel_event, kill_grace=kill_grace)
+    
+    def execute_command_realtime(self, command: str, executor: str = "powershell",
+                                 timeout: int = 300,
+                                 cancel_event: Optional[threading.Event] = None,
+                                 kill_grace: float = 3.0):
+        """
+        用指定执行器实时执行命令并显示输出
+        
+        命令在独立的进程组中运行，超时或取消时会结束整棵进程树，
+        不会留下占用管道和CPU的子孙进程。
+        
+        Args:
+            command: 命令文本
+            executor: 执行器名称，powershell、cmd、bash 或 sh
+            timeout: 超时时间（秒），默认5分钟
+            cancel_event: 取消事件，被设置后立即结束命令
+            kill_grace: 温和终止后等待进程退出的宽限时间（秒）
             
         Yields:
-            执行结果字典
+            执行结果字典，stdout/stderr事件以 lines 列表成批携带输出行，
+            最终的result/超时/取消事件带有usage资源统计
         """
+        tracker = None
+        run_span = tracing.span("command.run", "process", executor=executor)
         try:
-            # 使用Popen启动进程，实时获取输出
-            process = subprocess.Popen(
-                ["powershell", "-Command", command],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,  # 行缓冲
-                universal_newlines=True
-            )
+            # 使用Popen启动进程，以无缓冲二进制管道读取原始字节，由读取线程按执行器编码解码
+            with tracing.span("process.spawn", "process", executor=executor):
+                process = subprocess.Popen(
+                    shell_command_args(executor, command),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    bufsize=0,
+                    **new_process_group_kwargs()
+                )
+            encoding = detect_shell_encoding(executor)
+            # 由统计器回收进程，以获取CPU时间、内存峰值和I/O
+            tracker = ProcessUsageTracker(process)
 
-            # 实时读取输出
+            # 由读取线程把成批的输出行放入队列，主循环不会阻塞在读取上
+            output_queue = queue.Queue()
+            readers = [
+                PipeReader(process.stdout, "stdout", output_queue, encoding),
+                PipeReader(process.stderr, "stderr", output_queue, encoding)
+            ]
             output_lines = []
             error_lines = []
             
             # 设置超时
             start_time = time.time()
+            exit_time = None
+            stop_reason = None
             
-            while process.poll() is None:
-                # 检查是否超时
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    stop_reason = "cancelled"
+                    break
                 if time.time() - start_time > timeout:
-                    process.kill()
-                    yield {
+                    stop_reason = "timeout"
+                    break
+                
+                try:
+                    stream, lines = output_queue.get(timeout=0.1)
+                except queue.Empty:
+                    if tracker.poll() is not None:
+                        if not any(reader.is_alive() for reader in readers):
+                            break
+                        # 进程已退出但管道仍被子孙进程占用，短暂等待后不再读取
+                        exit_time = exit_time or time.time()
+                        if time.time() - exit_time > kill_grace:
+                            break
+                    continue
+                
+                (output_lines if stream == "stdout" else error_lines).extend(lines)
+                yield {"type": stream, "lines": lines}
+            
+            if stop_reason is not None:
+                terminate_process_tree(process, tracker.wait, kill_grace)
+                if stop_reason == "timeout":
+                    stop_event = {
                         "type": "error",
                         "success": False,
                         "error": f"命令执行超时（{timeout}秒）",
-                        "is_timeout": True
+                        "is_timeout": True,
+                        "usage": tracker.usage()
                     }
-                    return
-                
-                # 读取标准输出
-                stdout_line = process.stdout.readline()
-                if stdout_line:
-                    output_lines.append(stdout_line.strip())
-                    yield {"type": "stdout", "line": stdout_line.strip()}
-                
-                # 读取标准错误
-                stderr_line = process.stderr.readline()
-                if stderr_line:
-                    error_lines.append(stderr_line.strip())
-                    yield {"type": "stderr", "line": stderr_line.strip()}
-                
-                time.sleep(0.1)  # 避免CPU占用过高
+                else:
+                    stop_event = {
+                        "type": "error",
+                        "success": False,
+                        "error": "命令已取消",
+                        "is_cancelled": True,
+                        "usage": tracker.usage()
+                    }
+                execution_log.record(command, stop_event, source=executor)
+                yield stop_event
+                return
             
             # 读取剩余输出
-            remaining_stdout, remaining_stderr = process.communicate()
-            if remaining_stdout:
-                for line in remaining_stdout.strip().split('\n'):
-                    if line:
-                        output_lines.append(line)
-                        yield {"type": "stdout", "line": line}
-                        
-            if remaining_stderr:
-                for line in remaining_stderr.strip().split('\n'):
-                    if line:
-                        error_lines.append(line)
-                        yield {"type": "stderr", "line": line}
+            while True:
+                try:
+                    stream, lines = output_queue.get_nowait()
+                except queue.Empty:
+                    break
+                (output_lines if stream == "stdout" else error_lines).extend(lines)
+                yield {"type": stream, "lines": lines}
             
             # 返回最终结果
-            yield {
+            result = {
                 "type": "result",
                 "success": process.returncode == 0,
                 "returncode": process.returncode,
                 "output": "\n".join(output_lines),
-                "error": "\n".join(error_lines)
+                "error": "\n".join(error_lines),
+                "usage": tracker.usage()
             }
+            execution_log.record(command, result, source=executor)
+            yield result
 
         except Exception as e:
             yield {
@@ -236,6 +552,11 @@ class DeepSeekAPIManager:
                 "success": False,
                 "error": f"执行命令时发生错误: {str(e)}"
             }
+        finally:
+            # 调用方提前关闭生成器时结束仍在运行的进程树
+            if tracker is not None and tracker.poll() is None:
+                terminate_process_tree(tracker.process, tracker.wait, kill_grace)
+            run_span.end()
 
 
 # 示例用法
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+终端入口 - 不依赖PySide6的交互式命令行和脚本模式，与图形界面共用同一套对话流程
+"""
+
+import os
+import sys
+import json
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import app_config
+from agent.chat_session import ChatSession, timestamp
+
+
+def load_api_manager():
+    """导入openai并创建API管理器，在后台线程中调用"""
+    from api_manager import DeepSeekAPIManager
+    return DeepSeekAPIManager()
+
+
+class TerminalChat:
+    """
+    终端前端
+
+    把对话流程的事件输出为文本（或每行一个JSON事件），命令在前台执行并实时输出，Ctrl+C 取消当前命令或回复。
+    """
+
+    def __init__(self, auto_approve=False, execute=True, json_output=False):
+        """
+        初始化终端前端
+
+        Args:
+            auto_approve: 需要确认的命令不询问直接执行
+            execute: 是否执行回复中的命令，为False时只输出命令
+            json_output: 每行输出一个JSON事件，便于在管道中处理
+        """
+        self.auto_approve = auto_approve
+        self.execute = execute
+        self.json_output = json_output
+        self.interactive = sys.stdin.isatty()
+        self.color = sys.stdout.isatty() and not json_output
+        self.session = ChatSession(approve=self.screen_command)
+        self.messages = []
+        self.failed = False
+        self._at_line_start = True
+        self._api_error = None
+
+        # openai的导入较慢，在用户输入的同时在后台完成
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-init")
+        self._api_future = pool.submit(load_api_manager)
+        pool.shutdown(wait=False)
+
+    def ensure_api_manager(self):
+        """等待后台初始化完成，返回API管理器，失败时为None"""
+        if self.session.api_manager is None and self._api_error is None:
+            try:
+                self.session.api_manager = self._api_future.result()
+            except Exception as e:
+                self._api_error = str(e)
+                self.notice(f"初始化API管理器失败: {e}", "31")
+        return self.session.api_manager
+
+    def _style(self, text, code):
+        return f"\033[{code}m{text}\033[0m" if self.color else text
+
+    def write(self, text):
+        """输出回复文本片段"""
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        if text:
+            self._at_line_start = text.endswith("\n")
+
+    def notice(self, text, code="90", stream=None):
+        """
+        另起一行输出一条提示
+
+        Args:
+            text: 提示文本
+            code: ANSI颜色代码
+            stream: 输出流，默认为标准输出
+        """
+        stream = stream or sys.stdout
+        if not self._at_line_start:
+            sys.stdout.write("\n")
+            self._at_line_start = True
+        print(self._style(text, code), file=stream, flush=True)
+
+    def emit(self, event):
+        """JSON模式下输出一个事件"""
+        print(json.dumps(event, ensure_ascii=False, default=str), flush=True)
+
+    def skip_command(self, command, executor="powershell"):
+        """--no-exec 时只输出命令"""
+        if self.json_output:
+            self.emit({"type": "command_skipped", "command": command, "executor": executor})
+        else:
+            self.notice(f"[{executor}] {command}", "36")
+
+    def screen_command(self, command, executor="powershell"):
+        """
+        执行前按安全规则检查命令：禁止的命令直接拦截，需要确认的命令在终端中询问
+
+        Returns:
+            命令被拦截或用户取消时返回原因，可以执行时返回None
+        """
+        if not self.execute:
+            # 代理循环中的工具调用也经过这里，--no-exec 时一律不执行
+            self.skip_command(command, executor)
+            return "未执行（--no-exec）"
+        verdict = self.session.check_command(command)
+        if verdict is None or verdict.allowed:
+            return None
+        reasons = "、".join(verdict.reasons)
+        if verdict.denied:
+            self.notice(f"⛔ 已拦截{executor}命令（{reasons}）: {command}", "31", sys.stderr)
+            return reasons
+        if self.auto_approve:
+            return None
+        if not self.interactive:
+            self.notice(f"已跳过需要确认的命令（{reasons}），使用 --yes 允许执行: {command}", "33", sys.stderr)
+            return f"需要确认（{reasons}）"
+        self.notice(f"该命令可能有风险（{reasons}）:\n{command}", "33")
+        try:
+            answer = input("确定要执行吗？[y/N] ").strip().lower()
+        except EOFError:
+            answer = ""
+        if answer in ("y", "yes"):
+            return None
+        self.notice(f"已取消执行: {command}")
+        return f"用户拒绝执行（{reasons}）"
+
+    def run_command(self, command, executor="powershell", request=None):
+        """在前台执行命令并实时输出，结束后写入命令缓存"""
+        if not self.execute:
+            self.skip_command(command, executor)
+            return
+        if self.screen_command(command, executor):
+            self.failed = True
+            return
+        api_manager = self.ensure_api_manager()
+        if api_manager is None:
+            self.failed = True
+            return
+
+        if not self.json_output:
+            self.notice(f"▶ {executor}: {command}", "36")
+        cancel_event = threading.Event()
+        result = None
+        events = api_manager.execute_command_realtime(
+            command, executor, app_config.get("execution.timeout", 300), cancel_event=cancel_event,
+            kill_grace=app_config.get("execution.kill_grace_seconds", 3))
+        try:
+            for event in events:
+                if self.json_output:
+                    self.emit(event)
+                elif event["type"] in ("stdout", "stderr"):
+                    stream = sys.stdout if event["type"] == "stdout" else sys.stderr
+                    stream.write("".join(line + "\n" for line in event["lines"]))
+                    stream.flush()
+                if event["type"] in ("result", "error"):
+                    result = event
+        except KeyboardInterrupt:
+            # 关闭生成器时结束整棵进程树
+            events.close()
+            result = {"type": "error", "success": False, "error": "命令已取消", "is_cancelled": True}
+
+        if result is None:
+            result = {"type": "error", "success": False, "error": "命令没有返回结果"}
+        if not result.get("success"):
+            self.failed = True
+        if not self.json_output:
+            wall_time = (result.get("usage") or {}).get("wall_time")
+            elapsed = f"，耗时 {wall_time:.1f} 秒" if wall_time is not None else ""
+            if result.get("success"):
+                self.notice(f"✅ 命令执行成功{elapsed}", "32")
+            elif result["type"] == "result":
+                self.notice(f"❌ 命令执行失败（退出码 {result.get('returncode')}{elapsed}）", "31")
+            else:
+                self.notice(f"❌ {result.get('error')}", "31")
+        self.session.record_result(request, command, executor, result)
+
+    def show_event(self, event):
+        """以文本形式输出对话流程的一个事件"""
+        event_type = event["type"]
+        if event_type == "content":
+            self.write(event["text"])
+        elif event_type == "step":
+            if not self._at_line_start:
+                self.write("\n")
+        elif event_type == "stream_warning":
+            self.notice(f"⚠ 回复中包含被安全策略禁止的操作（{'、'.join(event['reasons'])}），该命令不会被执行", "31")
+        elif event_type == "tool_call":
+            self.notice(f"🔧 调用模板 {event['name']}: {event['command']}")
+        elif event_type == "tool_error":
+            self.notice(f"❌ 工具调用失败 ({event['name']}): {event['error']}", "31")
+        elif event_type == "tool_result":
+            self.notice(event["digest"])
+        elif event_type == "local_intent":
+            self.notice(f"⚡ 本地匹配模板 {event['template']}: {event['command']}")
+        elif event_type == "cached_command":
+            if event["mode"] == "execute":
+                self.notice(f"💡 使用缓存的命令（{event['summary']}）: {event['command']}")
+            else:
+                self.notice(f"💡 相似请求曾成功执行（{event['summary']}），输入 !! 直接执行: {event['command']}")
+        elif event_type == "limit":
+            if event["reason"] == "max_steps":
+                self.notice(f"⚠ 已达到最大步数 {event['steps']}，代理循环已停止", "33")
+            else:
+                self.notice(f"⚠ 已用完token预算（{event['tokens']}），代理循环已停止", "33")
+        elif event_type == "error":
+            self.notice(f"API调用失败: {event['error']}", "31", sys.stderr)
+        elif event_type == "done":
+            if not self._at_line_start:
+                self.write("\n")
+
+    def ask(self, message):
+        """
+        处理一条用户消息
+
+        Args:
+            message: 用户消息
+        """
+        self.messages.append({"sender": "user", "content": message, "timestamp": timestamp()})
+        events = self.session.respond(message, self.messages)
+        try:
+            for event in events:
+                if event["type"] == "tool_wait":
+                    continue
+                if event["type"] == "thinking":
+                    self.ensure_api_manager()
+                if event["type"] == "error":
+                    self.failed = True
+                if self.json_output:
+                    self.emit({key: value for key, value in event.items() if key != "message"})
+                else:
+                    self.show_event(event)
+                if event["type"] == "command":
+                    self.run_command(event["command"], event["executor"], event["request"])
+        except KeyboardInterrupt:
+            events.close()
+            self.notice("已中断回复", "33")
+
+    def repl(self):
+        """交互式对话，/new 开始新的对话，/exit 或 Ctrl+D 退出"""
+        print("Savvy 终端模式，输入 /exit 退出，/new 开始新的对话，!! 执行缓存中的建议命令")
+        while True:
+            try:
+                message = input(self._style("你> ", "1")).strip()
+            except EOFError:
+                print()
+                return
+            except KeyboardInterrupt:
+                print()
+                continue
+            if not message:
+                continue
+            if message in ("/exit", "/quit"):
+                return
+            if message == "/new":
+                self.messages = []
+                self.notice("已开始新的对话")
+                continue
+            if message == "!!":
+                suggested = self.session.take_suggested_command()
+                if suggested is None:
+                    self.notice("没有建议的命令")
+                else:
+                    self.run_command(*suggested)
+                continue
+            self.ask(message)
+
+
+def main(argv=None):
+    """终端入口，返回进程退出码"""
+    parser = argparse.ArgumentParser(description="Savvy 终端模式")
+    parser.add_argument("message", nargs="*", help="要发送的消息，省略时从标准输入读取或进入交互模式")
+    parser.add_argument("-y", "--yes", action="store_true", help="需要确认的命令不询问直接执行")
+    parser.add_argument("--no-exec", action="store_true", help="只输出回复中的命令，不执行")
+    parser.add_argument("--json", action="store_true", help="每行输出一个JSON事件")
+    args = parser.parse_args(argv)
+
+    chat = TerminalChat(auto_approve=args.yes, execute=not args.no_exec, json_output=args.json)
+    if args.message:
+        chat.ask(" ".join(args.message))
+    elif not sys.stdin.isatty():
+        message = sys.stdin.read().strip()
+        if message:
+            chat.ask(message)
+    else:
+        chat.repl()
+    return 1 if chat.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
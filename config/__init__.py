@@ -5,6 +5,6 @@
 配置模块初始化文件
 """
 
-from .config_manager import ConfigManager, config_manager
+from .config_manager import ConfigManager, app_config, get_config_manager
 
-__all__ = ['ConfigManager', 'config_manager']
\ No newline at end of file
+__all__ = ['ConfigManager', 'app_config', 'get_config_manager']
@@ -7,12 +7,15 @@
 
 import os
 import json
+import threading
 from typing import Any, Dict, Optional
 
 
 class ConfigManager:
     """
     配置管理器类，用于管理应用程序的配置文件
+
+    创建时不读写磁盘，第一次访问配置时才创建配置目录并加载配置文件。
     """
     
     def __init__(self, config_dir: str = "config", config_file: str = "settings.json"):
@@ -27,9 +30,8 @@ class ConfigManager:
         self.project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self.config_dir = os.path.join(self.project_root, config_dir)
         self.config_file = os.path.join(self.config_dir, config_file)
-        
-        # 创建配置目录（如果不存在）
-        os.makedirs(self.config_dir, exist_ok=True)
+        self._config = None
+        self._load_lock = threading.Lock()
         
         # 默认配置
         self.default_config = {
@@ -58,11 +60,73 @@ class ConfigManager:
                 "proxy_host": "",
                 "proxy_port": 8080,
                 "proxy_protocol": "HTTP"
+            },
+            "execution": {
+                "timeout": 300,
+                "max_concurrent_jobs": 2,
+                "kill_grace_seconds": 3
+            },
+            "agent": {
+                "use_tools": True,
+                "max_tools": 8,
+                "max_steps": 6,
+                "max_total_tokens": 32000,
+                "max_parallel_tools": 4,
+                "tool_output_tokens": 800
+            },
+            "intent": {
+                "enabled": True,
+                "min_confidence": 0.8
+            },
+            "command_cache": {
+                "mode": "suggest",
+                "min_similarity": 0.75
+            },
+            "safety": {
+                "enabled": True
+            },
+            "ui": {
+                "cached_chats": 8
+            },
+            "diagnostics": {
+                "stall_watchdog": False,
+                "stall_threshold_ms": 50,
+                "intent_stats": False
+            },
+            "resident": {
+                "enabled": False
+            },
+            "server": {
+                "host": "127.0.0.1",
+                "port": 8700,
+                "token": "",
+                "allowed_origins": [],
+                "max_sessions": 1000,
+                "max_active_turns": 64,
+                "max_running_commands": 8,
+                "event_queue_size": 256,
+                "session_idle_timeout": 1800,
+                "confirm_timeout": 60,
+                "allow_execution": True
+            },
+            "workers": {
+                "enabled": False,
+                "processes": 0
             }
         }
-        
-        # 加载配置
-        self.config = self.load_config()
+    
+    @property
+    def config(self) -> Dict[str, Any]:
+        """当前配置，第一次访问时从文件加载"""
+        if self._config is None:
+            with self._load_lock:
+                if self._config is None:
+                    self._config = self.load_config()
+        return self._config
+    
+    @config.setter
+    def config(self, value: Dict[str, Any]):
+        self._config = value
     
     def load_config(self) -> Dict[str, Any]:
         """
@@ -71,6 +135,9 @@ class ConfigManager:
         Returns:
             配置字典
         """
+        # 创建配置目录（如果不存在）
+        os.makedirs(self.config_dir, exist_ok=True)
+        
         # 如果配置文件不存在，创建默认配置文件
         if not os.path.exists(self.config_file):
             self.save_config(self.default_config)
@@ -186,5 +253,36 @@ class ConfigManager:
         return self.save_config(self.config)
 
 
-# 全局配置管理器实例
-config_manager = ConfigManager()
\ No newline at end of file
+_config_manager = None
+_config_manager_lock = threading.Lock()
+
+
+def get_config_manager() -> ConfigManager:
+    """
+    获取全局配置管理器
+
+    Returns:
+        全局配置管理器实例
+    """
+    global _config_manager
+    if _config_manager is None:
+        with _config_manager_lock:
+            if _config_manager is None:
+                _config_manager = ConfigManager()
+    return _config_manager
+
+
+class _ConfigManagerProxy:
+    """全局配置管理器的代理，第一次访问属性时才创建实例"""
+
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        return getattr(get_config_manager(), name)
+
+    def __repr__(self):
+        return f"<app_config {get_config_manager()!r}>"
+
+
+# 全局配置管理器，用法与 ConfigManager 实例相同；不占用子模块名 config.config_manager
+app_config = _ConfigManagerProxy()
\ No newline at end of file
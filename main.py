@@ -7,15 +7,69 @@ import os
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from resident import send_command
+
+
+def report_when_api_ready(profiler, window):
+    """API管理器在后台初始化完成后输出启动耗时"""
+    def done(_future):
+        profiler.mark("API客户端就绪")
+        profiler.report()
+        profiler.uninstall()
+    
+    future = window.api_wrapper.api_future
+    if future is None:
+        profiler.report()
+        profiler.uninstall()
+    else:
+        future.add_done_callback(done)
+
+
+def attach_to_resident(args):
+    """
+    已有常驻进程时把启动请求交给它，不再导入Qt和openai
+    
+    Args:
+        args: 命令行参数
+        
+    Returns:
+        是否已交给常驻进程处理
+    """
+    if "--quit-resident" in args:
+        reply = send_command("quit")
+        print("已通知常驻进程退出" if reply and reply.get("ok") else "没有正在运行的常驻进程")
+        return True
+    if "--no-attach" in args:
+        return False
+    reply = send_command("show")
+    if reply and reply.get("ok"):
+        print(f"已显示常驻进程（PID {reply.get('pid')}）的窗口")
+        return True
+    return False
+
+
 def main():
     """主函数 - 启动AI Agent GUI"""
+    args = sys.argv[1:]
+    if attach_to_resident(args):
+        return
+    
     print("正在启动AI Agent GUI...")
     
+    # 分析启动耗时（--import-time 或 SAVVY_IMPORT_TIME=1）时，在导入其他模块之前开始记录
+    profiler = None
+    if "--import-time" in args or os.environ.get("SAVVY_IMPORT_TIME"):
+        from startup_profiler import StartupProfiler
+        profiler = StartupProfiler()
+        profiler.install()
+    
     try:
         # 导入PySide6
         from PySide6.QtWidgets import QApplication
         # 导入主窗口
         from ui.main_window import AIAgentGUI
+        if profiler is not None:
+            profiler.mark("导入界面模块")
         
         # 创建应用程序实例
         app = QApplication(sys.argv)
@@ -26,6 +80,20 @@ def main():
         
         # 创建并显示主窗口
         window = AIAgentGUI()
+        if profiler is not None:
+            profiler.mark("主窗口显示")
+            report_when_api_ready(profiler, window)
+        
+        # 常驻模式：关闭窗口后进程继续运行，再次启动时直接显示窗口
+        from config import app_config
+        if "--resident" in args or app_config.get("resident.enabled", False):
+            from ui.resident_host import ResidentHost
+            host = ResidentHost(window)
+            if host.start():
+                window.resident_host = host
+                app.setQuitOnLastWindowClosed(False)
+            else:
+                print("已有常驻进程在运行，本次不进入常驻模式")
         
         # 运行应用程序
         sys.exit(app.exec())
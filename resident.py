@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+常驻进程模块 - 常驻的界面进程在本地套接字上监听，再次启动时只需通知它显示窗口，启动器不导入Qt和openai
+"""
+
+import os
+import sys
+import stat
+import tempfile
+import threading
+from multiprocessing.connection import Listener, Client, AuthenticationError
+from typing import Any, Callable, Dict, Optional
+
+
+# 连接常驻进程时收发消息的超时时间（秒）
+_REPLY_TIMEOUT = 5.0
+
+
+def _runtime_dir() -> str:
+    # 套接字和认证密钥所在的目录：优先使用 XDG_RUNTIME_DIR，否则为临时目录下按用户区分的子目录。
+    # 临时目录下的路径可能被其他用户抢先创建并放入伪造的套接字和密钥，
+    # 目录不属于当前用户或其他用户可以访问时抛出 PermissionError
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        path = os.path.join(runtime_dir, "savvy")
+    else:
+        user = os.environ.get("USER") or os.environ.get("USERNAME") or str(getattr(os, "getuid", lambda: "user")())
+        path = os.path.join(tempfile.gettempdir(), f"savvy-{user}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    if hasattr(os, "getuid"):
+        # 不跟随符号链接，检查目录本身
+        info = os.lstat(path)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise PermissionError(f"常驻进程目录 {path} 不属于当前用户或权限不是 700，已拒绝使用")
+    return path
+
+
+def resident_address() -> str:
+    """常驻进程的监听地址：Windows下为命名管道，其他系统为Unix域套接字"""
+    if sys.platform == "win32":
+        return r"\\.\pipe\savvy-" + os.path.basename(_runtime_dir())
+    return os.path.join(_runtime_dir(), "resident.sock")
+
+
+def _authkey(create: bool = False) -> Optional[bytes]:
+    path = os.path.join(_runtime_dir(), "resident.key")
+    if create:
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, "wb") as f:
+                f.write(os.urandom(32))
+    try:
+        with open(path, "rb") as f:
+            return f.read() or None
+    except OSError:
+        return None
+
+
+def send_command(command: str, **args) -> Optional[Dict[str, Any]]:
+    """
+    向常驻进程发送一条命令
+
+    Args:
+        command: 命令名称，如 show、quit、ping
+        **args: 命令参数
+
+    Returns:
+        常驻进程的回复，没有常驻进程或连接失败时返回None
+    """
+    try:
+        authkey = _authkey()
+        if authkey is None:
+            return None
+        connection = Client(resident_address(), authkey=authkey)
+    except (OSError, EOFError, AuthenticationError):
+        return None
+    try:
+        connection.send({"command": command, **args})
+        if not connection.poll(_REPLY_TIMEOUT):
+            return None
+        return connection.recv()
+    except (OSError, EOFError):
+        return None
+    finally:
+        connection.close()
+
+
+class ResidentListener:
+    """
+    常驻进程的命令监听器
+
+    在后台线程中逐个接受连接，每个连接收一条命令，交给处理函数并把返回值作为回复；
+    处理函数在监听线程中调用，需要操作界面时应自行转到主线程。
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        """
+        初始化监听器
+
+        Args:
+            handler: 命令处理函数，参数为命令字典，返回回复字典
+        """
+        self.handler = handler
+        self.address = None
+        self._listener = None
+        self._thread = None
+        self._stopping = False
+
+    def start(self) -> bool:
+        """
+        开始监听
+
+        Returns:
+            是否成功监听，已有其他常驻进程时返回False
+        """
+        if self._listener is not None:
+            return True
+        if send_command("ping") is not None:
+            return False
+        try:
+            self.address = resident_address()
+            # 上次异常退出留下的套接字文件已没有进程监听
+            if sys.platform != "win32" and os.path.exists(self.address):
+                try:
+                    os.unlink(self.address)
+                except OSError:
+                    pass
+            self._listener = Listener(self.address, authkey=_authkey(create=True))
+        except OSError as e:
+            print(f"常驻进程监听失败: {e}")
+            return False
+        self._stopping = False
+        self._thread = threading.Thread(target=self._serve, name="resident-listener", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """停止监听"""
+        if self._listener is None:
+            return
+        self._stopping = True
+        # 连接一次唤醒阻塞在 accept 上的监听线程
+        send_command("ping")
+        self._thread.join(timeout=1)
+        self._listener.close()
+        self._listener = None
+        self._thread = None
+
+    def _serve(self):
+        while not self._stopping:
+            try:
+                connection = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                if self._stopping:
+                    return
+                continue
+            try:
+                if not connection.poll(_REPLY_TIMEOUT):
+                    continue
+                message = connection.recv()
+                if message.get("command") == "ping":
+                    reply = {"ok": True, "pid": os.getpid()}
+                else:
+                    reply = self.handler(message)
+                connection.send(reply)
+            except (OSError, EOFError, AttributeError) as e:
+                print(f"处理常驻进程命令失败: {e}")
+            finally:
+                connection.close()
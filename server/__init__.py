@@ -0,0 +1,12 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+服务端模块初始化文件
+"""
+
+from .sessions import ServerSession, SessionManager
+from .app import ChatServer
+from .mock_llm import MockLLM
+
+__all__ = ['ServerSession', 'SessionManager', 'ChatServer', 'MockLLM']
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+服务端入口 - python -m server 启动对话服务，多个用户通过HTTP或WebSocket共用一个进程
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import app_config
+from server.app import ChatServer
+from server.sessions import SessionManager
+from server.mock_llm import MockLLM
+from agent.worker_pool import ChatWorkerPool
+
+
+def create_api_manager(base_url=None):
+    """创建所有会话共用的API管理器，base_url为空时使用设置中的API地址"""
+    from api_manager import DeepSeekAPIManager
+    if base_url:
+        return DeepSeekAPIManager(api_key=os.environ.get("DEEPSEEK_API_KEY") or "mock", base_url=base_url)
+    api_url = app_config.get("api.api_url", "")
+    api_key = app_config.get("api.api_key", "") or None
+    return DeepSeekAPIManager(api_key=api_key, base_url=api_url) if api_url else DeepSeekAPIManager(api_key=api_key)
+
+
+async def serve(args):
+    """启动服务并一直运行"""
+    mock_server = None
+    llm_url = args.llm_url
+    if args.mock_llm:
+        mock_server = await MockLLM().start("127.0.0.1", 0)
+        llm_url = f"http://127.0.0.1:{mock_server.sockets[0].getsockname()[1]}/v1"
+        print(f"使用进程内的模拟大模型服务: {llm_url}")
+
+    loop = asyncio.get_running_loop()
+    token = os.environ.get("SAVVY_SERVER_TOKEN") or app_config.get("server.token", "")
+    allow_execution = app_config.get("server.allow_execution", True) and not args.no_exec
+    if allow_execution and not token:
+        # 没有访问令牌时任何能连上端口的程序都能让服务执行命令
+        allow_execution = False
+        print("没有设置访问令牌（server.token 或环境变量 SAVVY_SERVER_TOKEN），已禁止执行命令")
+    # openai的导入和客户端创建较慢，放在线程中完成
+    api_manager = await loop.run_in_executor(None, create_api_manager, llm_url)
+    worker_pool = None
+    processes = args.workers if args.workers is not None else (
+        app_config.get("workers.processes", 0) if app_config.get("workers.enabled", False) else None)
+    if processes is not None:
+        # 工作进程使用与服务相同的API地址和密钥
+        worker_pool = ChatWorkerPool(processes, api_key=api_manager.api_key, base_url=api_manager.base_url)
+        worker_pool.start()
+        print(f"对话在 {worker_pool.processes} 个工作进程中运行")
+    manager = SessionManager(
+        api_manager,
+        max_sessions=app_config.get("server.max_sessions", 1000),
+        max_active_turns=app_config.get("server.max_active_turns", 64),
+        max_running_commands=app_config.get("server.max_running_commands", 8),
+        event_queue_size=app_config.get("server.event_queue_size", 256),
+        idle_timeout=app_config.get("server.session_idle_timeout", 1800),
+        confirm_timeout=app_config.get("server.confirm_timeout", 60),
+        allow_execution=allow_execution,
+        worker_pool=worker_pool)
+    await loop.run_in_executor(None, manager.warm_up)
+
+    chat_server = ChatServer(manager, token=token,
+                             allowed_origins=app_config.get("server.allowed_origins", []))
+    server = await chat_server.start(args.host, args.port)
+    print(f"Savvy 服务已启动: http://{args.host}:{args.port}（WebSocket: ws://{args.host}:{args.port}/ws）")
+    if not token and args.host not in ("127.0.0.1", "localhost", "::1"):
+        print("警告: 没有设置访问令牌（server.token 或环境变量 SAVVY_SERVER_TOKEN），任何人都可以连接")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        manager.shutdown()
+        if mock_server is not None:
+            mock_server.close()
+
+
+def main(argv=None):
+    """服务端入口"""
+    parser = argparse.ArgumentParser(prog="python -m server", description="Savvy 对话服务")
+    parser.add_argument("--host", default=app_config.get("server.host", "127.0.0.1"), help="监听地址")
+    parser.add_argument("--port", type=int, default=app_config.get("server.port", 8700), help="监听端口")
+    parser.add_argument("--llm-url", help="OpenAI兼容接口的地址，如 python -m server.mock_llm 启动的模拟服务")
+    parser.add_argument("--mock-llm", action="store_true", help="在进程内启动模拟大模型服务，用于压测")
+    parser.add_argument("--no-exec", action="store_true", help="不允许执行命令")
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help="在N个工作进程中运行对话（0表示CPU核数），默认取配置 workers")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+服务端路由模块 - 通过HTTP和WebSocket提供会话管理、流式回复、工具调用确认和命令执行
+"""
+
+import re
+import json
+import asyncio
+import secrets
+from typing import Any, AsyncIterator, Dict, Iterable
+
+from server.protocol import (HTTPError, Request, ChunkedResponse, WebSocket, WebSocketClosed,
+                             read_request, send_response, accept_websocket, MAX_HEADER_SIZE)
+from server.sessions import SessionManager, ServerSession
+
+
+# (方法, 路径正则, 处理方法名)
+_ROUTES = [
+    ("GET", r"/health", "health"),
+    ("POST", r"/sessions", "create_session"),
+    ("GET", r"/sessions/(?P<session_id>[\w-]+)", "get_session"),
+    ("DELETE", r"/sessions/(?P<session_id>[\w-]+)", "delete_session"),
+    ("POST", r"/sessions/(?P<session_id>[\w-]+)/messages", "post_message"),
+    ("POST", r"/sessions/(?P<session_id>[\w-]+)/commands/(?P<command_id>\w+)", "run_command"),
+    ("POST", r"/sessions/(?P<session_id>[\w-]+)/confirmations/(?P<confirm_id>\w+)", "confirm"),
+    ("POST", r"/sessions/(?P<session_id>[\w-]+)/cancel", "cancel"),
+]
+_ROUTES = [(method, re.compile(pattern + "$"), handler) for method, pattern, handler in _ROUTES]
+_WEBSOCKET_PATH = re.compile(r"/(?:sessions/(?P<session_id>[\w-]+)/)?ws$")
+
+
+class ChatServer:
+    """
+    对话服务
+
+    HTTP接口的流式响应为每行一个JSON事件（分块传输）；WebSocket连接上客户端发送
+    message/execute/confirm/cancel 消息，服务端推送同样的事件。配置了访问令牌时，
+    请求需要带上 Authorization: Bearer 头或 token 查询参数。带 Origin 头的请求（浏览器
+    中的网页发起的请求和WebSocket连接）只接受 allowed_origins 中的来源。
+    """
+
+    def __init__(self, manager: SessionManager, token: str = "", reap_interval: float = 60,
+                 allowed_origins: Iterable[str] = ()):
+        """
+        初始化对话服务
+
+        Args:
+            manager: 会话管理器
+            token: 访问令牌，为空时不检查
+            reap_interval: 检查空闲会话的间隔（秒）
+            allowed_origins: 允许的网页来源，如 http://localhost:3000，为空时拒绝所有带 Origin 头的请求
+        """
+        self.manager = manager
+        self.token = token
+        self.reap_interval = reap_interval
+        self.allowed_origins = {origin.rstrip("/").lower() for origin in allowed_origins}
+        self.connections = 0
+
+    async def start(self, host: str, port: int) -> asyncio.AbstractServer:
+        """
+        开始监听，并定期回收空闲会话
+
+        Args:
+            host: 监听地址
+            port: 监听端口
+
+        Returns:
+            asyncio服务对象
+        """
+        server = await asyncio.start_server(self.handle_connection, host, port,
+                                            limit=MAX_HEADER_SIZE, backlog=1024)
+        self._reaper = asyncio.create_task(self._reap_idle())
+        return server
+
+    async def _reap_idle(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            expired = self.manager.expire_idle()
+            if expired:
+                print(f"已回收 {expired} 个空闲会话")
+
+    def _origin_allowed(self, request: Request) -> bool:
+        # 命令行客户端不发送 Origin；浏览器总会发送，不检查的话用户打开的任意网页都能连接本机服务
+        origin = request.headers.get("origin")
+        return origin is None or origin.rstrip("/").lower() in self.allowed_origins
+
+    def _authorized(self, request: Request) -> bool:
+        if not self.token:
+            return True
+        supplied = request.query.get("token", "")
+        authorization = request.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            supplied = authorization[7:].strip()
+        return secrets.compare_digest(supplied.encode("utf-8"), self.token.encode("utf-8"))
+
+    def _session(self, session_id: str) -> ServerSession:
+        session = self.manager.get(session_id)
+        if session is None:
+            raise HTTPError(404, "会话不存在或已过期")
+        return session
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接，保持连接时依次处理其上的多个请求"""
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        return
+                    if not self._origin_allowed(request):
+                        raise HTTPError(403, "不允许的请求来源")
+                    if not self._authorized(request):
+                        raise HTTPError(401, "访问令牌无效")
+                    if request.is_websocket:
+                        await self.handle_websocket(request, reader, writer)
+                        return
+                    keep_alive = await self.dispatch(request, writer)
+                except HTTPError as e:
+                    await send_response(writer, e.status, {"error": e.message}, keep_alive=False)
+                    return
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def dispatch(self, request: Request, writer: asyncio.StreamWriter) -> bool:
+        """
+        按路由处理一个HTTP请求
+
+        Returns:
+            响应后是否保持连接
+        """
+        allowed = False
+        for method, pattern, handler in _ROUTES:
+            match = pattern.match(request.path)
+            if match is None:
+                continue
+            if method != request.method:
+                allowed = True
+                continue
+            result = await getattr(self, handler)(request, writer, **match.groupdict())
+            if result is not None:
+                status, body = result
+                await send_response(writer, status, body, request.keep_alive)
+            return request.keep_alive
+        raise HTTPError(405 if allowed else 404, "不支持的请求方法" if allowed else "路径不存在")
+
+    async def stream(self, writer: asyncio.StreamWriter, events: AsyncIterator[Dict[str, Any]]):
+        """把事件以每行一个JSON的流式响应发出，客户端断开时停止事件流"""
+        response = ChunkedResponse(writer)
+        try:
+            await response.start()
+            async for event in events:
+                await response.send_json(event)
+            await response.end()
+        finally:
+            await events.aclose()
+
+    async def health(self, request, writer):
+        return 200, {"ok": True, "connections": self.connections, **self.manager.stats()}
+
+    async def create_session(self, request, writer):
+        session = self.manager.create()
+        if session is None:
+            raise HTTPError(503, "会话数已达上限")
+        return 201, {"id": session.id}
+
+    async def get_session(self, request, writer, session_id):
+        session = self._session(session_id)
+        session.touch()
+        return 200, {**session.summary(), "history": session.messages,
+                     "pending_commands": {command_id: {"command": command, "executor": executor}
+                                          for command_id, (command, executor, _) in session.commands.items()}}
+
+    async def delete_session(self, request, writer, session_id):
+        if not self.manager.remove(session_id):
+            raise HTTPError(404, "会话不存在或已过期")
+        return 200, {"ok": True}
+
+    async def post_message(self, request, writer, session_id):
+        session = self._session(session_id)
+        message = str(request.json().get("message") or "").strip()
+        if not message:
+            raise HTTPError(400, "缺少 message")
+        if session.busy:
+            raise HTTPError(409, "上一条消息还在处理中")
+        await self.stream(writer, session.respond(message))
+
+    async def run_command(self, request, writer, session_id, command_id):
+        session = self._session(session_id)
+        confirm = bool(request.json().get("confirm"))
+        await self.stream(writer, session.execute(command_id, confirm))
+
+    async def confirm(self, request, writer, session_id, confirm_id):
+        session = self._session(session_id)
+        if not session.resolve_confirmation(confirm_id, bool(request.json().get("approve"))):
+            raise HTTPError(404, "没有等待中的确认请求")
+        return 200, {"ok": True}
+
+    async def cancel(self, request, writer, session_id):
+        self._session(session_id).cancel()
+        return 200, {"ok": True}
+
+    async def handle_websocket(self, request: Request, reader: asyncio.StreamReader,
+                               writer: asyncio.StreamWriter):
+        """
+        WebSocket连接：/ws 创建新会话，/sessions/<编号>/ws 连接已有会话
+
+        连接断开时取消其上正在进行的对话和命令，会话保留到空闲超时，可以重新连接。
+        """
+        match = _WEBSOCKET_PATH.match(request.path)
+        if match is None:
+            raise HTTPError(404, "路径不存在")
+        if match.group("session_id"):
+            session = self._session(match.group("session_id"))
+        else:
+            session = self.manager.create()
+            if session is None:
+                raise HTTPError(503, "会话数已达上限")
+
+        websocket = await accept_websocket(request, reader, writer)
+        tasks = set()
+        try:
+            await websocket.send_json({"type": "session", "id": session.id})
+            while True:
+                text = await websocket.receive()
+                session.touch()
+                try:
+                    message = json.loads(text)
+                    task = self._websocket_task(websocket, session, message)
+                except (ValueError, TypeError, AttributeError, KeyError) as e:
+                    await websocket.send_json({"type": "error", "error": f"消息格式错误: {e}"})
+                    continue
+                if task is not None:
+                    task = asyncio.create_task(task)
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        except (WebSocketClosed, ConnectionError):
+            pass
+        finally:
+            for task in list(tasks):
+                task.cancel()
+            await websocket.close()
+
+    def _websocket_task(self, websocket: WebSocket, session: ServerSession, message: Dict[str, Any]):
+        # 返回需要在独立任务中转发的事件流，确认和取消直接处理
+        message_type = message["type"]
+        if message_type == "message":
+            text = str(message.get("text") or "").strip()
+            if not text:
+                raise ValueError("缺少 text")
+            return self._forward(websocket, session.respond(text))
+        if message_type == "execute":
+            return self._forward(websocket, session.execute(str(message["id"]), bool(message.get("confirm"))))
+        if message_type == "confirm":
+            if not session.resolve_confirmation(str(message["id"]), bool(message.get("approve"))):
+                return websocket.send_json({"type": "error", "id": message["id"], "error": "没有等待中的确认请求"})
+            return None
+        if message_type == "cancel":
+            session.cancel()
+            return None
+        raise ValueError(f"未知的消息类型 {message_type}")
+
+    async def _forward(self, websocket: WebSocket, events: AsyncIterator[Dict[str, Any]]):
+        try:
+            async for event in events:
+                await websocket.send_json(event)
+        except (WebSocketClosed, ConnectionError):
+            pass
+        finally:
+            await events.aclose()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+压测模块 - 同时打开大量WebSocket会话，每个会话连续发送若干条消息，统计第一个token的延迟、整轮耗时和失败数
+"""
+
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.protocol import connect_websocket, parse_address, WebSocketClosed
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """取已排序列表的百分位数"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class LoadTest:
+    """压测客户端"""
+
+    def __init__(self, url: str, sessions: int, turns: int, token: str = "", timeout: float = 120):
+        """
+        初始化压测
+
+        Args:
+            url: 服务地址，如 http://127.0.0.1:8700
+            sessions: 同时打开的会话数
+            turns: 每个会话发送的消息数
+            token: 访问令牌
+            timeout: 单轮对话的超时时间（秒）
+        """
+        self.host, self.port = parse_address(url)
+        self.sessions = sessions
+        self.turns = turns
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.timeout = timeout
+        self.first_token: List[float] = []
+        self.turn_times: List[float] = []
+        self.events = 0
+        self.errors: List[str] = []
+
+    async def run_session(self, index: int):
+        """一个会话：连接后依次发送消息，每条等到 done 事件"""
+        try:
+            websocket = await connect_websocket(self.host, self.port, "/ws", self.headers)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+            self.errors.append(f"连接失败: {e}")
+            return
+        try:
+            await websocket.receive()
+            for turn in range(self.turns):
+                start = time.perf_counter()
+                first = None
+                await websocket.send_json({"type": "message", "text": f"压测会话 {index} 第 {turn + 1} 条消息"})
+                while True:
+                    event = json.loads(await asyncio.wait_for(websocket.receive(), self.timeout))
+                    self.events += 1
+                    if event["type"] == "content" and first is None:
+                        first = time.perf_counter() - start
+                    elif event["type"] == "error":
+                        # 出错时这一轮没有 done 事件
+                        self.errors.append(event["error"])
+                        break
+                    elif event["type"] == "done":
+                        break
+                self.turn_times.append(time.perf_counter() - start)
+                if first is not None:
+                    self.first_token.append(first)
+        except (WebSocketClosed, ConnectionError, asyncio.TimeoutError) as e:
+            self.errors.append(f"会话中断: {type(e).__name__}")
+        finally:
+            await websocket.close()
+
+    async def run(self) -> float:
+        """运行全部会话，返回总耗时（秒）"""
+        start = time.perf_counter()
+        await asyncio.gather(*(self.run_session(index) for index in range(self.sessions)))
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> str:
+        """生成压测结果"""
+        first_token = sorted(self.first_token)
+        turn_times = sorted(self.turn_times)
+        lines = [
+            f"会话 {self.sessions} 个，每个 {self.turns} 轮，总耗时 {elapsed:.1f} 秒",
+            f"完成 {len(turn_times)} 轮（{len(turn_times) / elapsed:.1f} 轮/秒），"
+            f"收到 {self.events} 个事件（{self.events / elapsed:.0f} 个/秒），失败 {len(self.errors)} 次",
+        ]
+        for name, values in (("第一个token", first_token), ("整轮耗时", turn_times)):
+            if values:
+                lines.append(f"{name}: p50 {percentile(values, 0.5) * 1000:.0f} ms，"
+                             f"p95 {percentile(values, 0.95) * 1000:.0f} ms，最大 {values[-1] * 1000:.0f} ms")
+        if self.errors:
+            lines.append(f"第一个错误: {self.errors[0]}")
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    """压测入口"""
+    parser = argparse.ArgumentParser(prog="python -m server.load_test", description="Savvy 服务端压测")
+    parser.add_argument("--url", default="http://127.0.0.1:8700", help="服务地址")
+    parser.add_argument("--sessions", type=int, default=200, help="同时打开的会话数")
+    parser.add_argument("--turns", type=int, default=3, help="每个会话发送的消息数")
+    parser.add_argument("--token", default=os.environ.get("SAVVY_SERVER_TOKEN", ""), help="访问令牌")
+    args = parser.parse_args(argv)
+
+    test = LoadTest(args.url, args.sessions, args.turns, args.token)
+    elapsed = asyncio.run(test.run())
+    print(test.report(elapsed))
+    return 1 if test.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模拟大模型模块 - 兼容OpenAI /v1/chat/completions 流式接口的本地服务，按设定的延迟逐个返回token，用于服务端压测
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import itertools
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.protocol import HTTPError, ChunkedResponse, read_request, send_response, MAX_HEADER_SIZE
+
+
+class MockLLM:
+    """
+    模拟的大模型服务
+
+    回复由用户消息的回显和若干段填充文本组成，按比例在结尾附带一个PowerShell命令块；
+    流式回复的每个片段为一个token，最后一个片段携带用量。不支持工具调用，忽略请求中的 tools。
+    """
+
+    def __init__(self, tokens: int = 40, token_delay: float = 0.02, first_token_delay: float = 0.2,
+                 command_ratio: float = 0.0):
+        """
+        初始化模拟服务
+
+        Args:
+            tokens: 每条回复的token数
+            token_delay: 相邻两个token的间隔（秒）
+            first_token_delay: 收到请求到第一个token的延迟（秒）
+            command_ratio: 回复中附带命令块的比例，0到1之间
+        """
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.command_ratio = command_ratio
+        self.requests = 0
+        self._ids = itertools.count(1)
+
+    def reply_tokens(self, messages):
+        """生成一条回复的token列表"""
+        last = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        tokens = [f"收到：{last[:40]}。"]
+        tokens.extend(f"模拟回复第{index}段。" for index in range(1, max(self.tokens - 1, 0) + 1))
+        if random.random() < self.command_ratio:
+            tokens.append("\n[POWERSHELL_COMMAND]\nGet-Date\n[END_COMMAND]\n")
+        return tokens
+
+    def _chunk(self, completion_id, model, delta=None, usage=None):
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": None}],
+            "usage": usage
+        }
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接上的请求"""
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as e:
+                    await send_response(writer, e.status, {"error": {"message": e.message}}, keep_alive=False)
+                    return
+                if request is None:
+                    return
+                if request.method != "POST" or not request.path.endswith("/chat/completions"):
+                    await send_response(writer, 404, {"error": {"message": "not found"}}, request.keep_alive)
+                else:
+                    await self.complete(request, writer)
+                if not request.keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def complete(self, request, writer):
+        """返回一次补全，请求中 stream 为真时以SSE逐个发送token"""
+        self.requests += 1
+        body = request.json()
+        messages = body.get("messages") or []
+        model = body.get("model", "mock")
+        completion_id = f"chatcmpl-mock-{next(self._ids)}"
+        tokens = self.reply_tokens(messages)
+        usage = {"prompt_tokens": sum(len(str(m.get("content") or "")) for m in messages) // 2,
+                 "completion_tokens": len(tokens)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        await asyncio.sleep(self.first_token_delay)
+        if not body.get("stream"):
+            await send_response(writer, 200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+                "usage": usage
+            }, request.keep_alive)
+            return
+
+        response = ChunkedResponse(writer, "text/event-stream")
+        await response.start()
+
+        async def send(chunk):
+            await response.send(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+
+        await send(self._chunk(completion_id, model, {"role": "assistant", "content": ""}))
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(self.token_delay)
+            await send(self._chunk(completion_id, model, {"content": token}))
+        final = self._chunk(completion_id, model, {})
+        final["choices"][0]["finish_reason"] = "stop"
+        await send(final)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await send(self._chunk(completion_id, model, usage=usage))
+        await response.send(b"data: [DONE]\n\n")
+        await response.end()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        """
+        开始监听
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示由系统分配
+
+        Returns:
+            asyncio服务对象
+        """
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_SIZE, backlog=1024)
+
+
+def main(argv=None):
+    """单独运行模拟服务"""
+    parser = argparse.ArgumentParser(description="Savvy 压测用的模拟大模型服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8701, help="监听端口")
+    parser.add_argument("--tokens", type=int, default=40, help="每条回复的token数")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="token间隔（秒）")
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="第一个token的延迟（秒）")
+    parser.add_argument("--command-ratio", type=float, default=0.0, help="回复中附带命令块的比例")
+    args = parser.parse_args(argv)
+
+    mock = MockLLM(args.tokens, args.token_delay, args.first_token_delay, args.command_ratio)
+
+    async def serve():
+        server = await mock.start(args.host, args.port)
+        print(f"模拟大模型服务: http://{args.host}:{args.port}/v1")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
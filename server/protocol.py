@@ -0,0 +1,391 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+HTTP/WebSocket协议模块 - 基于asyncio流的最小HTTP/1.1服务端（支持keep-alive和分块传输）和RFC 6455 WebSocket收发，不依赖第三方库
+"""
+
+import json
+import base64
+import asyncio
+import hashlib
+import os
+import struct
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+
+# 请求头和请求体的大小上限
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+# 单条WebSocket消息的大小上限
+MAX_MESSAGE_SIZE = 1024 * 1024
+
+_WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+_REASONS = {
+    101: "Switching Protocols", 200: "OK", 201: "Created", 204: "No Content",
+    400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+    500: "Internal Server Error", 503: "Service Unavailable"
+}
+
+# WebSocket操作码
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class HTTPError(Exception):
+    """处理请求时出错，按状态码返回错误信息"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    """一个HTTP请求"""
+
+    def __init__(self, method: str, target: str, version: str, headers: Dict[str, str], body: bytes = b""):
+        """
+        初始化请求
+
+        Args:
+            method: 请求方法
+            target: 请求目标（路径和查询字符串）
+            version: HTTP版本，如 HTTP/1.1
+            headers: 请求头，键为小写
+            body: 请求体
+        """
+        self.method = method
+        self.version = version
+        self.headers = headers
+        self.body = body
+        parts = urlsplit(target)
+        self.path = parts.path
+        self.query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+
+    @property
+    def keep_alive(self) -> bool:
+        """响应后是否保持连接"""
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    @property
+    def is_websocket(self) -> bool:
+        """是否为WebSocket升级请求"""
+        return (self.headers.get("upgrade", "").lower() == "websocket"
+                and "sec-websocket-key" in self.headers)
+
+    def json(self) -> Dict[str, Any]:
+        """把请求体解析为JSON对象，请求体为空时返回空字典"""
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError as e:
+            raise HTTPError(400, f"请求体不是有效的JSON: {e}")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "请求体应为JSON对象")
+        return data
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """
+    读取一个HTTP请求
+
+    Args:
+        reader: 连接的读取流
+
+    Returns:
+        请求，连接已关闭时返回None
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise HTTPError(400, "请求头不完整")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "请求头过大")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "请求行格式错误")
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(400, "不支持分块传输的请求体")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPError(400, "Content-Length 格式错误")
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(413, "请求体过大")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target, version, headers, body)
+
+
+def _head(status: int, headers: Dict[str, str]) -> bytes:
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def send_response(writer: asyncio.StreamWriter, status: int, body: Any = None,
+                        keep_alive: bool = True, content_type: str = "application/json; charset=utf-8"):
+    """
+    发送一个完整的响应
+
+    Args:
+        writer: 连接的写入流
+        status: 状态码
+        body: 响应体，字典或列表按JSON编码，字符串按UTF-8编码
+        keep_alive: 响应后是否保持连接
+        content_type: 响应体类型
+    """
+    if body is None:
+        data = b""
+    elif isinstance(body, bytes):
+        data = body
+    elif isinstance(body, str):
+        data = body.encode("utf-8")
+    else:
+        data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+    headers = {"Content-Length": str(len(data)), "Connection": "keep-alive" if keep_alive else "close"}
+    if data:
+        headers["Content-Type"] = content_type
+    writer.write(_head(status, headers) + data)
+    await writer.drain()
+
+
+class ChunkedResponse:
+    """
+    分块传输的流式响应
+
+    每次 send 写入一块并等待发送缓冲区排空，客户端读取慢时发送方随之等待。
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, content_type: str = "application/x-ndjson; charset=utf-8"):
+        """
+        初始化流式响应
+
+        Args:
+            writer: 连接的写入流
+            content_type: 响应体类型
+        """
+        self.writer = writer
+        self.content_type = content_type
+        self.started = False
+
+    async def start(self, status: int = 200, headers: Optional[Dict[str, str]] = None):
+        """发送响应头"""
+        head = {"Content-Type": self.content_type, "Transfer-Encoding": "chunked",
+                "Cache-Control": "no-cache", **(headers or {})}
+        self.writer.write(_head(status, head))
+        self.started = True
+        await self.writer.drain()
+
+    async def send(self, data: bytes):
+        """发送一块数据"""
+        if data:
+            self.writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+            await self.writer.drain()
+
+    async def send_json(self, value: Any):
+        """以一行JSON的形式发送一个对象"""
+        await self.send(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+
+    async def end(self):
+        """结束响应"""
+        self.writer.write(b"0\r\n\r\n")
+        await self.writer.drain()
+
+
+class WebSocketClosed(Exception):
+    """WebSocket连接已关闭"""
+
+
+class WebSocket:
+    """
+    WebSocket连接
+
+    服务端和客户端共用：客户端发送的帧需要掩码。发送加锁，多个协程可以同时发送；
+    只应有一个协程接收。
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, client: bool = False):
+        """
+        初始化WebSocket连接
+
+        Args:
+            reader: 连接的读取流
+            writer: 连接的写入流
+            client: 是否为客户端一侧
+        """
+        self.reader = reader
+        self.writer = writer
+        self.client = client
+        self.closed = False
+        self._send_lock = asyncio.Lock()
+
+    async def _send_frame(self, opcode: int, payload: bytes):
+        length = len(payload)
+        mask_bit = 0x80 if self.client else 0
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, mask_bit | length)
+        elif length < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, mask_bit | 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, mask_bit | 127, length)
+        if self.client:
+            mask = os.urandom(4)
+            header += mask
+            payload = _apply_mask(payload, mask)
+        async with self._send_lock:
+            if self.closed and opcode != OP_CLOSE:
+                raise WebSocketClosed()
+            self.writer.write(header + payload)
+            await self.writer.drain()
+
+    async def send(self, text: str):
+        """发送一条文本消息"""
+        await self._send_frame(OP_TEXT, text.encode("utf-8"))
+
+    async def send_json(self, value: Any):
+        """以JSON文本消息发送一个对象"""
+        await self.send(json.dumps(value, ensure_ascii=False, default=str))
+
+    async def receive(self) -> str:
+        """
+        接收一条文本消息，自动回复ping
+
+        Returns:
+            消息文本
+
+        Raises:
+            WebSocketClosed: 对方关闭了连接
+        """
+        fragments = []
+        size = 0
+        while True:
+            try:
+                first, second = await self.reader.readexactly(2)
+                length = second & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", await self.reader.readexactly(2))[0]
+                elif length == 127:
+                    length = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+                if size + length > MAX_MESSAGE_SIZE:
+                    await self.close(1009)
+                    raise WebSocketClosed()
+                mask = await self.reader.readexactly(4) if second & 0x80 else None
+                payload = await self.reader.readexactly(length) if length else b""
+            except (asyncio.IncompleteReadError, ConnectionError):
+                self.closed = True
+                raise WebSocketClosed()
+            if mask:
+                payload = _apply_mask(payload, mask)
+
+            opcode = first & 0x0F
+            if opcode == OP_CLOSE:
+                await self.close()
+                raise WebSocketClosed()
+            if opcode == OP_PING:
+                await self._send_frame(OP_PONG, payload)
+                continue
+            if opcode == OP_PONG:
+                continue
+            fragments.append(payload)
+            size += length
+            if first & 0x80:
+                return b"".join(fragments).decode("utf-8", errors="replace")
+
+    async def close(self, code: int = 1000):
+        """发送关闭帧并关闭连接"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self._send_frame(OP_CLOSE, struct.pack("!H", code))
+        except (ConnectionError, RuntimeError):
+            pass
+        self.writer.close()
+
+
+def _apply_mask(payload: bytes, mask: bytes) -> bytes:
+    # 按整数一次异或，避免逐字节循环
+    length = len(payload)
+    if not length:
+        return payload
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+
+
+async def accept_websocket(request: Request, reader: asyncio.StreamReader,
+                           writer: asyncio.StreamWriter) -> WebSocket:
+    """
+    完成WebSocket握手
+
+    Args:
+        request: 升级请求
+        reader: 连接的读取流
+        writer: 连接的写入流
+
+    Returns:
+        服务端一侧的WebSocket连接
+    """
+    key = request.headers["sec-websocket-key"].encode("latin-1")
+    accept = base64.b64encode(hashlib.sha1(key + _WS_GUID).digest()).decode("ascii")
+    writer.write(_head(101, {"Upgrade": "websocket", "Connection": "Upgrade", "Sec-WebSocket-Accept": accept}))
+    await writer.drain()
+    return WebSocket(reader, writer)
+
+
+async def connect_websocket(host: str, port: int, path: str = "/",
+                            headers: Optional[Dict[str, str]] = None) -> WebSocket:
+    """
+    连接WebSocket服务端，供压测和测试客户端使用
+
+    Args:
+        host: 主机名
+        port: 端口
+        path: 请求路径
+        headers: 额外的请求头
+
+    Returns:
+        客户端一侧的WebSocket连接
+    """
+    reader, writer = await asyncio.open_connection(host, port, limit=MAX_HEADER_SIZE)
+    key = base64.b64encode(os.urandom(16)).decode("ascii")
+    lines = [f"GET {path} HTTP/1.1", f"Host: {host}:{port}", "Upgrade: websocket", "Connection: Upgrade",
+             f"Sec-WebSocket-Key: {key}", "Sec-WebSocket-Version: 13"]
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = head.split(b" ", 2)[1]
+    if status != b"101":
+        writer.close()
+        raise ConnectionError(f"WebSocket握手失败: {head.splitlines()[0].decode('latin-1')}")
+    return WebSocket(reader, writer, client=True)
+
+
+def parse_address(url: str) -> Tuple[str, int]:
+    """从 http://host:port 或 ws://host:port 形式的地址中取出主机和端口"""
+    parts = urlsplit(url if "//" in url else f"//{url}")
+    return parts.hostname or "127.0.0.1", parts.port or 80
@@ -0,0 +1,418 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+服务端会话模块 - 每个会话独立持有对话流程、聊天记录、待执行命令和确认请求；阻塞的对话和命令在线程池中运行，事件经有界队列交给事件循环
+"""
+
+import sys
+import time
+import asyncio
+import secrets
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import app_config
+from agent.chat_session import ChatSession, timestamp
+from agent.worker_pool import RemoteChatSession
+from agent.template_index import get_template_index
+from agent.intent_matcher import get_intent_matcher
+from agent.safety_screen import get_safety_screen
+from agent import tracing
+
+
+# 线程一侧事件流结束的标记
+_END = object()
+
+
+class ServerSession:
+    """
+    一个客户端的对话会话
+
+    同一会话同时只处理一轮对话，命令只能执行本会话中由回复提出的命令（按编号引用）；
+    代理循环中需要确认的工具调用以 confirm 事件发给客户端，等待 resolve_confirmation。
+    """
+
+    def __init__(self, session_id: str, manager: "SessionManager"):
+        """
+        初始化会话
+
+        Args:
+            session_id: 会话编号
+            manager: 所属的会话管理器
+        """
+        self.id = session_id
+        self.manager = manager
+        if manager.worker_pool is not None:
+            self.chat = RemoteChatSession(manager.worker_pool, manager.api_manager, approve=self.approve)
+        else:
+            self.chat = ChatSession(api_manager=manager.api_manager, approve=self.approve)
+        self.messages: List[Dict[str, Any]] = []
+        self.created = time.time()
+        self.last_active = self.created
+        self.turn_lock = asyncio.Lock()
+        # 回复中提出的命令：编号 -> (命令, 执行器, 请求)
+        self.commands: Dict[str, Tuple[str, str, Optional[str]]] = {}
+        # 等待客户端确认的工具调用：编号 -> Future
+        self.confirmations: Dict[str, Future] = {}
+        # 正在进行的对话和命令的取消事件
+        self._cancel_events = set()
+        # 当前一轮对话在线程一侧的事件发送函数，确认请求经它发给客户端
+        self._emit: Optional[Callable[[Dict[str, Any]], bool]] = None
+        self._ids = itertools.count(1)
+
+    @property
+    def busy(self) -> bool:
+        """是否正在处理一轮对话"""
+        return self.turn_lock.locked()
+
+    def touch(self):
+        """记录会话最近一次活动的时间"""
+        self.last_active = time.time()
+
+    def summary(self) -> Dict[str, Any]:
+        """会话概况"""
+        return {"id": self.id, "created": self.created, "last_active": self.last_active,
+                "messages": len(self.messages), "busy": self.busy, "commands": len(self.commands)}
+
+    def register_command(self, command: str, executor: str, request: Optional[str]) -> str:
+        """记录回复中提出的命令，返回供客户端引用的编号"""
+        command_id = f"c{next(self._ids)}"
+        self.commands[command_id] = (command, executor, request)
+        return command_id
+
+    def approve(self, command: str, executor: str) -> Optional[str]:
+        """
+        代理循环执行工具调用前的检查，在线程池中调用；需要确认时等待客户端回复
+
+        Returns:
+            拒绝原因，可以执行时返回None
+        """
+        if not self.manager.allow_execution:
+            return "服务端未开启命令执行"
+        verdict = self.chat.check_command(command)
+        if verdict is None or verdict.allowed:
+            return None
+        reasons = "、".join(verdict.reasons)
+        if verdict.denied:
+            return reasons
+
+        confirm_id = f"q{next(self._ids)}"
+        future = Future()
+        self.confirmations[confirm_id] = future
+        try:
+            emit = self._emit
+            if emit is None or not emit({"type": "confirm", "id": confirm_id, "command": command,
+                                         "executor": executor, "reasons": verdict.reasons}):
+                return f"需要确认（{reasons}）"
+            approved = future.result(timeout=self.manager.confirm_timeout)
+        except FutureTimeoutError:
+            return f"等待确认超时（{reasons}）"
+        finally:
+            self.confirmations.pop(confirm_id, None)
+        return None if approved else f"用户拒绝执行（{reasons}）"
+
+    def resolve_confirmation(self, confirm_id: str, approved: bool) -> bool:
+        """
+        回复一个确认请求
+
+        Args:
+            confirm_id: confirm 事件中的编号
+            approved: 是否允许执行
+
+        Returns:
+            是否有对应的确认请求
+        """
+        future = self.confirmations.get(confirm_id)
+        if future is None or future.done():
+            return False
+        future.set_result(bool(approved))
+        return True
+
+    def cancel(self):
+        """取消正在进行的对话和命令，拒绝所有等待中的确认"""
+        for event in list(self._cancel_events):
+            event.set()
+        for confirm_id in list(self.confirmations):
+            self.resolve_confirmation(confirm_id, False)
+
+    def _turn_events(self, user_message: str, emit, cancel_event: threading.Event) -> Iterator[Dict[str, Any]]:
+        # 在线程池中运行；取消事件交给代理循环，等待命令时取消也能立即结束命令
+        self._emit = emit
+        try:
+            for event in self.chat.respond(user_message, self.messages, cancel_event):
+                if event["type"] != "tool_wait":
+                    yield event
+        finally:
+            self._emit = None
+
+    async def respond(self, user_message: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        处理一条用户消息，事件同 ChatSession.respond；命令不会自动执行，command 事件带有编号，
+        由客户端决定是否执行
+
+        Args:
+            user_message: 用户消息
+
+        Yields:
+            事件字典，另有 {"type": "queued"} 表示正在等待空闲的处理线程，
+            {"type": "confirm", "id", "command", "executor", "reasons"} 表示工具调用需要确认
+        """
+        if self.turn_lock.locked():
+            yield {"type": "error", "error": "上一条消息还在处理中"}
+            return
+        # 每个事件推迟到下一个事件到达时再交出，最后一个事件（done或error）在释放锁之后交出，
+        # 客户端收到后立即发送的下一条消息不会被当作并发请求
+        last = None
+        async with self.turn_lock:
+            self.touch()
+            self.messages.append({"sender": "user", "content": user_message, "timestamp": timestamp()})
+            turn_span = tracing.span("server.turn", "server", session=self.id)
+            events = self.manager.run_in_thread(
+                lambda emit, cancel_event: self._turn_events(user_message, emit, cancel_event),
+                self.manager.turn_slots, self._cancel_events)
+            try:
+                async for event in events:
+                    event_type = event["type"]
+                    if event_type == "tool_result":
+                        event = {key: value for key, value in event.items() if key != "message"}
+                    elif event_type == "command":
+                        event["id"] = self.register_command(event["command"], event["executor"], event["request"])
+                    elif event_type == "cached_command" and event["mode"] == "suggest":
+                        suggested = self.chat.take_suggested_command()
+                        if suggested is not None:
+                            event["id"] = self.register_command(*suggested)
+                    if last is not None:
+                        yield last
+                    last = event
+            finally:
+                await events.aclose()
+                turn_span.end()
+                self.touch()
+        if last is not None:
+            yield last
+
+    async def execute(self, command_id: str, confirm: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """
+        执行回复中提出的命令，事件同 execute_command_realtime，结束后写入命令缓存和聊天记录
+
+        Args:
+            command_id: command 事件中的编号
+            confirm: 需要确认的命令是否已由用户确认
+
+        Yields:
+            事件字典，被拦截或需要确认时为 {"type": "error", "id", "error", "reasons"}
+        """
+        entry = self.commands.get(command_id)
+        if entry is None:
+            yield {"type": "error", "id": command_id, "error": "没有这个命令"}
+            return
+        if not self.manager.allow_execution:
+            yield {"type": "error", "id": command_id, "error": "服务端未开启命令执行"}
+            return
+        command, executor, request = entry
+        verdict = self.chat.check_command(command)
+        if verdict is not None and not verdict.allowed and (verdict.denied or not confirm):
+            error = "命令被安全策略拦截" if verdict.denied else "命令需要确认，请带上 confirm 重新执行"
+            yield {"type": "error", "id": command_id, "error": error, "reasons": verdict.reasons,
+                   "denied": verdict.denied}
+            return
+
+        # 同一命令只执行一次
+        del self.commands[command_id]
+        self.touch()
+        api_manager = self.manager.api_manager
+        output = {"stdout": [], "stderr": []}
+        result = None
+        events = self.manager.run_in_thread(
+            lambda emit, cancel_event: api_manager.execute_command_realtime(
+                command, executor, app_config.get("execution.timeout", 300), cancel_event=cancel_event,
+                kill_grace=app_config.get("execution.kill_grace_seconds", 3)),
+            self.manager.command_slots, self._cancel_events)
+        try:
+            async for event in events:
+                if event["type"] in ("stdout", "stderr"):
+                    output[event["type"]].extend(event["lines"])
+                elif event["type"] in ("result", "error"):
+                    result = event
+                yield {**event, "id": command_id}
+        finally:
+            await events.aclose()
+            self.touch()
+            if result is None:
+                result = {"type": "error", "success": False, "error": "命令已取消", "is_cancelled": True}
+            self.chat.record_result(request, command, executor, result)
+            self.messages.append({
+                "sender": "command",
+                "content": command,
+                "timestamp": timestamp(),
+                "job_id": None,
+                "executor": executor,
+                "request": request,
+                "output": [[stream, lines] for stream, lines in output.items() if lines],
+                "result": result,
+                "status": "finished"
+            })
+
+class SessionManager:
+    """
+    会话管理器
+
+    负责会话的创建、查找和空闲回收，并用线程池运行阻塞的对话流程和命令。
+    同时进行的对话轮数和命令数分别有上限，超过时排队；线程一侧产生事件的速度受有界队列限制，
+    客户端读得慢时对话流程随之暂停，而不是在内存中堆积。
+    """
+
+    def __init__(self, api_manager, max_sessions: int = 1000, max_active_turns: int = 64,
+                 max_running_commands: int = 8, event_queue_size: int = 256,
+                 idle_timeout: float = 1800, confirm_timeout: float = 60, allow_execution: bool = True,
+                 worker_pool=None):
+        """
+        初始化会话管理器
+
+        Args:
+            api_manager: 所有会话共用的 DeepSeekAPIManager 实例
+            max_sessions: 最多同时存在的会话数
+            max_active_turns: 最多同时处理的对话轮数
+            max_running_commands: 最多同时执行的命令数
+            event_queue_size: 每个事件流在线程和事件循环之间最多缓存的事件数
+            idle_timeout: 会话空闲多久后回收（秒）
+            confirm_timeout: 等待客户端确认工具调用的时间（秒）
+            allow_execution: 是否允许执行命令
+            worker_pool: 对话工作进程池，设置时各会话的模型调用分散到多个进程中
+        """
+        self.api_manager = api_manager
+        self.max_sessions = max_sessions
+        self.event_queue_size = event_queue_size
+        self.idle_timeout = idle_timeout
+        self.confirm_timeout = confirm_timeout
+        self.allow_execution = allow_execution
+        self.worker_pool = worker_pool
+        self.sessions: Dict[str, ServerSession] = {}
+        self.turn_slots = asyncio.Semaphore(max_active_turns)
+        self.command_slots = asyncio.Semaphore(max_running_commands)
+        self.executor = ThreadPoolExecutor(max_workers=max_active_turns + max_running_commands,
+                                           thread_name_prefix="session")
+        self.active = 0
+
+    def warm_up(self):
+        """预先创建模板索引、意图匹配器和安全规则，避免第一批请求在多个线程中同时加载"""
+        get_template_index()
+        get_intent_matcher()
+        get_safety_screen()
+
+    def create(self) -> Optional[ServerSession]:
+        """
+        创建会话
+
+        Returns:
+            新会话，已达到会话数上限时返回None
+        """
+        if len(self.sessions) >= self.max_sessions:
+            return None
+        session = ServerSession(secrets.token_urlsafe(12), self)
+        self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[ServerSession]:
+        """按编号查找会话"""
+        return self.sessions.get(session_id)
+
+    def remove(self, session_id: str) -> bool:
+        """删除会话并取消其中正在进行的对话和命令"""
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.cancel()
+        return True
+
+    def expire_idle(self) -> int:
+        """回收空闲超时的会话，返回回收的数量"""
+        deadline = time.time() - self.idle_timeout
+        expired = [session.id for session in self.sessions.values()
+                   if session.last_active < deadline and not session.busy]
+        for session_id in expired:
+            self.remove(session_id)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        """会话和线程的使用情况"""
+        stats = {"sessions": len(self.sessions), "busy_sessions": sum(s.busy for s in self.sessions.values()),
+                 "active_streams": self.active}
+        if self.worker_pool is not None:
+            stats["workers"] = self.worker_pool.stats()
+        return stats
+
+    async def run_in_thread(self, make_events: Callable[..., Iterator[Dict[str, Any]]],
+                            slots: asyncio.Semaphore, cancel_events: set) -> AsyncIterator[Dict[str, Any]]:
+        """
+        在线程池中运行一个产生事件的生成器，把事件逐个交给事件循环
+
+        Args:
+            make_events: 在线程中调用，参数为发送函数（供生成器之外的额外事件使用，返回False表示已取消）
+                         和取消事件，返回事件生成器
+            slots: 限制并发数的信号量，没有空位时先产生 queued 事件
+            cancel_events: 取消事件登记的集合，会话取消时设置其中所有事件
+
+        Yields:
+            事件字典；调用方提前停止迭代时生成器被关闭，正在执行的命令随之结束
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        # 线程每放入一个事件占一个空位，事件循环取出后归还
+        room = threading.Semaphore(self.event_queue_size)
+        cancel_event = threading.Event()
+
+        def emit(event):
+            while not room.acquire(timeout=0.1):
+                if cancel_event.is_set():
+                    return False
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+            return True
+
+        def produce():
+            events = None
+            try:
+                events = make_events(emit, cancel_event)
+                for event in events:
+                    if cancel_event.is_set() or not emit(event):
+                        break
+            except Exception as e:
+                emit({"type": "error", "error": str(e)})
+            finally:
+                if events is not None:
+                    events.close()
+                loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+        if slots.locked():
+            yield {"type": "queued"}
+        async with slots:
+            cancel_events.add(cancel_event)
+            self.active += 1
+            loop.run_in_executor(self.executor, produce)
+            try:
+                while True:
+                    event = await queue.get()
+                    if event is _END:
+                        break
+                    room.release()
+                    yield event
+            finally:
+                # 正常结束时线程已退出；提前停止时通知线程关闭生成器，不等待它结束
+                cancel_event.set()
+                cancel_events.discard(cancel_event)
+                self.active -= 1
+
+    def shutdown(self):
+        """取消所有会话，停止线程池"""
+        for session_id in list(self.sessions):
+            self.remove(session_id)
+        # cancel_futures 需要 Python 3.9
+        if sys.version_info >= (3, 9):
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            self.executor.shutdown(wait=False)
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
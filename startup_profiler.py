@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+启动耗时分析模块 - 以 --import-time 参数或环境变量 SAVVY_IMPORT_TIME 启动时，记录每个模块的导入耗时（格式同 python -X importtime）和启动各阶段的时间点
+"""
+
+import os
+import sys
+import time
+import threading
+from datetime import datetime
+from typing import List, Tuple
+
+
+class StartupProfiler:
+    """
+    启动耗时分析器
+
+    安装后作为 sys.meta_path 的第一个查找器，把其余查找器找到的模块的 exec_module 包装为计时版本；
+    嵌套导入按线程分别统计，得到每个模块自身和累计的导入耗时。内置和冻结模块的加载器是共享的类，不做统计。
+    """
+
+    def __init__(self, log_dir: str = "logs", log_file: str = "import_times.log"):
+        """
+        初始化启动耗时分析器
+
+        Args:
+            log_dir: 日志文件夹名称
+            log_file: 完整导入耗时列表的文件名
+        """
+        # 获取项目根目录
+        self.project_root = os.path.dirname(os.path.abspath(__file__))
+        self.log_dir = os.path.join(self.project_root, log_dir)
+        self.log_file = os.path.join(self.log_dir, log_file)
+        self.start = time.perf_counter()
+        # (嵌套深度, 模块名, 自身耗时, 累计耗时, 线程名)，耗时单位为微秒，按导入完成的先后排列
+        self.entries: List[Tuple[int, str, int, int, str]] = []
+        # (阶段名称, 距安装时的毫秒数)
+        self.marks: List[Tuple[str, float]] = []
+        self._local = threading.local()
+        self._finding = set()
+        self._lock = threading.Lock()
+
+    def install(self):
+        """开始记录导入耗时，应在导入其他模块之前调用"""
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        """停止记录导入耗时"""
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        # 交给其余查找器查找，避免递归进入自身
+        if fullname in self._finding:
+            return None
+        self._finding.add(fullname)
+        try:
+            spec = None
+            for finder in sys.meta_path:
+                find = getattr(finder, "find_spec", None)
+                if finder is self or find is None:
+                    continue
+                spec = find(fullname, path, target)
+                if spec is not None:
+                    break
+        finally:
+            self._finding.discard(fullname)
+        if spec is None:
+            return None
+
+        loader = spec.loader
+        if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module"):
+            try:
+                loader.exec_module = self._timed(fullname, loader.exec_module)
+            except AttributeError:
+                pass
+        return spec
+
+    def _timed(self, name, exec_module):
+        def exec_module_timed(module):
+            stack = getattr(self._local, "stack", None)
+            if stack is None:
+                stack = self._local.stack = []
+            # 栈中每层累计子模块的导入耗时，用于计算自身耗时
+            stack.append(0)
+            start = time.perf_counter_ns()
+            try:
+                exec_module(module)
+            finally:
+                cumulative = time.perf_counter_ns() - start
+                children = stack.pop()
+                if stack:
+                    stack[-1] += cumulative
+                with self._lock:
+                    self.entries.append((len(stack), name, (cumulative - children) // 1000,
+                                         cumulative // 1000, threading.current_thread().name))
+        return exec_module_timed
+
+    def mark(self, phase: str):
+        """
+        记录一个启动阶段完成的时间点
+
+        Args:
+            phase: 阶段名称
+        """
+        with self._lock:
+            self.marks.append((phase, (time.perf_counter() - self.start) * 1000))
+
+    def format_entries(self) -> str:
+        """按 python -X importtime 的格式列出全部导入耗时"""
+        with self._lock:
+            entries = list(self.entries)
+        lines = ["import time: self [us] | cumulative | imported package"]
+        for depth, name, self_us, cumulative_us, thread in entries:
+            suffix = "" if thread == "MainThread" else f"  [{thread}]"
+            lines.append(f"import time: {self_us:>9} | {cumulative_us:>10} | {'  ' * depth}{name}{suffix}")
+        return "\n".join(lines)
+
+    def format_summary(self, top: int = 10) -> str:
+        """
+        生成启动耗时摘要：各阶段的时间点和累计耗时最多的顶层导入
+
+        Args:
+            top: 列出的顶层导入数
+
+        Returns:
+            摘要文本
+        """
+        with self._lock:
+            entries = list(self.entries)
+            marks = list(self.marks)
+        lines = ["启动耗时:"]
+        lines.extend(f"  {elapsed:8.1f} ms  {phase}" for phase, elapsed in marks)
+        top_level = sorted((entry for entry in entries if entry[0] == 0), key=lambda entry: entry[3], reverse=True)
+        if top_level:
+            total = sum(entry[3] for entry in top_level if entry[4] == "MainThread")
+            lines.append(f"共导入 {len(entries)} 个模块，主线程导入耗时 {total / 1000:.1f} ms，最慢的顶层导入:")
+            lines.extend(f"  {cumulative / 1000:8.1f} ms  {name}" + ("" if thread == "MainThread" else f"（{thread}）")
+                         for _, name, _, cumulative, thread in top_level[:top])
+        return "\n".join(lines)
+
+    def report(self):
+        """打印启动耗时摘要，并把完整的导入耗时列表写入日志文件"""
+        print(self.format_summary())
+        try:
+            os.makedirs(self.log_dir, exist_ok=True)
+            with open(self.log_file, 'w', encoding='utf-8') as f:
+                f.write(f"# {datetime.now().isoformat(timespec='seconds')}\n")
+                f.write(self.format_entries() + "\n")
+            print(f"完整导入耗时已写入: {self.log_file}")
+        except OSError as e:
+            print(f"写入导入耗时失败: {e}")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+一轮对话写入命令缓存的测试
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent import chat_session
+from agent.chat_session import ChatSession
+from agent.command_cache import CommandCache
+
+
+class ScriptedAPIManager:
+    """按给定的工具结果和回复文本模拟代理循环"""
+
+    def __init__(self, commands, content=""):
+        self.commands = commands
+        self.content = content
+
+    def format_messages(self, system_prompt, user_messages, assistant_messages=None, current_user_message=None):
+        return [{"role": "user", "content": current_user_message}]
+
+    def run_agent_loop(self, api_messages, tools, tool_loaders, **kwargs):
+        yield {"type": "step", "step": 1}
+        for command in self.commands:
+            result = {"type": "result", "success": True, "output": "ok", "usage": {"wall_time": 0.1}}
+            yield {"type": "tool_result", "command": command, "executor": "powershell",
+                   "result": result, "digest": "ok"}
+        if self.content:
+            yield {"type": "content", "text": self.content}
+        tool_calls = [{"name": "run", "arguments": {}} for _ in self.commands]
+        yield {"type": "done", "reason": "stop", "content": self.content, "tool_calls": tool_calls,
+               "steps": 1, "tokens": 0}
+
+
+class CommandCacheTurnTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = CommandCache(cache_dir=self.tmp.name)
+        patcher = mock.patch.object(chat_session, "command_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def reply(self, commands, messages, content=""):
+        session = ChatSession(ScriptedAPIManager(commands, content))
+        session.build_tools = lambda query: None
+        return list(session.generate_reply(messages[-1]["content"], messages))
+
+    def test_single_command_turn_is_cached(self):
+        self.reply(["Get-ChildItem"], [{"sender": "user", "content": "列出文件"}])
+        entry = self.cache.lookup("列出文件")
+        self.assertIsNotNone(entry)
+        self.assertEqual(entry["command"], "Get-ChildItem")
+
+    def test_multi_step_turn_is_not_cached(self):
+        self.reply(["Get-ChildItem", "Get-Date"], [{"sender": "user", "content": "列出文件和时间"}])
+        self.assertIsNone(self.cache.lookup("列出文件和时间"))
+
+    def test_turn_with_earlier_messages_is_not_cached(self):
+        messages = [
+            {"sender": "user", "content": "查看 a.txt"},
+            {"sender": "ai", "content": "Get-Content a.txt"},
+            {"sender": "user", "content": "删除那个文件"},
+        ]
+        self.reply(["Remove-Item a.txt"], messages)
+        self.assertIsNone(self.cache.lookup("删除那个文件"))
+
+    def test_welcome_message_is_not_context(self):
+        messages = [
+            {"sender": "ai", "content": "您好！"},
+            {"sender": "user", "content": "列出文件"},
+        ]
+        self.reply(["Get-ChildItem"], messages)
+        self.assertIsNotNone(self.cache.lookup("列出文件"))
+
+    def test_extracted_command_carries_request_only_without_context(self):
+        content = "[POWERSHELL_COMMAND]\nGet-Date\n[END_COMMAND]"
+        events = self.reply([], [{"sender": "user", "content": "现在几点"}], content)
+        command = next(event for event in events if event["type"] == "command")
+        self.assertEqual(command["request"], "现在几点")
+
+        messages = [
+            {"sender": "user", "content": "现在几点"},
+            {"sender": "ai", "content": content},
+            {"sender": "user", "content": "再执行一次"},
+        ]
+        events = self.reply([], messages, content)
+        command = next(event for event in events if event["type"] == "command")
+        self.assertIsNone(command["request"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+批量执行命令的测试
+"""
+
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.executor import Executor
+
+
+class CountingExecutor(Executor):
+    """不启动进程，记录同时在途的命令数"""
+
+    def __init__(self, delays):
+        super().__init__()
+        self.delays = delays
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def _execute(self, command_str, timeout, shell=None):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            if command_str == "fail":
+                raise OSError("无法启动")
+            time.sleep(self.delays.get(command_str, 0))
+            return {"success": True, "returncode": 0, "is_timeout": False,
+                    "stdout": command_str, "stderr": "", "usage": None}
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+class RunManyTest(unittest.TestCase):
+
+    def test_results_in_completion_order_with_indices(self):
+        executor = CountingExecutor({"slow": 0.3, "fast": 0.0})
+        results = list(executor.run_many(["slow", "fast"], max_workers=2))
+        self.assertEqual([result["command"] for result in results], ["fast", "slow"])
+        self.assertEqual({result["command"]: result["index"] for result in results}, {"slow": 0, "fast": 1})
+        self.assertTrue(all(result["stdout"] == result["command"] for result in results))
+
+    def test_in_flight_commands_are_capped(self):
+        executor = CountingExecutor({})
+        executor.delays = {f"c{i}": 0.02 for i in range(20)}
+        submitted = []
+
+        def commands():
+            for i in range(20):
+                submitted.append(i)
+                yield f"c{i}"
+
+        results = executor.run_many(commands(), max_workers=2)
+        next(results)
+        # 产生第一个结果时最多提交了 2 * 2 条命令，再补充一条
+        self.assertLessEqual(len(submitted), 5)
+        rest = list(results)
+        self.assertEqual(len(rest), 19)
+        self.assertLessEqual(executor.max_running, 2)
+
+    def test_failed_command_does_not_abort_batch(self):
+        executor = CountingExecutor({"a": 0.05, "b": 0.05})
+        results = sorted(executor.run_many(["a", "fail", "b"], max_workers=2), key=lambda result: result["index"])
+        self.assertEqual([result["index"] for result in results], [0, 1, 2])
+        self.assertEqual(results[1]["command"], "fail")
+        self.assertFalse(results[1]["success"])
+        self.assertIn("无法启动", results[1]["error"])
+        self.assertTrue(results[0]["success"] and results[2]["success"])
+
+    def test_unsupported_executor(self):
+        results = list(Executor().run_many([("echo ok", "no-such-shell"), "echo ok"], max_workers=2))
+        self.assertEqual(len(results), 2)
+        failed = [result for result in results if not result["success"]]
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(failed[0]["index"], 0)
+        self.assertEqual(failed[0]["command"], "echo ok")
+        self.assertTrue(failed[0]["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+命令输出摘要的测试
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.output_summarizer import OutputSummarizer, estimate_tokens
+
+
+class OutputSummarizerTest(unittest.TestCase):
+
+    def wide_table(self):
+        summarizer = OutputSummarizer()
+        summarizer.feed([" ".join(f"col{i}" for i in range(40))])
+        summarizer.feed(" ".join(f"v{i}_{row % 7}" for i in range(40)) for row in range(500))
+        summarizer.feed((f"error line {i}" for i in range(50)), "stderr")
+        return summarizer
+
+    def test_digest_fits_budget(self):
+        summarizer = self.wide_table()
+        for budget in (400, 200, 100, 60):
+            self.assertLessEqual(estimate_tokens(summarizer.digest(budget)), budget)
+
+    def test_truncation_keeps_whole_lines(self):
+        summarizer = self.wide_table()
+        full = summarizer._render(0, 75).split("\n")
+        digest = summarizer.digest(200).split("\n")
+        self.assertTrue(digest[-1].startswith("…（超出长度"))
+        # 除了末尾的说明，每一行都是完整渲染结果中的一行
+        for line in digest[:-1]:
+            self.assertIn(line, full)
+        self.assertIn("[stderr] 共 50 行，中间 50 行已省略", digest)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+子进程资源统计的测试
+"""
+
+import os
+import sys
+import signal
+import unittest
+import subprocess
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.resource_usage import ProcessUsageTracker
+
+
+@unittest.skipUnless(hasattr(os, "wait4"), "需要 os.wait4")
+class ProcessUsageTrackerTest(unittest.TestCase):
+
+    def run_tracked(self, code):
+        process = subprocess.Popen([sys.executable, "-c", code])
+        tracker = ProcessUsageTracker(process)
+        return tracker.wait(10), tracker
+
+    def check_exit_codes(self):
+        returncode, tracker = self.run_tracked("import sys; sys.exit(3)")
+        self.assertEqual(returncode, 3)
+        self.assertFalse(tracker.usage()["exit_unknown"])
+
+        returncode, _ = self.run_tracked("import os, signal; os.kill(os.getpid(), signal.SIGTERM)")
+        self.assertEqual(returncode, -signal.SIGTERM)
+
+    def test_exit_codes(self):
+        self.check_exit_codes()
+
+    def test_exit_codes_without_waitstatus_to_exitcode(self):
+        # Python 3.8 没有 os.waitstatus_to_exitcode
+        converter = getattr(os, "waitstatus_to_exitcode", None)
+        if converter is not None:
+            del os.waitstatus_to_exitcode
+        try:
+            self.check_exit_codes()
+        finally:
+            if converter is not None:
+                os.waitstatus_to_exitcode = converter
+
+
+if __name__ == "__main__":
+    unittest.main()
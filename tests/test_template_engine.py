@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模板渲染和参数转义的测试
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent import process_control
+from agent.template_engine import CompiledTemplate, compile_template, quote_cmd
+
+
+def cmd_to_argument(text):
+    """模拟 cmd.exe 处理 ^ 转义（只在引号外生效），再按Windows命令行参数规则解析出一个参数"""
+    unescaped, quoted, index = [], False, 0
+    while index < len(text):
+        ch = text[index]
+        if ch == "^" and not quoted:
+            index += 1
+            ch = text[index]
+        elif ch == '"':
+            quoted = not quoted
+        unescaped.append(ch)
+        index += 1
+
+    text = "".join(unescaped)
+    argument, quoted, index = [], False, 0
+    while index < len(text):
+        backslashes = 0
+        while index < len(text) and text[index] == "\\":
+            backslashes += 1
+            index += 1
+        if index < len(text) and text[index] == '"':
+            argument.append("\\" * (backslashes // 2))
+            if backslashes % 2:
+                argument.append('"')
+            elif quoted and index + 1 < len(text) and text[index + 1] == '"':
+                # 引号内的 "" 是一个字面双引号
+                argument.append('"')
+                index += 1
+            else:
+                quoted = not quoted
+            index += 1
+            continue
+        argument.append("\\" * backslashes)
+        if index < len(text):
+            argument.append(text[index])
+            index += 1
+    return "".join(argument)
+
+
+class QuoteCmdTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for value in ("abc", "a b", 'say "hi"', "50%", "%PATH%", "!x!", "a&b|c>d", "C:\\dir\\",
+                      'C:\\dir\\"x', "^caret", ""):
+            self.assertEqual(cmd_to_argument(quote_cmd(value)), value, quote_cmd(value))
+
+    def test_metacharacters_stay_quoted(self):
+        quoted = quote_cmd('a" & del x & "b')
+        self.assertEqual(quoted, '"a"" & del x & ""b"')
+
+    def test_newline_rejected(self):
+        with self.assertRaises(ValueError):
+            quote_cmd("a\nb")
+
+    def test_cmd_command_line_not_backslash_escaped(self):
+        with mock.patch.object(process_control, "_IS_WINDOWS", True):
+            args = process_control.shell_command_args("cmd", 'echo "a b"')
+        self.assertEqual(args, 'cmd /s /c "echo "a b""')
+
+
+class DefaultExecutorTest(unittest.TestCase):
+
+    def test_platform_default(self):
+        data = {"platforms": {"windows": {"command": "type {path}"}, "linux": {"command": "cat {path}"}}}
+        self.assertEqual(compile_template(data, "windows").executor, "cmd")
+        self.assertEqual(compile_template(data, "windows").render({"path": "a b.txt"}), 'type "a b.txt"')
+        self.assertEqual(compile_template(data, "linux").executor, "sh")
+        self.assertEqual(compile_template(data, "linux").render({"path": "a b.txt"}), "cat 'a b.txt'")
+
+    def test_explicit_executor(self):
+        template = CompiledTemplate("Get-Item {path}", "powershell")
+        self.assertEqual(template.render({"path": "it's"}), "Get-Item 'it''s'")
+
+
+if __name__ == "__main__":
+    unittest.main()
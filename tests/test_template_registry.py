@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模板注册表的测试
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.template_registry import TemplateRegistry
+
+
+class TemplateRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.templates_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.templates_dir)
+
+    def write(self, name, content):
+        with open(os.path.join(self.templates_dir, name), "wb") as f:
+            f.write(content)
+
+    def test_bad_files_are_skipped(self):
+        template = {"name": "echo_text", "platforms": {"linux": {"executor": "bash", "command": "echo {text}"}},
+                    "params": {"text": "文本"}}
+        self.write("echo.json", json.dumps(template, ensure_ascii=False).encode("utf-8"))
+        self.write("latin1.json", '{"name": "café", "platforms": {}}'.encode("latin-1"))
+        self.write("broken.json", b'{"name": ')
+
+        output = StringIO()
+        with redirect_stdout(output):
+            registry = TemplateRegistry(self.templates_dir, refresh_interval=-1)
+        self.assertEqual(registry.get("echo_text", refresh=False).build_command({"text": "hi"}, "linux"), "echo hi")
+        self.assertIn("latin1.json", output.getvalue())
+        self.assertIn("broken.json", output.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,10 +7,18 @@ API管理器包装模块 - 封装AI API调用功能
 
 import sys
 import os
+import html
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from PySide6.QtWidgets import QApplication
-from PySide6.QtGui import QTextCursor
+from PySide6.QtWidgets import QApplication, QMessageBox
+from PySide6.QtCore import QTimer, QDateTime
+
+from config import app_config
+from agent.job_queue import JobQueue
+from agent.chat_session import ChatSession
+from agent import tracing
 
 
 class APIManagerWrapper:
@@ -20,25 +28,67 @@ class APIManagerWrapper:
     
     def __init__(self, parent):
         self.parent = parent
-        self.api_manager = None
-        self.system_prompt = """你是一个AI助手，具有PowerShell命令执行能力。请遵循以下规则：
-
-1. 当用户询问与电脑操作、文件管理、系统信息、网络配置等相关的问题时，请判断是否需要生成PowerShell命令
-2. 如果需要生成PowerShell命令，请按照以下格式回复：
-
-[POWERSHELL_COMMAND]
-# 这里是PowerShell命令
-Get-Process
-[END_COMMAND]
-
-3. 在命令前后提供必要的解释和说明
-4. 确保生成的命令安全可靠，避免执行危险操作
-5. 对于简单的查询，直接回答即可，不需要生成命令
-
-请根据用户的问题内容判断是否需要生成PowerShell命令。"""
+        # 与界面无关的对话流程，本类只负责显示事件和在后台任务队列中执行命令；
+        # 开启 workers.enabled 时模型调用在工作进程中进行，界面进程只显示事件
+        if app_config.get("workers.enabled", False):
+            from agent.worker_pool import RemoteChatSession, get_chat_worker_pool
+            self.session = RemoteChatSession(get_chat_worker_pool(), approve=self.screen_command)
+        else:
+            self.session = ChatSession(approve=self.screen_command)
+        # 后台初始化API管理器的任务，完成前使用API的操作会等待它
+        self.api_future = None
+        # 正在生成回复时输入框只接受 !!
+        self.responding = False
+        # 当前回复的取消事件，退出时设置，结束代理循环中仍在运行的命令
+        self.turn_cancel = threading.Event()
+        
+        # 后台任务队列，长时间运行的命令不再阻塞界面
+        self.job_queue = JobQueue(self.run_command, app_config.get("execution.max_concurrent_jobs", 2))
+        self.job_messages = {}
+        self.job_timer = QTimer()
+        self.job_timer.timeout.connect(self.process_job_events)
+        self.job_timer.start(100)
+    
+    @property
+    def api_manager(self):
+        """API管理器，由对话流程持有"""
+        return self.session.api_manager
     
-    def initialize_api_manager(self):
-        """初始化API管理器"""
+    @api_manager.setter
+    def api_manager(self, api_manager):
+        self.session.api_manager = api_manager
+    
+    def run_command(self, command, timeout=300, cancel_event=None, executor="powershell"):
+        """在任务线程中执行命令，返回执行事件迭代器"""
+        if not self.wait_api_manager():
+            raise RuntimeError("API管理器未初始化")
+        return self.api_manager.execute_command_realtime(
+            command, executor, timeout, cancel_event=cancel_event,
+            kill_grace=app_config.get("execution.kill_grace_seconds", 3))
+    
+    def initialize_api_manager(self, background=False):
+        """
+        初始化API管理器
+        
+        Args:
+            background: 在后台线程中导入openai并创建客户端，窗口不必等待导入完成
+            
+        Returns:
+            是否初始化成功，后台初始化时返回None
+        """
+        if background:
+            pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-init")
+            self.api_future = pool.submit(self._create_api_manager)
+            # 工作进程也在后台启动
+            worker_pool = getattr(self.session, "pool", None)
+            if worker_pool is not None:
+                pool.submit(worker_pool.start)
+            pool.shutdown(wait=False)
+            return None
+        self.api_future = None
+        return self._create_api_manager()
+    
+    def _create_api_manager(self):
         try:
             # 延迟导入API管理器，避免循环导入
             from api_manager import DeepSeekAPIManager
@@ -51,149 +101,266 @@ Get-Process
             self.api_manager = None
             return False
     
+    def wait_api_manager(self):
+        """
+        等待后台初始化完成，主线程中等待时继续处理界面事件
+        
+        Returns:
+            API管理器，初始化失败时为None
+        """
+        future = self.api_future
+        if future is not None and not future.done():
+            if threading.current_thread() is threading.main_thread():
+                while not future.done():
+                    QApplication.processEvents()
+                    wait([future], timeout=0.05)
+            else:
+                wait([future])
+        return self.api_manager
+    
     def generate_ai_response(self, user_message):
-        """使用DeepSeek API生成AI回复"""
-        # 显示正在输入的提示
-        self.parent.chat_components.chat_history.append("<div style='color: #999; font-style: italic;'>AI正在思考...</div>")
-        self.parent.chat_components.chat_history.verticalScrollBar().setValue(
-            self.parent.chat_components.chat_history.verticalScrollBar().maximum())
+        """处理一条用户消息，显示对话流程产生的事件"""
+        chat_components = self.parent.chat_components
+        messages = chat_components.chats[chat_components.current_chat_index]["messages"]
         
-        # 确保输入框在处理API响应时不可用
-        self.parent.chat_components.input_box.setEnabled(False)
+        # 回复期间输入框保持可用，以便输入 !! 执行命令缓存给出的建议命令
+        self.responding = True
+        self.turn_cancel = threading.Event()
+        placeholder = chat_components.input_box.placeholderText()
+        chat_components.input_box.setPlaceholderText("正在回复，输入 !! 执行建议的命令")
         
-        # 处理API调用
         try:
-            if not self.api_manager:
-                raise Exception("API管理器未初始化")
-                
-            # 准备消息列表
-            user_messages = []
-            assistant_messages = []
-            
-            # 从当前聊天历史中提取消息
-            for msg in self.parent.chat_components.chats[self.parent.chat_components.current_chat_index]["messages"]:
-                if msg["sender"] == "user":
-                    user_messages.append(msg["content"])
-                elif msg["sender"] == "ai":
-                    assistant_messages.append(msg["content"])
-            
-            # 格式化消息
-            messages = self.api_manager.format_messages(
-                self.system_prompt,
-                user_messages,
-                assistant_messages,
-                user_message
-            )
-            
-            # 使用流式响应获取AI回复
-            full_response = ""
-            
-            # 移除正在思考的提示
-            cursor = self.parent.chat_components.chat_history.textCursor()
-            cursor.movePosition(QTextCursor.MoveOperation.Start)
-            cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
-            cursor.removeSelectedText()
-            
-            # 开始添加AI回复的容器
-            self.parent.chat_components.chat_history.insertHtml("<div id='ai-response'>")
-            
-            # 流式获取响应
-            for chunk in self.api_manager.generate_streaming_response(messages):
-                full_response += chunk
-                
-                # 更新聊天历史显示
-                self.parent.chat_components.chat_history.clear()
-                self.parent.chat_components.chat_history.insertHtml(f"<div id='ai-response'>{full_response}</div>")
-                
-                # 滚动到底部
-                self.parent.chat_components.chat_history.verticalScrollBar().setValue(
-                    self.parent.chat_components.chat_history.verticalScrollBar().maximum())
-                
+            for event in self.session.respond(user_message, messages, self.turn_cancel):
+                self.show_event(event)
                 # 处理GUI事件，确保界面更新
                 QApplication.processEvents()
-            
-            # 完成AI回复的容器
-            self.parent.chat_components.chat_history.insertHtml("</div>")
-            
-            # 获取时间戳
-            timestamp = QDateTime.currentDateTime().toString("yyyy-MM-dd HH:mm:ss")
-            
-            # 保存到当前聊天数据
-            self.parent.chat_components.chats[self.parent.chat_components.current_chat_index]["messages"].append({
-                "sender": "ai",
-                "content": full_response,
-                "timestamp": timestamp
-            })
-            
-            # 检测并执行PowerShell命令
-            powershell_command = self.extract_powershell_command(full_response)
-            if powershell_command:
-                self.execute_and_display_powershell(powershell_command)
-            
         except Exception as e:
             # 显示错误消息
-            error_msg = f"API调用失败: {str(e)}"
-            self.parent.chat_components.chat_history.append(f"<div style='color: red;'>{error_msg}</div>")
+            chat_components.insert_html_block(f"<div style='color: red;'>API调用失败: {html.escape(str(e))}</div>")
             print(f"API调用异常: {str(e)}")
         finally:
-            # 恢复输入框可用状态
-            self.parent.chat_components.input_box.setEnabled(True)
+            self.responding = False
+            chat_components.input_box.setPlaceholderText(placeholder)
             # 滚动到底部
-            self.parent.chat_components.chat_history.verticalScrollBar().setValue(
-                self.parent.chat_components.chat_history.verticalScrollBar().maximum())
-    
-    def extract_powershell_command(self, text: str):
-        """从文本中提取PowerShell命令"""
-        pattern = r'\[POWERSHELL_COMMAND\](.*?)\[END_COMMAND\]'
-        match = re.search(pattern, text, re.DOTALL)
-        if match:
-            command = match.group(1).strip()
-            # 清理命令中的注释行
-            lines = command.split('\n')
-            cleaned_lines = []
-            for line in lines:
-                if not line.strip().startswith('#'):
-                    cleaned_lines.append(line.strip())
-            return '\n'.join(cleaned_lines)
-        return None
-
-    def execute_and_display_powershell(self, command: str):
-        """实时执行PowerShell命令并在界面上显示输出"""
-        if not self.api_manager:
-            self.parent.chat_components.chat_history.append("<div style='color: red;'>❌ API管理器未初始化</div>")
-            return
+            chat_components.end_streaming()
+            chat_components.scroll_to_bottom()
+    
+    def show_event(self, event):
+        """把对话流程的一个事件显示到当前聊天"""
+        chat_components = self.parent.chat_components
+        event_type = event["type"]
+        if event_type == "content":
+            # 每一步的回复文本在末尾增量追加
+            chat_components.append_streaming_text(event["text"])
+        elif event_type == "thinking":
+            # 显示正在输入的提示，等待API管理器在后台初始化完成
+            chat_components.insert_html_block("<div style='color: #999; font-style: italic;'>AI正在思考...</div>")
+            chat_components.scroll_to_bottom()
+            self.wait_api_manager()
+            # 移除正在思考的提示
+            chat_components.remove_last_block()
+        elif event_type == "step":
+            chat_components.end_streaming()
+        elif event_type == "stream_warning":
+            chat_components.insert_html_block(
+                f"<div style='color: red;'>⚠ 回复中包含被安全策略禁止的操作"
+                f"（{html.escape('、'.join(event['reasons']))}），该命令不会被执行</div>")
+        elif event_type == "tool_call":
+            chat_components.insert_html_block(
+                f"<div style='color: #999;'>🔧 调用模板 {html.escape(event['name'])}: "
+                f"{html.escape(event['command'])}</div>")
+        elif event_type == "tool_error":
+            chat_components.insert_html_block(
+                f"<div style='color: red;'>❌ 工具调用失败 ({html.escape(event['name'])}): "
+                f"{html.escape(event['error'])}</div>")
+        elif event_type == "tool_result":
+            chat_components.append_command_message(event["message"])
+        elif event_type == "local_intent":
+            chat_components.insert_html_block(
+                f"<div style='color: #999;'>⚡ 本地匹配模板 {html.escape(event['template'])}: "
+                f"{html.escape(event['command'])}</div>")
+        elif event_type == "cached_command":
+            if event["mode"] == "execute":
+                chat_components.insert_html_block(
+                    f"<div style='color: #999;'>💡 使用缓存的命令（{event['summary']}）: "
+                    f"{html.escape(event['command'])}</div>")
+            else:
+                chat_components.insert_html_block(
+                    f"<div style='color: #999;'>💡 相似请求曾成功执行（{event['summary']}），输入 !! 直接执行: "
+                    f"{html.escape(event['command'])}</div>")
+        elif event_type == "limit":
+            if event["reason"] == "max_steps":
+                chat_components.insert_html_block(
+                    f"<div style='color: orange;'>⚠ 已达到最大步数 {event['steps']}，代理循环已停止</div>")
+            else:
+                chat_components.insert_html_block(
+                    f"<div style='color: orange;'>⚠ 已用完token预算（{event['tokens']}），代理循环已停止</div>")
+        elif event_type == "command":
+            self.execute_and_display_command(event["command"], event["executor"], event["request"])
+        elif event_type == "error":
+            chat_components.insert_html_block(
+                f"<div style='color: red;'>API调用失败: {html.escape(event['error'])}</div>")
+    
+    def run_suggested_command(self):
+        """执行最近一次提示的缓存命令，没有提示时返回False"""
+        suggested = self.session.take_suggested_command()
+        if suggested is None:
+            return False
+        command, executor, request = suggested
+        self.execute_and_display_command(command, executor, request)
+        return True
+    
+    def screen_command(self, command: str, executor: str = "powershell"):
+        """
+        执行前按安全规则检查命令：禁止的命令直接拦截，需要确认的命令弹窗询问
+        
+        Args:
+            command: 命令文本
+            executor: 执行器名称
             
-        # 显示正在执行的提示
-        self.parent.chat_components.chat_history.append("<div style='color: #1890FF; font-weight: bold;'>正在执行PowerShell命令...</div>")
+        Returns:
+            命令被拦截或用户取消时返回原因，可以执行时返回None
+        """
+        verdict = self.session.check_command(command)
+        if verdict is None:
+            return None
         
-        # 滚动到底部
-        self.parent.chat_components.chat_history.verticalScrollBar().setValue(
-            self.parent.chat_components.chat_history.verticalScrollBar().maximum())
+        chat_components = self.parent.chat_components
+        reasons = "、".join(verdict.reasons)
+        if verdict.denied:
+            chat_components.insert_html_block(
+                f"<div style='color: red;'>⛔ 已拦截{chat_components.executor_label(executor)}命令"
+                f"（{html.escape(reasons)}）: {html.escape(command)}</div>")
+            return reasons
+        if verdict.allowed:
+            return None
         
-        # 执行命令并显示输出
-        for result in self.api_manager.execute_powershell_command_realtime(command):
-            if result["type"] == "stdout":
-                output_line = result["line"]
-                self.parent.chat_components.chat_history.append(f"<div style='color: #333;'>{output_line}</div>")
-            elif result["type"] == "stderr":
-                error_line = result["line"]
-                self.parent.chat_components.chat_history.append(f"<div style='color: red;'>{error_line}</div>")
-            elif result["type"] == "result":
-                if result["success"]:
-                    self.parent.chat_components.chat_history.append("<div style='color: green;'>✅ 命令执行完成</div>")
-                else:
-                    if result.get("is_timeout"):
-                        self.parent.chat_components.chat_history.append("<div style='color: orange;'>⏰ 命令执行超时</div>")
-                    else:
-                        self.parent.chat_components.chat_history.append(f"<div style='color: red;'>❌ 命令执行失败 (退出码: {result['returncode']})</div>")
-                        if result.get("error"):
-                            self.parent.chat_components.chat_history.append(f"<div style='color: red;'>错误信息: {result['error']}</div>")
-            elif result["type"] == "error":
-                self.parent.chat_components.chat_history.append(f"<div style='color: red;'>❌ 执行错误: {result['error']}</div>")
-            
-            # 滚动到底部
-            self.parent.chat_components.chat_history.verticalScrollBar().setValue(
-                self.parent.chat_components.chat_history.verticalScrollBar().maximum())
+        reply = QMessageBox.question(
+            self.parent, "确认执行",
+            f"该命令可能有风险（{reasons}），确定要执行吗？\n\n{command}",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            return None
+        chat_components.insert_html_block(
+            f"<div style='color: #999;'>已取消执行: {html.escape(command)}</div>")
+        return f"用户拒绝执行（{reasons}）"
+    
+    def execute_and_display_powershell(self, command: str, request=None):
+        """将PowerShell命令提交到后台任务队列，输出会持续回流到发起的聊天"""
+        return self.execute_and_display_command(command, "powershell", request)
+    
+    def execute_and_display_command(self, command: str, executor: str = "powershell", request=None):
+        """
+        将命令提交到后台任务队列，输出会持续回流到发起的聊天
+        
+        Args:
+            command: 命令文本
+            executor: 执行器名称
+            request: 产生该命令的用户请求，执行结束后结果会写入命令缓存
+        """
+        if not self.wait_api_manager():
+            self.parent.chat_components.insert_html_block("<div style='color: red;'>❌ API管理器未初始化</div>")
+            return None
+        
+        with tracing.span("safety.screen", "chat"):
+            if self.screen_command(command, executor):
+                return None
+        
+        chat_components = self.parent.chat_components
+        chat_index = chat_components.current_chat_index
+        timeout = app_config.get("execution.timeout", 300)
+        job = self.job_queue.submit(command, chat_index=chat_index, timeout=timeout, executor=executor)
+        
+        # 命令输出作为一条消息保存在聊天中，切换聊天后仍能看到
+        timestamp = QDateTime.currentDateTime().toString("yyyy-MM-dd HH:mm:ss")
+        message = {
+            "sender": "command",
+            "content": command,
+            "timestamp": timestamp,
+            "job_id": job.id,
+            "executor": executor,
+            "request": request,
+            "output": [],
+            "result": None,
+            "status": job.state
+        }
+        chat_components.chats[chat_index]["messages"].append(message)
+        self.job_messages[job.id] = message
+        
+        # 显示正在执行的提示
+        chat_components.insert_html_block(
+            f"<div style='color: #1890FF; font-weight: bold;'>正在执行{chat_components.executor_label(executor)}命令（任务 #{job.id}）...</div>")
+        chat_components.job_panel.refresh(self.job_queue.jobs())
+        return job
+    
+    def process_job_events(self):
+        """定时取出后台任务事件，成批显示到对应聊天并刷新任务面板"""
+        chat_components = self.parent.chat_components
+        batcher = chat_components.output_batcher
+        events = self.job_queue.drain_events(max_events=5000)
+        render_span = tracing.span("ui.job_events", "render", events=len(events)) if events else None
+        
+        for job, event in events:
+            message = self.job_messages.get(job.id)
+            if message is None:
+                continue
+            # 只有前台任务且其聊天正在显示时才实时追加输出
+            visible = job.foreground and job.chat_index == chat_components.current_chat_index
+            if not visible:
+                # 未显示的变化使该聊天缓存的聊天记录过期
+                chat_components.forget_chat(job.chat_index)
             
-            # 处理GUI事件，确保界面更新
-            QApplication.processEvents()
\ No newline at end of file
+            if event["type"] in ("stdout", "stderr"):
+                message["output"].append([event["type"], event["lines"]])
+                if visible:
+                    batcher.add(event["type"], event["lines"])
+            elif event["type"] in ("result", "error"):
+                message["result"] = event
+            elif event["type"] == "job_state":
+                message["status"] = event["state"]
+                if job.is_done:
+                    self.finish_job(job, message)
+        
+        # 每个周期只做一次插入和一次滚动
+        batcher.flush()
+        if render_span is not None:
+            render_span.end()
+        if events or self.job_queue.active_jobs():
+            chat_components.job_panel.refresh(self.job_queue.jobs())
+    
+    def finish_job(self, job, message):
+        """任务结束时在发起的聊天中显示结果"""
+        chat_components = self.parent.chat_components
+        self.job_messages.pop(job.id, None)
+        self.session.record_result(message.get("request"), message["content"],
+                                   message.get("executor", "powershell"), message.get("result"))
+        if job.chat_index != chat_components.current_chat_index:
+            return
+        if not job.foreground:
+            chat_components.output_batcher.add_html(
+                f"<div style='color: #1890FF;'>后台任务 #{job.id} 已结束，共 {job.line_count} 行输出</div>")
+        for part in chat_components.execution_status_html(message):
+            chat_components.output_batcher.add_html(part)
+    
+    def cancel_job(self, job_id):
+        """取消后台任务"""
+        if self.job_queue.cancel(job_id):
+            self.parent.chat_components.job_panel.refresh(self.job_queue.jobs())
+    
+    def background_job(self, job_id):
+        """将任务转入后台"""
+        job = self.job_queue.get(job_id)
+        if job is not None and not job.is_done:
+            job.send_to_background()
+            self.parent.chat_components.job_panel.refresh(self.job_queue.jobs())
+    
+    def shutdown(self):
+        """退出时停止任务轮询并取消所有任务和正在生成的回复"""
+        self.turn_cancel.set()
+        self.job_timer.stop()
+        self.job_queue.shutdown()
+        worker_pool = getattr(self.session, "pool", None)
+        if worker_pool is not None:
+            worker_pool.shutdown()
@@ -8,13 +8,26 @@
 import sys
 import os
 import re
+import html
+from collections import OrderedDict
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from PySide6.QtWidgets import (QWidget, QTextEdit, QLineEdit, QPushButton, 
+from PySide6.QtWidgets import (QWidget, QLineEdit, QPushButton, 
                                QLabel, QFrame, QListWidget, QListWidgetItem, 
                                QVBoxLayout, QHBoxLayout)
-from PySide6.QtCore import Qt, QDateTime
-from PySide6.QtGui import QTextCursor
+from PySide6.QtCore import Qt, QDateTime, QTimer
+
+from config import app_config
+from agent.job_queue import JOB_FINISHED, JOB_FAILED, JOB_CANCELLED, JOB_TIMEOUT
+from agent import tracing
+from ui.job_panel import JobPanel
+from ui.output_batcher import OutputBatcher
+from ui.chat_view import ChatView, ChatModel
+from ui.markdown_renderer import MarkdownRenderer, CodeHighlighter
+
+
+# 未高亮代码块的标记，见 MarkdownRenderer.code_block
+_CODE_MARKER = re.compile(r"<!--code:([^>]+?)-->")
 
 
 class ChatComponents:
@@ -26,6 +39,23 @@ class ChatComponents:
         self.parent = parent
         self.chats = []
         self.current_chat_index = 0
+        self.output_batcher = OutputBatcher(self)
+        # 聊天索引 -> 渲染好的聊天记录模型，只保留最近查看的几个聊天，切换时直接换用
+        self.chat_models = OrderedDict()
+        self.max_cached_chats = max(app_config.get("ui.cached_chats", 8), 1)
+        # 缓存后在后台发生变化、切换过去时需要重新生成的聊天
+        self.stale_chats = set()
+        # 重新生成聊天记录时先渲染的最新消息数，较早的消息之后分批补到开头
+        self.rebuild_batch = 200
+        # AI回复按Markdown渲染，代码块在后台线程中高亮
+        self.code_highlighter = CodeHighlighter()
+        self.code_highlighter.highlighted.connect(self.on_code_highlighted)
+        self.markdown = MarkdownRenderer(self.code_highlighter)
+        # 等待高亮的代码块标识 -> 显示它的 (模型, 行键)，高亮完成后只更新这些行
+        self.pending_code = {}
+        # 正在流式追加的行及其增量渲染器
+        self.streaming_row = None
+        self.streaming_markdown = None
     
     def create_sidebar(self):
         """创建左侧导航栏"""
@@ -74,9 +104,13 @@ class ChatComponents:
         bottom_layout.addWidget(self.settings_button)
         bottom_layout.addStretch(1)
         
+        # 后台任务面板
+        self.job_panel = JobPanel(self.parent)
+        
         # 添加到布局
         sidebar_layout.addWidget(self.new_chat_button)
         sidebar_layout.addWidget(self.chat_list, 1)
+        sidebar_layout.addWidget(self.job_panel)
         sidebar_layout.addLayout(bottom_layout)
         
         return self.sidebar_frame
@@ -109,9 +143,8 @@ class ChatComponents:
         top_bar_layout.addWidget(self.chat_title_label)
         top_bar_layout.addStretch(1)
         
-        # 聊天历史区域
-        self.chat_history = QTextEdit()
-        self.chat_history.setReadOnly(True)
+        # 聊天历史区域，只排版和绘制可见的消息
+        self.chat_history = ChatView()
         self.chat_history.setFrameShape(QFrame.Shape.NoFrame)
         
         # 创建一个堆叠布局用于切换聊天历史和新建聊天输入框
@@ -236,8 +269,8 @@ class ChatComponents:
             self.chat_stack_layout.itemAt(i).widget().setParent(None)
         self.chat_stack_layout.addWidget(self.chat_history)
         
-        # 清空聊天历史
-        self.chat_history.clear()
+        # 新聊天使用新的聊天记录模型
+        self.show_chat_model(self.current_chat_index, ChatModel())
         self.chat_history.setStyleSheet("")
         
         # 显示底部输入区域
@@ -269,10 +302,71 @@ class ChatComponents:
             # 更新标题
             self.chat_title_label.setText(chat_data["title"])
             
-            # 更新聊天历史
-            self.chat_history.clear()
-            for message in chat_data["messages"]:
-                self.append_message(message["sender"], message["content"], message["timestamp"])
+            # 最近查看过的聊天直接换用缓存的模型，否则从最新的消息开始重新生成
+            model = self.chat_models.get(index)
+            if model is None or index in self.stale_chats:
+                self.stale_chats.discard(index)
+                model = self.build_chat_model(index)
+            self.show_chat_model(index, model)
+    
+    def show_chat_model(self, index, model):
+        """显示聊天记录模型并放入最近查看的缓存，超出数量时丢弃最久未查看的聊天"""
+        # 未刷新的输出先写入原来的聊天记录
+        self.output_batcher.flush()
+        self.streaming_row = None
+        self.chat_models[index] = model
+        self.chat_models.move_to_end(index)
+        while len(self.chat_models) > self.max_cached_chats:
+            evicted, _ = self.chat_models.popitem(last=False)
+            self.stale_chats.discard(evicted)
+        self.chat_history.set_chat_model(model)
+    
+    def forget_chat(self, index):
+        """
+        聊天数据在未显示时发生了变化（如后台任务的输出），丢弃该聊天的缓存，下次切换时重新生成
+        
+        Args:
+            index: 聊天索引
+        """
+        if index == self.current_chat_index:
+            # 正在显示的模型不能丢弃，切换回来时再重新生成
+            if index in self.chat_models:
+                self.stale_chats.add(index)
+        else:
+            self.chat_models.pop(index, None)
+    
+    def build_chat_model(self, index):
+        """
+        从聊天数据生成聊天记录模型：先渲染最新的一批消息，较早的消息在事件循环空闲时分批插入到开头
+        
+        Args:
+            index: 聊天索引
+            
+        Returns:
+            聊天记录模型
+        """
+        model = ChatModel()
+        messages = list(self.chats[index]["messages"])
+        start = max(len(messages) - self.rebuild_batch, 0)
+        for message in messages[start:]:
+            block = self.render_message_html(message)
+            self.track_code_blocks(model, model.append_html(block), block)
+        if start:
+            QTimer.singleShot(0, lambda: self.prepend_older_messages(index, model, messages, start))
+        return model
+    
+    def prepend_older_messages(self, index, model, messages, end):
+        """把 messages[:end] 中最新的一批渲染后插入到模型开头，还有剩余时继续排队"""
+        if self.chat_models.get(index) is not model:
+            # 模型已被丢弃或替换
+            return
+        start = max(end - self.rebuild_batch, 0)
+        blocks = [self.render_message_html(message) for message in messages[start:end]]
+        model.prepend_html(blocks)
+        for key, block in zip(model.row_keys(len(blocks)), blocks):
+            self.track_code_blocks(model, key, block)
+        if start:
+            QTimer.singleShot(0, lambda: self.prepend_older_messages(index, model, messages, start))
     
     def append_welcome_message(self):
         """添加欢迎消息"""
@@ -291,6 +385,24 @@ class ChatComponents:
     
     def append_message(self, sender, content, timestamp):
         """向聊天历史添加消息"""
+        self.insert_html_block(self.message_html(sender, content, timestamp))
+    
+    def message_body_html(self, sender, content):
+        """
+        生成消息正文的HTML：AI回复按Markdown渲染，用户消息原样显示
+        
+        Returns:
+            (HTML, 是否有代码块正在等待高亮)
+        """
+        if sender == "user":
+            return html.escape(content).replace("\n", "<br/>"), False
+        return self.markdown.render(content)
+    
+    def message_html(self, sender, content, timestamp):
+        """生成用户或AI消息的HTML"""
+        return self._message_html(sender, self.message_body_html(sender, content)[0], timestamp)
+    
+    def _message_html(self, sender, content, timestamp):
         if sender == "user":
             # 用户消息 - 右对齐
             message_html = f"""
@@ -320,8 +432,167 @@ class ChatComponents:
                 </div>
             """
         
-        self.chat_history.append(message_html)
-        self.chat_history.verticalScrollBar().setValue(self.chat_history.verticalScrollBar().maximum())
+        return message_html
+    
+    def render_message(self, message):
+        """按消息类型渲染到聊天历史"""
+        self.insert_html_block(self.render_message_html(message))
+    
+    def render_message_html(self, message):
+        """按消息类型生成HTML，已结束的消息保存渲染结果，再次显示时直接使用"""
+        cached = message.get("html")
+        if cached is not None:
+            return cached
+        if message["sender"] == "command":
+            result = self.command_message_html(message)
+            complete = message.get("status") in (JOB_FINISHED, JOB_FAILED, JOB_CANCELLED, JOB_TIMEOUT)
+        else:
+            body, pending = self.message_body_html(message["sender"], message["content"])
+            result = self._message_html(message["sender"], body, message["timestamp"])
+            complete = not pending
+        if complete:
+            message["html"] = result
+        return result
+    
+    def append_command_message(self, message):
+        """渲染命令任务消息及其已产生的输出，整条消息一次插入"""
+        self.insert_html_block(self.command_message_html(message))
+    
+    def command_message_html(self, message):
+        """生成命令任务消息及其已产生输出的HTML"""
+        executor = self.executor_label(message.get("executor", "powershell"))
+        source = f"任务 #{message['job_id']}" if message.get("job_id") is not None else "代理调用"
+        blocks = [f"<div style='color: #1890FF; font-weight: bold;'>{executor}命令（{source}）</div>"]
+        for stream, lines in message["output"]:
+            blocks.append(self.output_lines_html(stream, lines))
+        blocks.extend(self.execution_status_html(message))
+        return "".join(blocks)
+    
+    def executor_label(self, executor):
+        """执行器的显示名称"""
+        return {"powershell": "PowerShell", "cmd": "CMD", "bash": "Bash", "sh": "Shell"}.get(executor, executor)
+    
+    def insert_html_block(self, html_block):
+        """
+        在聊天历史末尾追加一个HTML块，作为视图中的一行
+
+        Returns:
+            新行的键
+        """
+        self.streaming_row = None
+        model = self.chat_history.chat_model()
+        key = model.append_html(html_block)
+        self.track_code_blocks(model, key, html_block)
+        return key
+    
+    def remove_last_block(self):
+        """删除聊天历史的最后一行，用于移除临时提示"""
+        self.streaming_row = None
+        self.chat_history.chat_model().remove_last()
+    
+    def append_streaming_text(self, text):
+        """把流式回复的文本片段追加到当前回复行，没有回复行时新建一行；只重新渲染末尾未结束的Markdown块"""
+        model = self.chat_history.chat_model()
+        with tracing.span("ui.stream_flush", "render", chars=len(text)):
+            if self.streaming_row is None:
+                self.streaming_markdown = self.markdown.stream()
+                block = self.streaming_html(self.streaming_markdown.feed(text))
+                self.streaming_row = model.append_html(block)
+            else:
+                block = self.streaming_html(self.streaming_markdown.feed(text))
+                model.set_html(self.streaming_row, block)
+            self.track_code_blocks(model, self.streaming_row, block)
+    
+    def end_streaming(self):
+        """结束当前回复行，之后的文本片段另起一行"""
+        self.streaming_row = None
+        self.streaming_markdown = None
+    
+    def streaming_html(self, body):
+        """流式回复的HTML"""
+        return f"<div style='color: #333333;'>{body}</div>"
+    
+    def track_code_blocks(self, model, key, html_block):
+        """记录一行中等待高亮的代码块，高亮完成后只更新这一行"""
+        if "<!--code:" not in html_block:
+            return
+        for token in _CODE_MARKER.findall(html_block):
+            rows = self.pending_code.setdefault(token, [])
+            if (model, key) not in rows:
+                rows.append((model, key))
+    
+    def on_code_highlighted(self, token):
+        """代码块高亮完成，替换记录下来的行中未高亮的代码块"""
+        rows = self.pending_code.pop(token, ())
+        replacement = self.markdown.highlighted_block(token)
+        if replacement is None:
+            return
+        plain, highlighted = replacement
+        for model, key in rows:
+            row_html = model.row_html(key)
+            # 行可能已被删除，或流式回复的行已被重新渲染
+            if row_html is not None and plain in row_html:
+                model.set_html(key, row_html.replace(plain, highlighted))
+    
+    def shutdown(self):
+        """退出时停止后台高亮线程"""
+        self.code_highlighter.shutdown()
+    
+    def clear_history(self):
+        """清空聊天历史显示"""
+        self.streaming_row = None
+        self.chat_history.chat_model().clear()
+        self.chat_history.scroll_to_bottom()
+    
+    def scroll_to_bottom(self):
+        """滚动到聊天历史底部"""
+        self.chat_history.scroll_to_bottom()
+    
+    def output_lines_html(self, stream, lines):
+        """把一批命令输出行生成为一个HTML块"""
+        color = "red" if stream == "stderr" else "#333"
+        body = "<br>".join(html.escape(line) for line in lines)
+        return f"<div style='color: {color}; white-space: pre-wrap;'>{body}</div>"
+    
+    def execution_status_html(self, message):
+        """根据命令任务的结束状态生成提示HTML列表"""
+        result = message.get("result")
+        status = message.get("status")
+        parts = []
+        if status == "cancelled":
+            parts.append("<div style='color: orange;'>🚫 任务已取消</div>")
+        elif result is None:
+            return parts
+        elif result.get("is_timeout"):
+            parts.append("<div style='color: orange;'>⏰ 命令执行超时</div>")
+        elif result["type"] == "error":
+            parts.append(f"<div style='color: red;'>❌ 执行错误: {html.escape(str(result['error']))}</div>")
+        elif result["success"]:
+            parts.append("<div style='color: green;'>✅ 命令执行完成</div>")
+        else:
+            parts.append(f"<div style='color: red;'>❌ 命令执行失败 (退出码: {result['returncode']})</div>")
+            if result.get("error"):
+                parts.append(f"<div style='color: red;'>错误信息: {html.escape(str(result['error']))}</div>")
+        
+        usage_text = self.format_usage((result or {}).get("usage"))
+        if usage_text:
+            parts.append(f"<div style='color: #999; font-size: 12px;'>{usage_text}</div>")
+        return parts
+    
+    def format_usage(self, usage):
+        """格式化命令的资源消耗摘要"""
+        if not usage:
+            return ""
+        parts = [f"耗时 {usage['wall_time']:.2f}s"]
+        if usage.get("user_time") is not None:
+            parts.append(f"CPU 用户 {usage['user_time']:.2f}s / 系统 {usage['system_time']:.2f}s")
+        if usage.get("max_rss_kb") is not None:
+            parts.append(f"内存峰值 {usage['max_rss_kb'] / 1024:.1f}MB")
+        if usage.get("read_bytes") is not None:
+            parts.append(f"读 {usage['read_bytes'] / 1024:.0f}KB / 写 {usage['write_bytes'] / 1024:.0f}KB")
+        if usage.get("exit_unknown"):
+            parts.append("退出状态未知")
+        return " · ".join(parts)
     
     def send_message(self, message):
         """发送消息"""
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+聊天记录视图模块 - 基于模型/视图的虚拟化聊天记录，只排版和绘制可见的消息
+"""
+
+import sys
+import os
+import re
+import math
+from collections import OrderedDict
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import (QListView, QStyledItemDelegate, QAbstractItemView,
+                               QApplication, QMenu)
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QSize
+from PySide6.QtGui import QTextDocument
+
+
+# 估算高度时视为换行的标签
+_LINE_BREAK = re.compile(r"<br\s*/?>|</div>|</p>|</h\d>|</li>|</tr>|\n", re.IGNORECASE)
+_TAG = re.compile(r"<[^>]*>")
+
+
+class _Row:
+    """聊天记录中的一行（一条消息或一个提示块）"""
+
+    __slots__ = ("key", "html", "revision", "size")
+
+    def __init__(self, key, html):
+        self.key = key
+        self.html = html
+        self.revision = 0
+        # (排版宽度, 视图正在使用的高度)
+        self.size = None
+
+
+class ChatModel(QAbstractListModel):
+    """
+    聊天记录模型 - 每行保存一段HTML，行内容变化时递增版本号，视图按版本号缓存排版结果
+
+    行只会追加到末尾、插入到开头或从末尾删除，行的键按位置递增，可以直接换算出行号。
+    """
+
+    HtmlRole = Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self._next_key = 0
+        self._first_key = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+        if role == self.HtmlRole or role == Qt.ItemDataRole.DisplayRole:
+            return self.rows[index.row()].html
+        return None
+
+    def append_html(self, html):
+        """
+        在末尾追加一行
+
+        Args:
+            html: 行内容
+
+        Returns:
+            新行的键，在开头插入行后仍然有效
+        """
+        position = len(self.rows)
+        if not self.rows:
+            self._first_key = self._next_key
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.rows.append(_Row(self._next_key, html))
+        self._next_key += 1
+        self.endInsertRows()
+        return self._next_key - 1
+
+    def prepend_html(self, blocks):
+        """
+        在开头插入多行
+
+        Args:
+            blocks: 按显示顺序排列的行内容列表
+        """
+        if not blocks:
+            return
+        if not self.rows:
+            for block in blocks:
+                self.append_html(block)
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(blocks) - 1)
+        first_key = self._first_key - len(blocks)
+        self.rows[:0] = [_Row(first_key + i, block) for i, block in enumerate(blocks)]
+        self._first_key = first_key
+        self.endInsertRows()
+
+    def row_html(self, key):
+        """
+        Args:
+            key: append_html 返回的行键
+
+        Returns:
+            行内容，行已不存在时返回None
+        """
+        position = key - self._first_key
+        if not 0 <= position < len(self.rows):
+            return None
+        return self.rows[position].html
+
+    def row_keys(self, count):
+        """开头 count 行的键，用于 prepend_html 之后定位插入的行"""
+        return [row.key for row in self.rows[:count]]
+
+    def set_html(self, key, html):
+        """
+        替换一行的内容
+
+        Args:
+            key: append_html 返回的行键
+            html: 新的行内容
+        """
+        position = key - self._first_key
+        if not 0 <= position < len(self.rows):
+            return
+        row = self.rows[position]
+        row.html = html
+        row.revision += 1
+        index = self.index(position)
+        self.dataChanged.emit(index, index, [self.HtmlRole])
+
+    def remove_last(self):
+        """删除最后一行"""
+        if not self.rows:
+            return
+        position = len(self.rows) - 1
+        self.beginRemoveRows(QModelIndex(), position, position)
+        self.rows.pop()
+        self.endRemoveRows()
+
+    def clear(self):
+        """清空所有行"""
+        self.beginResetModel()
+        self.rows = []
+        self._first_key = self._next_key
+        self.endResetModel()
+
+
+class ChatDelegate(QStyledItemDelegate):
+    """
+    聊天记录委托 - 只对绘制到的行用QTextDocument精确排版
+
+    尚未绘制过的行按文本长度估算高度；行被绘制时得到精确高度，与视图正在使用的高度不同才通知视图重新布局，
+    因此流式追加文本时只有换行才会触发布局。高度保存在行上，随模型一起缓存；
+    排版好的文档只为最近绘制的行保留。
+    """
+
+    def __init__(self, view, padding_x=16, padding_y=4, document_cache_size=256):
+        """
+        初始化委托
+
+        Args:
+            view: 所属的视图，用于获取可用宽度和字体
+            padding_x: 行的左右留白
+            padding_y: 行的上下留白
+            document_cache_size: 保留排版结果的行数
+        """
+        super().__init__(view)
+        self.view = view
+        self.padding_x = padding_x
+        self.padding_y = padding_y
+        self.document_cache_size = document_cache_size
+        # 行 -> (版本, 宽度, 文档)
+        self._documents = OrderedDict()
+
+    def text_width(self):
+        """行内容可用的排版宽度"""
+        return max(self.view.viewport().width() - 2 * self.padding_x, 50)
+
+    def _row(self, index):
+        return index.model().rows[index.row()]
+
+    def document(self, index):
+        """获取一行排版好的文档，最近使用的保留在缓存中"""
+        row = self._row(index)
+        width = self.text_width()
+        cached = self._documents.get(row)
+        if cached is not None and cached[0] == row.revision and cached[1] == width:
+            self._documents.move_to_end(row)
+            return cached[2]
+
+        document = QTextDocument()
+        document.setDocumentMargin(0)
+        document.setDefaultFont(self.view.font())
+        document.setHtml(row.html)
+        document.setTextWidth(width)
+        self._documents[row] = (row.revision, width, document)
+        self._documents.move_to_end(row)
+        while len(self._documents) > self.document_cache_size:
+            self._documents.popitem(last=False)
+        return document
+
+    def _estimate_height(self, html, width):
+        char_width = max(self.view.fontMetrics().averageCharWidth(), 1)
+        per_line = max(width // char_width, 1)
+        lines = 0
+        for segment in _LINE_BREAK.split(html):
+            text = _TAG.sub("", segment).strip()
+            if not text:
+                continue
+            # 非ASCII字符大致占两个字符宽
+            units = len(text) + len(text) - len(text.encode("ascii", "ignore"))
+            lines += math.ceil(units / per_line)
+        return max(lines, 1) * self.view.fontMetrics().lineSpacing()
+
+    def sizeHint(self, option, index):
+        row = self._row(index)
+        width = self.text_width()
+        cached = row.size
+        if cached is not None and cached[0] == width:
+            height = cached[1]
+        else:
+            if cached is not None:
+                # 宽度变化后按比例估算，重新绘制时再精确排版
+                height = max(int(cached[1] * cached[0] / width), 1)
+            else:
+                height = self._estimate_height(row.html, width)
+            row.size = (width, height)
+        return QSize(width + 2 * self.padding_x, height + 2 * self.padding_y)
+
+    def paint(self, painter, option, index):
+        document = self.document(index)
+        row = self._row(index)
+        size = (self.text_width(), math.ceil(document.size().height()))
+        if row.size != size:
+            row.size = size
+            self.sizeHintChanged.emit(index)
+
+        painter.save()
+        painter.translate(option.rect.left() + self.padding_x, option.rect.top() + self.padding_y)
+        document.drawContents(painter)
+        painter.restore()
+
+    def clear(self):
+        """丢弃缓存的排版结果"""
+        self._documents.clear()
+
+
+class ChatView(QListView):
+    """
+    聊天记录视图 - 虚拟化的消息列表
+
+    只有滚动到可见区域的行才会排版和绘制，消息数量增长时滚动和追加的开销基本不变；
+    停留在底部时新内容到达会自动跟随滚动，在开头插入较早的消息时保持当前看到的内容不动。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setItemDelegate(ChatDelegate(self))
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(500)
+        self.setUniformItemSizes(False)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.verticalScrollBar().setSingleStep(20)
+
+        self._follow = True
+        # 在开头插入行后，按离底部的距离恢复滚动位置
+        self._keep_bottom_distance = None
+        self._bottom_distance = 0
+        scroll_bar = self.verticalScrollBar()
+        scroll_bar.valueChanged.connect(self._on_scrolled)
+        scroll_bar.rangeChanged.connect(self._on_range_changed)
+
+        self._default_model = ChatModel(self)
+        self.set_chat_model(self._default_model)
+
+    def chat_model(self):
+        """当前显示的聊天记录模型"""
+        return self.model()
+
+    def set_chat_model(self, model):
+        """
+        切换显示的聊天记录模型，排版好的行高随模型保存，切换回来时不需要重新排版
+
+        Args:
+            model: 聊天记录模型，为None时显示视图自带的空模型
+        """
+        previous = self.model()
+        if previous is not None:
+            previous.rowsInserted.disconnect(self._on_rows_inserted)
+        model = model if model is not None else self._default_model
+        self.setModel(model)
+        model.rowsInserted.connect(self._on_rows_inserted)
+        self.scroll_to_bottom()
+
+    def _on_rows_inserted(self, parent, first, last):
+        if first == 0 and last + 1 < self.model().rowCount() and not self._follow:
+            self._keep_bottom_distance = self._bottom_distance
+
+    def _on_scrolled(self, value):
+        scroll_bar = self.verticalScrollBar()
+        self._follow = value >= scroll_bar.maximum() - 4
+        self._bottom_distance = scroll_bar.maximum() - value
+        # 用户滚动后不再保持离底部的距离，自身调整滚动位置时在 _on_range_changed 中恢复
+        self._keep_bottom_distance = None
+
+    def _on_range_changed(self, minimum, maximum):
+        if self._follow:
+            self.verticalScrollBar().setValue(maximum)
+        elif self._keep_bottom_distance is not None:
+            distance = self._keep_bottom_distance
+            self.verticalScrollBar().setValue(maximum - distance)
+            self._keep_bottom_distance = distance
+
+    def scroll_to_bottom(self):
+        """滚动到底部，并在新内容到达时继续跟随"""
+        self._follow = True
+        self._keep_bottom_distance = None
+        self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
+
+    def contextMenuEvent(self, event):
+        # 列表视图中无法直接选择文本，提供复制整条消息的菜单
+        index = self.indexAt(event.pos())
+        if not index.isValid():
+            return
+        menu = QMenu(self)
+        copy_action = menu.addAction("复制")
+        if menu.exec(event.globalPos()) == copy_action:
+            text = self.itemDelegate().document(index).toPlainText()
+            QApplication.clipboard().setText(text)
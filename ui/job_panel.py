@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+任务面板模块 - 侧边栏中显示后台命令任务及其进度
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import (QFrame, QLabel, QListWidget, QListWidgetItem,
+                               QPushButton, QVBoxLayout, QHBoxLayout)
+from PySide6.QtCore import Qt
+
+
+class JobPanel(QFrame):
+    """
+    任务面板类 - 列出任务并提供取消、转入后台操作
+    """
+
+    def __init__(self, parent):
+        super().__init__()
+        self.parent = parent
+        self.init_ui()
+
+    def init_ui(self):
+        """初始化任务面板"""
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 5, 0, 0)
+        layout.setSpacing(5)
+
+        # 标题
+        self.title_label = QLabel("任务")
+        self.title_label.setStyleSheet("color: #666666; font-size: 12px;")
+
+        # 任务列表
+        self.job_list = QListWidget()
+        self.job_list.setSelectionMode(QListWidget.SelectionMode.SingleSelection)
+        self.job_list.setMaximumHeight(180)
+
+        # 操作按钮
+        button_layout = QHBoxLayout()
+        self.background_button = QPushButton("转入后台")
+        self.cancel_button = QPushButton("取消")
+        self.background_button.clicked.connect(self.parent.background_selected_job)
+        self.cancel_button.clicked.connect(self.parent.cancel_selected_job)
+        button_layout.addWidget(self.background_button)
+        button_layout.addWidget(self.cancel_button)
+
+        layout.addWidget(self.title_label)
+        layout.addWidget(self.job_list)
+        layout.addLayout(button_layout)
+
+        self.setVisible(False)
+
+    def selected_job_id(self):
+        """获取当前选中的任务编号"""
+        item = self.job_list.currentItem()
+        if item is None:
+            return None
+        return item.data(Qt.ItemDataRole.UserRole)
+
+    def refresh(self, jobs):
+        """刷新任务列表，只显示未结束的任务和最近结束的几个任务"""
+        active = [job for job in jobs if not job.is_done]
+        finished = [job for job in jobs if job.is_done][-3:]
+        visible = active + finished
+
+        selected_id = self.selected_job_id()
+        self.job_list.clear()
+        for job in visible:
+            item = QListWidgetItem(job.progress_text())
+            item.setData(Qt.ItemDataRole.UserRole, job.id)
+            item.setToolTip(job.command)
+            self.job_list.addItem(item)
+            if job.id == selected_id:
+                self.job_list.setCurrentItem(item)
+
+        self.title_label.setText(f"任务（运行中 {len(active)}）")
+        self.setVisible(bool(visible))
@@ -6,16 +6,17 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, 
-                               QVBoxLayout, QHBoxLayout, QMessageBox)
+                               QVBoxLayout, QHBoxLayout, QMessageBox, QDialog)
 from PySide6.QtCore import QSettings, Qt, QDateTime
 from PySide6.QtGui import QFont
 
 # 延迟导入，避免循环导入
 import importlib
 
-from ui.settings_dialog import SettingsDialog
 from ui.chat_components import ChatComponents
 from ui.api_manager_wrapper import APIManagerWrapper
+from config import app_config
+from agent import tracing
 
 
 class AIAgentGUI(QMainWindow):
@@ -25,6 +26,9 @@ class AIAgentGUI(QMainWindow):
     
     def __init__(self):
         super().__init__()
+        # 常驻模式下关闭窗口只隐藏，由 ResidentHost 在收到命令时重新显示或退出
+        self.resident_host = None
+        self.is_shut_down = False
         # 初始化组件
         self.chat_components = ChatComponents(self)
         self.api_wrapper = APIManagerWrapper(self)
@@ -33,11 +37,18 @@ class AIAgentGUI(QMainWindow):
         self.setup_settings()
         self.setup_styles()
         
-        # 初始化API管理器
-        self.api_wrapper.initialize_api_manager()
+        # 在后台导入openai并初始化API管理器，窗口先显示出来
+        self.api_wrapper.initialize_api_manager(background=True)
         
         # 在所有UI元素创建完成后，显示欢迎界面
         self.show_welcome_screen()
+        
+        # 监测事件循环卡顿，记录卡顿时主线程的调用栈；诊断用，默认关闭，也可以用环境变量 SAVVY_STALL_WATCHDOG=1 开启
+        self.stall_watchdog = None
+        if app_config.get("diagnostics.stall_watchdog", False) or os.environ.get("SAVVY_STALL_WATCHDOG"):
+            from ui.stall_watchdog import StallWatchdog
+            self.stall_watchdog = StallWatchdog(app_config.get("diagnostics.stall_threshold_ms", 50))
+            self.stall_watchdog.start()
     
     def init_ui(self):
         """初始化用户界面"""
@@ -163,7 +174,8 @@ class AIAgentGUI(QMainWindow):
             <p style="color: #666; margin-bottom: 20px;">点击左侧 "+ 新聊天" 按钮开始对话</p>
         </div>
         """
-        self.chat_components.chat_history.setHtml(welcome_html)
+        self.chat_components.clear_history()
+        self.chat_components.insert_html_block(welcome_html)
     
     def add_new_chat(self):
         """添加新的聊天"""
@@ -190,15 +202,39 @@ class AIAgentGUI(QMainWindow):
         if not message:
             return
         
-        # 发送消息到聊天组件
-        if self.chat_components.send_message(message):
-            # 清空输入框
+        # !! 执行命令缓存给出的建议命令，回复生成期间也可以使用
+        if message == "!!" and self.api_wrapper.run_suggested_command():
             self.chat_components.input_box.clear()
-            # 生成AI回复
-            self.api_wrapper.generate_ai_response(message)
+            return
+        # 上一条消息的回复还在生成，其他输入留在输入框中
+        if self.api_wrapper.responding:
+            return
+        
+        # 一次对话从提交输入到回复显示完毕记录为一个区间
+        with tracing.span("chat.turn", "chat", chars=len(message)):
+            # 发送消息到聊天组件
+            if self.chat_components.send_message(message):
+                # 清空输入框
+                self.chat_components.input_box.clear()
+                # 生成AI回复
+                self.api_wrapper.generate_ai_response(message)
+    
+    def cancel_selected_job(self):
+        """取消任务面板中选中的任务"""
+        job_id = self.chat_components.job_panel.selected_job_id()
+        if job_id is not None:
+            self.api_wrapper.cancel_job(job_id)
+    
+    def background_selected_job(self):
+        """将任务面板中选中的任务转入后台"""
+        job_id = self.chat_components.job_panel.selected_job_id()
+        if job_id is not None:
+            self.api_wrapper.background_job(job_id)
     
     def show_settings_panel(self):
         """显示设置面板"""
+        # 设置面板只在第一次打开时导入
+        from ui.settings_dialog import SettingsDialog
         dialog = SettingsDialog(self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             # 重新初始化API管理器
@@ -206,15 +242,47 @@ class AIAgentGUI(QMainWindow):
     
     def closeEvent(self, event):
         """关闭窗口时的处理"""
+        if self.resident_host is not None:
+            # 常驻模式下只隐藏窗口，聊天、后台任务和已初始化的客户端都保留
+            self.hide()
+            event.ignore()
+            return
+        if self.is_shut_down:
+            event.accept()
+            return
         reply = QMessageBox.question(
             self, '退出确认', '确定要退出Savvy吗？',
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, 
             QMessageBox.StandardButton.No
         )
         if reply == QMessageBox.StandardButton.Yes:
+            self.shutdown()
             event.accept()
         else:
             event.ignore()
+    
+    def shutdown(self):
+        """退出前停止后台任务、高亮线程和卡顿监测，按配置打印诊断统计"""
+        if self.is_shut_down:
+            return
+        self.is_shut_down = True
+        if self.resident_host is not None:
+            self.resident_host.stop()
+            self.resident_host = None
+        self.api_wrapper.shutdown()
+        self.chat_components.shutdown()
+        if self.stall_watchdog is not None:
+            self.stall_watchdog.stop()
+            print(self.stall_watchdog.format_stats())
+        if app_config.get("intent.enabled", True) and (
+                app_config.get("diagnostics.intent_stats", False) or os.environ.get("SAVVY_INTENT_STATS")):
+            from agent.intent_matcher import get_intent_matcher
+            print(get_intent_matcher().format_stats())
+    
+    def quit_application(self):
+        """退出常驻进程"""
+        self.shutdown()
+        QApplication.quit()
 
 
 def main():
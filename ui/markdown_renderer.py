@@ -0,0 +1,521 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Markdown渲染模块 - 把模型回复的Markdown增量渲染为聊天记录可显示的HTML，代码块在后台线程中高亮
+"""
+
+import sys
+import os
+import re
+import html
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtCore import QObject, Signal
+
+
+_FENCE = re.compile(r"^\s{0,3}(`{3,}|~{3,})\s*([\w+#.-]*)")
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_RULE = re.compile(r"^\s{0,3}([-*_])(\s*\1){2,}\s*$")
+_LIST_ITEM = re.compile(r"^(\s*)([-*+]|\d+[.)])\s+(.*)$")
+_QUOTE = re.compile(r"^\s{0,3}>\s?(.*)$")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+_INLINE = re.compile(
+    r"(?P<code>`+)(?P<code_text>.+?)(?P=code)"
+    r"|\*\*(?P<bold>.+?)\*\*"
+    r"|__(?P<bold2>.+?)__"
+    r"|(?<![\w*])\*(?P<italic>[^\s*](?:.*?[^\s*])?)\*(?![\w*])"
+    r"|\[(?P<link_text>[^\]]+)\]\((?P<link>(?:https?://|mailto:)[^)\s]+)\)"
+)
+
+_CODE_STYLE = "font-family: Consolas, 'Courier New', monospace;"
+
+# 代码高亮的配色
+_TOKEN_COLORS = {
+    "comment": "#6A737D",
+    "string": "#032F62",
+    "number": "#005CC5",
+    "keyword": "#D73A49",
+    "variable": "#E36209",
+    "command": "#6F42C1",
+    "parameter": "#005CC5",
+    "key": "#22863A",
+}
+
+_STRING = r"\"(?:[^\"\\\n]|\\.)*\"?|'(?:[^'\\\n]|\\.)*'?"
+_NUMBER = r"\b\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b"
+
+
+def _keywords(words: str) -> str:
+    return r"\b(?:" + "|".join(words.split()) + r")\b"
+
+
+# 各语言的记号规则，按顺序尝试，组名即记号类型
+_LANGUAGE_RULES = {
+    "powershell": [
+        ("comment", r"<#[\s\S]*?(?:#>|$)|#[^\n]*"),
+        ("string", _STRING),
+        ("variable", r"\$(?:\{[^}]*\}|[\w:]+)"),
+        ("keyword", _keywords("if elseif else foreach for while do until switch function filter param "
+                              "return break continue try catch finally throw begin process end in")),
+        ("command", r"\b[A-Za-z]+-[A-Za-z]\w*\b"),
+        ("parameter", r"(?<![\w-])-[A-Za-z]\w*"),
+        ("number", _NUMBER),
+    ],
+    "bash": [
+        ("comment", r"(?<![\w$])#[^\n]*"),
+        ("string", _STRING),
+        ("variable", r"\$(?:\{[^}]*\}|\w+|[@*#?$!0-9])"),
+        ("keyword", _keywords("if then else elif fi for in do done while until case esac function "
+                              "return local export readonly select time")),
+        ("parameter", r"(?<![\w-])--?[A-Za-z][\w-]*"),
+        ("number", _NUMBER),
+    ],
+    "python": [
+        ("comment", r"#[^\n]*"),
+        ("string", r"(?:[rbuf]|rb|br|fr|rf)?(?:\"\"\"[\s\S]*?(?:\"\"\"|$)|'''[\s\S]*?(?:'''|$)|" + _STRING + ")"),
+        ("keyword", _keywords("and as assert async await break class continue def del elif else except "
+                              "finally for from global if import in is lambda nonlocal not or pass raise "
+                              "return try while with yield None True False")),
+        ("command", r"@\w+"),
+        ("number", _NUMBER),
+    ],
+    "json": [
+        ("key", r"\"(?:[^\"\\\n]|\\.)*\"(?=\s*:)"),
+        ("string", _STRING),
+        ("keyword", _keywords("true false null")),
+        ("number", r"-?" + _NUMBER),
+    ],
+    "text": [
+        ("comment", r"(?://|#)[^\n]*"),
+        ("string", _STRING),
+        ("number", _NUMBER),
+    ],
+}
+
+_LANGUAGE_ALIASES = {
+    "ps": "powershell", "ps1": "powershell", "pwsh": "powershell", "powershell": "powershell",
+    "bash": "bash", "sh": "bash", "shell": "bash", "zsh": "bash", "console": "bash",
+    "python": "python", "py": "python",
+    "json": "json",
+}
+
+_COMPILED_RULES: Dict[str, "re.Pattern"] = {}
+
+
+def _language_regex(language: str) -> "re.Pattern":
+    regex = _COMPILED_RULES.get(language)
+    if regex is None:
+        rules = _LANGUAGE_RULES[language]
+        regex = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in rules))
+        _COMPILED_RULES[language] = regex
+    return regex
+
+
+def highlight_code(code: str, language: str = "") -> str:
+    """
+    对代码做语法高亮
+
+    Args:
+        code: 代码文本
+        language: 代码块标注的语言，未知语言只高亮字符串、数字和注释
+
+    Returns:
+        带颜色的HTML（已转义，不含外层的pre标签）
+    """
+    regex = _language_regex(_LANGUAGE_ALIASES.get(language.lower(), "text"))
+    parts = []
+    position = 0
+    for match in regex.finditer(code):
+        if match.start() == match.end():
+            continue
+        parts.append(html.escape(code[position:match.start()]))
+        color = _TOKEN_COLORS[match.lastgroup]
+        parts.append(f"<span style='color: {color};'>{html.escape(match.group())}</span>")
+        position = match.end()
+    parts.append(html.escape(code[position:]))
+    return "".join(parts)
+
+
+def render_inline(text: str) -> str:
+    """
+    渲染行内元素：行内代码、粗体、斜体和链接，其余文本转义
+
+    Args:
+        text: 一行Markdown文本
+
+    Returns:
+        HTML
+    """
+    parts = []
+    position = 0
+    for match in _INLINE.finditer(text):
+        parts.append(html.escape(text[position:match.start()]))
+        position = match.end()
+        if match.group("code"):
+            parts.append(f"<code style=\"{_CODE_STYLE} background-color: #F0F0F0;\">"
+                         f"{html.escape(match.group('code_text').strip())}</code>")
+        elif match.group("bold") is not None or match.group("bold2") is not None:
+            parts.append(f"<b>{render_inline(match.group('bold') or match.group('bold2'))}</b>")
+        elif match.group("italic") is not None:
+            parts.append(f"<i>{render_inline(match.group('italic'))}</i>")
+        else:
+            parts.append(f"<a href=\"{html.escape(match.group('link'))}\">"
+                         f"{render_inline(match.group('link_text'))}</a>")
+    parts.append(html.escape(text[position:]))
+    return "".join(parts)
+
+
+def _split_row(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [cell.strip() for cell in line.split("|")]
+
+
+class CodeHighlighter(QObject):
+    """
+    后台代码高亮器 - 在单独的线程中高亮代码块，结果按（语言, 代码）缓存
+
+    高亮完成时发出 highlighted 信号，参数为代码块标识；信号在界面线程中处理。
+    """
+
+    highlighted = Signal(str)
+
+    def __init__(self, cache_size: int = 512):
+        """
+        初始化高亮器
+
+        Args:
+            cache_size: 缓存的高亮结果数
+        """
+        super().__init__()
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="highlight")
+
+    @staticmethod
+    def token(code: str, language: str) -> str:
+        """代码块标识"""
+        digest = hashlib.blake2b(f"{language}\n{code}".encode("utf-8"), digest_size=8).hexdigest()
+        return f"{len(code)}-{digest}"
+
+    def get(self, token: str) -> Optional[str]:
+        """获取已完成的高亮结果"""
+        with self._lock:
+            result = self._cache.get(token)
+            if result is not None:
+                self._cache.move_to_end(token)
+            return result
+
+    def request(self, token: str, code: str, language: str):
+        """提交高亮任务，同一代码块只提交一次"""
+        with self._lock:
+            if token in self._pending or token in self._cache:
+                return
+            self._pending.add(token)
+        self._executor.submit(self._run, token, code, language)
+
+    def _run(self, token: str, code: str, language: str):
+        try:
+            result = highlight_code(code, language)
+        except Exception as e:
+            print(f"代码高亮失败: {e}")
+            result = html.escape(code)
+        with self._lock:
+            self._pending.discard(token)
+            self._cache[token] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        self.highlighted.emit(token)
+
+    def shutdown(self):
+        """停止后台线程"""
+        # cancel_futures 需要 Python 3.9
+        if sys.version_info >= (3, 9):
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            self._executor.shutdown(wait=False)
+
+
+class MarkdownRenderer:
+    """
+    Markdown渲染器
+
+    支持标题、段落、列表、引用、表格、分隔线、围栏代码块和行内代码/粗体/斜体/链接。
+    已闭合的代码块先以纯文本显示并提交后台高亮，高亮完成后用 highlighted_block 给出的替换内容更新已显示的HTML。
+    """
+
+    def __init__(self, highlighter: Optional[CodeHighlighter] = None):
+        """
+        初始化渲染器
+
+        Args:
+            highlighter: 后台代码高亮器，为None时代码块不高亮
+        """
+        self.highlighter = highlighter
+        # 等待高亮的代码块：标识 -> (代码, 语言)，只保留最近的一批
+        self._sources: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+
+    def code_block(self, inner_html: str, language: str = "", token: Optional[str] = None) -> str:
+        """生成代码块HTML，未高亮的代码块带有标记，便于高亮完成后替换"""
+        marker = f"<!--code:{token}-->" if token else ""
+        label = f"<div style='color: #999; font-size: 12px;'>{html.escape(language)}</div>" if language else ""
+        return (f"<table width='100%' cellpadding='8' cellspacing='0' style='background-color: #F6F8FA; "
+                f"margin: 6px 0;'><tr><td>{label}<pre style=\"{_CODE_STYLE} margin: 0;\">{marker}"
+                f"{inner_html}</pre></td></tr></table>")
+
+    def highlighted_block(self, token: str) -> Optional[Tuple[str, str]]:
+        """
+        代码块高亮完成后的替换内容
+
+        Args:
+            token: 代码块标识
+
+        Returns:
+            (未高亮的代码块HTML, 高亮后的代码块HTML)，代码块未知时返回None
+        """
+        source = self._sources.get(token)
+        highlighted = self.highlighter.get(token) if self.highlighter else None
+        if source is None or highlighted is None:
+            return None
+        code, language = source
+        return (self.code_block(html.escape(code), language, token),
+                self.code_block(highlighted, language))
+
+    def _render_code(self, lines: List[str], language: str, closed: bool) -> Tuple[str, bool]:
+        code = "\n".join(lines)
+        if not closed or self.highlighter is None or not code.strip():
+            return self.code_block(html.escape(code), language), False
+        token = CodeHighlighter.token(code, language)
+        highlighted = self.highlighter.get(token)
+        if highlighted is not None:
+            return self.code_block(highlighted, language), False
+        self._sources[token] = (code, language)
+        self._sources.move_to_end(token)
+        while len(self._sources) > 256:
+            self._sources.popitem(last=False)
+        self.highlighter.request(token, code, language)
+        return self.code_block(html.escape(code), language, token), True
+
+    def _render_list(self, items: List[Tuple[int, bool, str]]) -> str:
+        # items: (缩进, 是否有序, 内容)，缩进更深的项目嵌套在上一项中
+        parts = []
+        stack: List[Tuple[int, str]] = []
+        for indent, ordered, text in items:
+            tag = "ol" if ordered else "ul"
+            while stack and indent < stack[-1][0]:
+                parts.append(f"</li></{stack.pop()[1]}>")
+            if not stack or indent > stack[-1][0]:
+                parts.append(f"<{tag} style='margin: 4px 0;'>")
+                stack.append((indent, tag))
+            else:
+                parts.append("</li>")
+            parts.append(f"<li>{render_inline(text)}")
+        while stack:
+            parts.append(f"</li></{stack.pop()[1]}>")
+        return "".join(parts)
+
+    def render_blocks(self, lines: List[str]) -> Tuple[str, bool]:
+        """
+        渲染若干行Markdown
+
+        Args:
+            lines: 文本行
+
+        Returns:
+            (HTML, 是否有代码块正在等待高亮)
+        """
+        parts = []
+        pending = False
+        index = 0
+        count = len(lines)
+        while index < count:
+            line = lines[index]
+            if not line.strip():
+                index += 1
+                continue
+
+            fence = _FENCE.match(line)
+            if fence:
+                marker = fence.group(1)
+                body = []
+                index += 1
+                closed = False
+                while index < count:
+                    if lines[index].strip().startswith(marker[0] * len(marker)) and \
+                            not lines[index].strip().strip(marker[0]):
+                        closed = True
+                        index += 1
+                        break
+                    body.append(lines[index])
+                    index += 1
+                block, waiting = self._render_code(body, fence.group(2), closed)
+                parts.append(block)
+                pending = pending or waiting
+                continue
+
+            heading = _HEADING.match(line)
+            if heading:
+                level = len(heading.group(1))
+                parts.append(f"<h{level}>{render_inline(heading.group(2))}</h{level}>")
+                index += 1
+                continue
+
+            if _RULE.match(line):
+                parts.append("<hr/>")
+                index += 1
+                continue
+
+            if "|" in line and index + 1 < count and _TABLE_SEPARATOR.match(lines[index + 1]):
+                header = _split_row(line)
+                rows = []
+                index += 2
+                while index < count and "|" in lines[index] and lines[index].strip():
+                    rows.append(_split_row(lines[index]))
+                    index += 1
+                table = ["<table border='1' cellspacing='0' cellpadding='4' style='border-collapse: collapse; "
+                         "border-color: #D9D9D9; margin: 6px 0;'><tr>"]
+                table.extend(f"<th>{render_inline(cell)}</th>" for cell in header)
+                table.append("</tr>")
+                for row in rows:
+                    table.append("<tr>" + "".join(f"<td>{render_inline(cell)}</td>" for cell in row) + "</tr>")
+                table.append("</table>")
+                parts.append("".join(table))
+                continue
+
+            if _QUOTE.match(line):
+                quoted = []
+                while index < count and _QUOTE.match(lines[index]):
+                    quoted.append(_QUOTE.match(lines[index]).group(1))
+                    index += 1
+                inner, waiting = self.render_blocks(quoted)
+                parts.append(f"<blockquote style='color: #666;'>{inner}</blockquote>")
+                pending = pending or waiting
+                continue
+
+            if _LIST_ITEM.match(line):
+                items = []
+                while index < count and lines[index].strip():
+                    item = _LIST_ITEM.match(lines[index])
+                    if item:
+                        ordered = item.group(2)[0].isdigit()
+                        items.append((len(item.group(1).expandtabs(4)), ordered, item.group(3)))
+                    elif items and lines[index].startswith((" ", "\t")):
+                        # 缩进的续行并入上一项
+                        indent, ordered, text = items[-1]
+                        items[-1] = (indent, ordered, f"{text} {lines[index].strip()}")
+                    else:
+                        break
+                    index += 1
+                parts.append(self._render_list(items))
+                continue
+
+            paragraph = []
+            while index < count and lines[index].strip() and not self._starts_block(lines, index):
+                paragraph.append(render_inline(lines[index].strip()))
+                index += 1
+            if not paragraph:
+                paragraph.append(render_inline(line.strip()))
+                index += 1
+            parts.append(f"<p style='margin: 4px 0;'>{'<br/>'.join(paragraph)}</p>")
+        return "".join(parts), pending
+
+    def _starts_block(self, lines: List[str], index: int) -> bool:
+        line = lines[index]
+        return bool(_FENCE.match(line) or _HEADING.match(line) or _RULE.match(line) or _QUOTE.match(line)
+                    or _LIST_ITEM.match(line)
+                    or ("|" in line and index + 1 < len(lines) and _TABLE_SEPARATOR.match(lines[index + 1])))
+
+    def render(self, text: str) -> Tuple[str, bool]:
+        """
+        渲染完整的Markdown文本
+
+        Args:
+            text: Markdown文本
+
+        Returns:
+            (HTML, 是否有代码块正在等待高亮)
+        """
+        return self.render_blocks(text.splitlines())
+
+    def stream(self) -> "MarkdownStream":
+        """创建增量渲染器，用于流式回复"""
+        return MarkdownStream(self)
+
+
+class MarkdownStream:
+    """
+    流式Markdown渲染 - 已结束的块渲染一次后缓存，每次只重新渲染末尾未结束的块
+
+    空行（代码块之外）和代码块的闭合围栏是块的边界。
+    """
+
+    def __init__(self, renderer: MarkdownRenderer):
+        self.renderer = renderer
+        self._finished: List[str] = []
+        # 已结束但代码块还在等待高亮的块：块序号 -> 文本行
+        self._waiting: Dict[int, List[str]] = {}
+        self._open_lines: List[str] = []
+        self._partial = ""
+        self._fence: Optional[str] = None
+
+    def _close_open_block(self):
+        if self._open_lines:
+            block, pending = self.renderer.render_blocks(self._open_lines)
+            if pending:
+                self._waiting[len(self._finished)] = self._open_lines
+            self._finished.append(block)
+            self._open_lines = []
+
+    def _add_line(self, line: str):
+        if self._fence is not None:
+            self._open_lines.append(line)
+            stripped = line.strip()
+            if stripped.startswith(self._fence) and not stripped.strip(self._fence[0]):
+                self._fence = None
+                self._close_open_block()
+            return
+        fence = _FENCE.match(line)
+        if fence:
+            # 代码块单独成块
+            self._close_open_block()
+            self._fence = fence.group(1)
+            self._open_lines.append(line)
+        elif not line.strip():
+            self._close_open_block()
+        else:
+            self._open_lines.append(line)
+
+    def feed(self, text: str) -> str:
+        """
+        追加一段文本
+
+        Args:
+            text: 新到达的文本片段
+
+        Returns:
+            截至目前全部文本的HTML
+        """
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._add_line(line)
+        # 高亮完成的代码块重新渲染，命中高亮缓存
+        for position, block_lines in list(self._waiting.items()):
+            block, pending = self.renderer.render_blocks(block_lines)
+            if not pending:
+                self._finished[position] = block
+                del self._waiting[position]
+        tail = self._open_lines + ([self._partial] if self._partial else [])
+        open_html, _ = self.renderer.render_blocks(tail)
+        return "".join(self._finished) + open_html
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+输出批处理模块 - 把命令输出行合并成块，一次插入聊天历史
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent import tracing
+
+
+class OutputBatcher:
+    """
+    输出批处理类 - 缓存待显示的输出行，定时或超过阈值时整块写入
+
+    相邻且同一输出流的行合并为一个HTML块，每次刷新只在聊天记录中追加一行。
+    """
+
+    def __init__(self, chat_components, max_pending_lines=2000):
+        """
+        初始化批处理器
+
+        Args:
+            chat_components: 聊天组件，提供 output_lines_html 和 insert_html_block
+            max_pending_lines: 缓存行数超过该值时立即刷新
+        """
+        self.chat_components = chat_components
+        self.max_pending_lines = max_pending_lines
+        self.pending = []
+        self.pending_lines = 0
+
+    def add(self, stream, lines):
+        """缓存一批输出行，超过阈值时立即刷新"""
+        if self.pending and self.pending[-1][0] == stream:
+            self.pending[-1][1].extend(lines)
+        else:
+            self.pending.append((stream, list(lines)))
+        self.pending_lines += len(lines)
+        if self.pending_lines >= self.max_pending_lines:
+            self.flush()
+
+    def add_html(self, html):
+        """缓存一段提示HTML，保持与输出行的先后顺序"""
+        self.pending.append((None, html))
+
+    def flush(self):
+        """把缓存内容作为一个块写入聊天历史"""
+        if not self.pending:
+            return
+        flush_span = tracing.span("ui.output_flush", "render", lines=self.pending_lines)
+        blocks = []
+        for stream, content in self.pending:
+            if stream is None:
+                blocks.append(content)
+            else:
+                blocks.append(self.chat_components.output_lines_html(stream, content))
+        self.pending = []
+        self.pending_lines = 0
+        self.chat_components.insert_html_block("".join(blocks))
+        flush_span.end()
+
+    def clear(self):
+        """丢弃缓存内容，切换聊天时调用"""
+        self.pending = []
+        self.pending_lines = 0
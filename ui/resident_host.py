@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+常驻模式模块 - 关闭窗口时只隐藏，进程保留API客户端、模板、聊天和后台任务，再次启动时直接显示窗口
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtCore import QObject, Signal
+
+from resident import ResidentListener
+
+
+class ResidentHost(QObject):
+    """
+    常驻模式宿主
+
+    监听线程收到的命令经信号转到主线程处理：show 显示并激活主窗口，quit 退出整个进程。
+    """
+
+    command_received = Signal(dict)
+
+    def __init__(self, window):
+        """
+        初始化常驻模式宿主
+
+        Args:
+            window: 主窗口
+        """
+        super().__init__()
+        self.window = window
+        self.listener = ResidentListener(self._on_command)
+        self.command_received.connect(self._handle)
+
+    def start(self) -> bool:
+        """
+        开始监听启动器的命令
+
+        Returns:
+            是否进入常驻模式
+        """
+        return self.listener.start()
+
+    def stop(self):
+        """停止监听"""
+        self.listener.stop()
+
+    def _on_command(self, message):
+        # 在监听线程中调用，只做校验，界面操作交给主线程
+        if message.get("command") not in ("show", "quit"):
+            return {"ok": False, "error": f"未知命令: {message.get('command')}"}
+        self.command_received.emit(message)
+        return {"ok": True, "pid": os.getpid()}
+
+    def _handle(self, message):
+        if message["command"] == "show":
+            self.window.showNormal()
+            self.window.raise_()
+            self.window.activateWindow()
+        elif message["command"] == "quit":
+            self.window.quit_application()
@@ -16,7 +16,7 @@ from PySide6.QtWidgets import (QDialog, QHBoxLayout, QLineEdit, QPushButton,
 from PySide6.QtCore import Qt
 
 # 导入配置管理器
-from config import config_manager
+from config import app_config
 
 
 class SettingsDialog(QDialog):
@@ -26,7 +26,7 @@ class SettingsDialog(QDialog):
     
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.config = config_manager
+        self.config = app_config
         self.init_ui()
         self.load_settings()
     
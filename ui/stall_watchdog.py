@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+界面卡顿监测模块 - 后台线程监视Qt事件循环，事件循环超时未响应时采样主线程的Python调用栈
+"""
+
+import sys
+import os
+import json
+import time
+import threading
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtCore import QTimer, Qt
+
+
+# 卡顿时长直方图的分桶上界（毫秒）
+_HISTOGRAM_BOUNDS = (100, 200, 500, 1000, 2000, 5000)
+# 每次卡顿最多保留的不同调用栈数
+_MAX_STACKS = 3
+# 调用栈最多保留的帧数（从最内层开始）
+_MAX_FRAMES = 25
+
+
+def _bucket_label(index: int) -> str:
+    if index == 0:
+        return f"<{_HISTOGRAM_BOUNDS[0]}ms"
+    if index == len(_HISTOGRAM_BOUNDS):
+        return f">={_HISTOGRAM_BOUNDS[-1]}ms"
+    return f"{_HISTOGRAM_BOUNDS[index - 1]}-{_HISTOGRAM_BOUNDS[index]}ms"
+
+
+class StallWatchdog:
+    """
+    事件循环卡顿监测类
+
+    主线程中的定时器周期性地记录心跳；监测线程发现心跳超过阈值未更新时，
+    用 sys._current_frames() 采样主线程的调用栈，卡顿期间持续采样。心跳恢复后，
+    卡顿时长和出现最多的调用栈写入滚动日志，并计入时长直方图。
+    """
+
+    def __init__(self, threshold_ms: float = 50, beat_interval_ms: int = 10,
+                 log_dir: str = "logs", log_file: str = "ui_stalls.jsonl",
+                 max_log_bytes: int = 1024 * 1024):
+        """
+        初始化卡顿监测
+
+        Args:
+            threshold_ms: 超过该时长未处理事件视为卡顿（毫秒）
+            beat_interval_ms: 心跳定时器的间隔（毫秒）
+            log_dir: 日志文件夹名称
+            log_file: 日志文件名
+            max_log_bytes: 日志文件超过该大小时滚动为 .1 备份
+        """
+        # 获取项目根目录
+        self.project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.log_dir = os.path.join(self.project_root, log_dir)
+        self.log_file = os.path.join(self.log_dir, log_file)
+        self.max_log_bytes = max_log_bytes
+        self.threshold = threshold_ms / 1000
+        self.beat_interval_ms = beat_interval_ms
+
+        self._main_ident = threading.main_thread().ident
+        self._last_beat = time.monotonic()
+        # 主线程交给监测线程的已结束卡顿的时长（秒）
+        self._finished = deque()
+        self._samples: List[tuple] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._timer: Optional[QTimer] = None
+
+        self._lock = threading.Lock()
+        self._histogram = [0] * (len(_HISTOGRAM_BOUNDS) + 1)
+        self._count = 0
+        self._total = 0.0
+        self._longest = 0.0
+
+    def start(self):
+        """开始监测，需在主线程中调用"""
+        if self._thread is not None:
+            return
+        self._last_beat = time.monotonic()
+        self._timer = QTimer()
+        self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._timer.timeout.connect(self._beat)
+        self._timer.start(self.beat_interval_ms)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监测"""
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _beat(self):
+        now = time.monotonic()
+        # 心跳间隔本身不计入卡顿
+        stalled = now - self._last_beat - self.beat_interval_ms / 1000
+        if stalled >= self.threshold:
+            self._finished.append(stalled)
+        self._last_beat = now
+
+    def _sample_main_stack(self) -> Optional[tuple]:
+        frame = sys._current_frames().get(self._main_ident)
+        if frame is None:
+            return None
+        frames = traceback.extract_stack(frame)[-_MAX_FRAMES:]
+        return tuple(f"{self._short_path(entry.filename)}:{entry.lineno} {entry.name}" for entry in frames)
+
+    def _short_path(self, filename: str) -> str:
+        # 项目内的文件使用相对路径
+        if filename.startswith(self.project_root + os.sep):
+            return os.path.relpath(filename, self.project_root)
+        return filename
+
+    def _watch(self):
+        # 采样间隔取阈值的一半，保证每次卡顿至少采到一次
+        period = max(self.threshold / 2, 0.005)
+        while not self._stop.wait(period):
+            while self._finished:
+                duration = self._finished.popleft()
+                samples, self._samples = self._samples, []
+                self._record(duration, samples)
+
+            if time.monotonic() - self._last_beat >= self.threshold:
+                stack = self._sample_main_stack()
+                if stack:
+                    self._samples.append(stack)
+
+    def _record(self, duration: float, samples: List[tuple]):
+        duration_ms = duration * 1000
+        bucket = 0
+        while bucket < len(_HISTOGRAM_BOUNDS) and duration_ms >= _HISTOGRAM_BOUNDS[bucket]:
+            bucket += 1
+        with self._lock:
+            self._histogram[bucket] += 1
+            self._count += 1
+            self._total += duration_ms
+            self._longest = max(self._longest, duration_ms)
+
+        counts: Dict[tuple, int] = {}
+        for stack in samples:
+            counts[stack] = counts.get(stack, 0) + 1
+        stacks = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:_MAX_STACKS]
+        entry = {
+            "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+            "duration_ms": round(duration_ms, 1),
+            "samples": len(samples),
+            "stacks": [{"count": count, "frames": list(stack)} for stack, count in stacks],
+        }
+        self._write(entry)
+
+    def _write(self, entry: Dict[str, Any]):
+        try:
+            os.makedirs(self.log_dir, exist_ok=True)
+            if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > self.max_log_bytes:
+                os.replace(self.log_file, self.log_file + ".1")
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"写入卡顿日志失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取卡顿统计
+
+        Returns:
+            包含卡顿次数、总时长、平均和最长时长（毫秒）以及时长直方图的字典
+        """
+        with self._lock:
+            return {
+                "count": self._count,
+                "total_ms": self._total,
+                "avg_ms": self._total / self._count if self._count else 0.0,
+                "longest_ms": self._longest,
+                "histogram": {_bucket_label(i): n for i, n in enumerate(self._histogram)},
+            }
+
+    def format_stats(self) -> str:
+        """生成一行统计摘要"""
+        stats = self.stats()
+        histogram = "，".join(f"{label} {count}" for label, count in stats["histogram"].items() if count)
+        return (f"界面卡顿: {stats['count']} 次，总计 {stats['total_ms']:.0f} ms，"
+                f"最长 {stats['longest_ms']:.0f} ms" + (f"（{histogram}）" if histogram else ""))